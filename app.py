@@ -1,6 +1,7 @@
 import os
+import signal
 import logging
-
+import threading
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
@@ -15,44 +16,115 @@ class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for to generate with https
-
-# Configure the PostgreSQL database
-database_url = os.environ.get("DATABASE_URL")
-# Handle potential "postgres://" to "postgresql://" conversion needed for SQLAlchemy
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url or "sqlite:///grid_bot.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the database
-db.init_app(app)
-
-# Create scheduler for background tasks
+
+# Scheduler for background tasks; started by start_background() or the first job that needs it
 scheduler = BackgroundScheduler(daemon=True)
+_scheduler_lock = threading.Lock()
+
+
+def create_app():
+    """Build the Flask app: config, database, CLI commands and routes.
+
+    Nothing here touches the database schema, starts a thread or talks to
+    Binance, so importing the app is cheap for gunicorn workers, CLI
+    commands and scripts. The schema is upgraded by ``flask upgrade-schema``
+    and the grid engine is started by start_background().
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for to generate with https
+
+    # Configure the PostgreSQL database
+    database_url = os.environ.get("DATABASE_URL")
+    # Handle potential "postgres://" to "postgresql://" conversion needed for SQLAlchemy
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url or "sqlite:///grid_bot.db"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # SQLite fallback (edge nodes): tune the engine for concurrent engine/UI access
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        from sqlite_profile import sqlite_engine_options
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+
+    # Initialize the database
+    db.init_app(app)
+
+    # Import models and routes after db is created to avoid circular imports
+    with app.app_context():
+        # Enable WAL and the read-only pool when running on SQLite
+        from sqlite_profile import configure_sqlite
+        configure_sqlite(app, db)
+
+        # Schema CLI commands; migrations live in migrations/
+        import models  # noqa: F401
+        from schema import migrate, register_commands
+        migrate.init_app(app, db)
+        register_commands(app, db)
+
+        # Import and register routes
+        from routes import register_routes
+        register_routes(app)
+
+    # flask cache-server: the shared cache stand-in for hosts without Redis
+    from shared_cache import cache_server
+    app.cli.add_command(cache_server)
+
+    @app.cli.command('run-engine')
+    def run_engine():
+        """Run the grid engine and scheduled jobs in this process until interrupted."""
+        # Stop on SIGTERM from the process manager as on Ctrl-C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        # kill -USR1 <pid> profiles the engine into instance/profiles/
+        from profiler import install_signal_handler
+        install_signal_handler(os.path.join(app.instance_path, 'profiles'))
+        engine = start_background(app)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            # Let the engine write its snapshot, flush its stores and leave its shard before exiting
+            if engine is not None:
+                from async_engine import ENGINE_SHUTDOWN_TIMEOUT
+                if not engine.join(ENGINE_SHUTDOWN_TIMEOUT):
+                    logger.warning(f"Grid engine did not shut down within {ENGINE_SHUTDOWN_TIMEOUT}s")
+            scheduler.shutdown()
+
+    return app
+
+
+def start_scheduler():
+    """Start the background scheduler in this process if it is not running yet"""
+    with _scheduler_lock:
+        if not scheduler.running:
+            scheduler.start()
+
+
+def start_background(app):
+    """Start the grid engine and the daily archiver in this process.
+
+    The asyncio engine drives every active grid on one event loop;
+    GRID_ENGINE=scheduler falls back to the threaded 10s job. Returns the
+    async engine, or None when this process does not run one.
+    """
+    engine = None
+    with app.app_context():
+        if os.environ.get("GRID_ENGINE", "async") == "scheduler":
+            from binance_client import update_active_grids
+
+            # Run active grid bots every 10 seconds
+            scheduler.add_job(update_active_grids, 'interval', seconds=10, args=[app])
+            logger.info("Scheduler started for grid bot updates")
+        else:
+            from async_engine import start_engine
+            engine = start_engine(app)
+            logger.info("Async grid engine started")
 
-# Import routes after app is created to avoid circular imports
-with app.app_context():
-    # Create database tables based on models
-    from models import User, GridConfig, TradeHistory
-    db.create_all()
-    
-    # Import and register routes
-    from routes import register_routes
-    register_routes(app)
-    
-    # Import and set up scheduled tasks
-    from binance_client import update_active_grids
-    
-    # Run active grid bots every 10 seconds
-    if not scheduler.running:
-        scheduler.add_job(update_active_grids, 'interval', seconds=10)
-        scheduler.start()
-        logger.info("Scheduler started for grid bot updates")
+        # Roll closed months of trade history into the Parquet archive once a day
+        from trade_archive import run_archiver
+        scheduler.add_job(run_archiver, 'cron', hour=0, minute=15, args=[app])
+    start_scheduler()
+    return engine
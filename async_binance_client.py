@@ -0,0 +1,439 @@
+import json
+import logging
+import time
+import hmac
+import hashlib
+import asyncio
+import aiohttp
+from urllib.parse import urlencode
+from exchange_errors import BinanceAPIException
+from binance_client import parse_symbol_precision, format_decimal, error_code, outcome_unknown, FAPI_URL
+from order_ids import UNKNOWN_ORDER, ORDER_ATTEMPTS
+from server_time import server_clock, is_timestamp_error, TIME_ENDPOINT
+from cassette import cassette
+from quantizer import symbol_quantizer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Errors after which an order may or may not exist on the exchange
+AMBIGUOUS_ERRORS = (BinanceAPIException, aiohttp.ClientError, asyncio.TimeoutError)
+
+GEO_RESTRICTION_MSG = ("Service unavailable from your location due to geographic restrictions. "
+                       "Please try using a VPN from a supported region or deploy this bot on a server in a supported region.")
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+class _ResponseProxy:
+    """Minimal response stand-in so BinanceAPIException can be raised from aiohttp results"""
+    def __init__(self, status, text, url):
+        self.status_code = status
+        self.text = text
+        self.url = url
+        self.request = None
+
+
+def create_session(max_connections=1000, timeout=10):
+    """Create a shared aiohttp session sized for many concurrent in-flight requests"""
+    connector = aiohttp.TCPConnector(limit=max_connections, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
+class AsyncBinanceClient:
+    """asyncio counterpart of BinanceClient with the same method surface.
+
+    Many clients (one per user) can share a single aiohttp session so all of
+    their requests are multiplexed over one connection pool on one event loop.
+    """
+    def __init__(self, api_key=None, api_secret=None, session=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = FAPI_URL
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+
+    async def close(self):
+        """Close the underlying session if this client created it"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _generate_signature(self, params):
+        """Generate HMAC SHA256 signature for API authentication"""
+        query_string = urlencode(params)
+        signature = hmac.new(
+            self.api_secret.encode('utf-8'),
+            query_string.encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return signature
+
+    async def _sync_time(self):
+        """Sample /fapi/v1/time into the shared server clock"""
+        if cassette.player is not None:
+            return
+        try:
+            sent = time.time() * 1000
+            async with self.session.get(f"{self.base_url}{TIME_ENDPOINT}") as response:
+                server_time = (await response.json(content_type=None))['serverTime']
+            server_clock.record(sent, server_time, time.time() * 1000)
+        except Exception as e:
+            logger.warning(f"Could not sync server time: {e}")
+
+    async def _make_request(self, method, endpoint, params=None, signed=False):
+        """Make API request to Binance with proper authentication"""
+        url = f"{self.base_url}{endpoint}"
+        headers = {}
+        if self.api_key:
+            headers['X-MBX-APIKEY'] = self.api_key
+
+        if params is None:
+            params = {}
+
+        # aiohttp rejects None/bool query values, so normalise them like requests does
+        params = {k: (str(v).lower() if isinstance(v, bool) else v) for k, v in params.items() if v is not None}
+
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise ValueError(f"Unsupported method: {method}")
+
+        try:
+            for attempt in (0, 1):
+                if signed:
+                    if server_clock.claim_sync():
+                        await self._sync_time()
+                    params.pop('signature', None)
+                    server_clock.stamp(params)
+                    params['signature'] = self._generate_signature(params)
+
+                status, text = await self._send(method, endpoint, url, headers, params)
+
+                if status == 451:
+                    logger.error(f"Geographic restriction error: {text}")
+                    raise BinanceAPIException(
+                        _ResponseProxy(status, text, url), status,
+                        f'{{"code": 0, "msg": "{GEO_RESTRICTION_MSG}"}}'
+                    )
+
+                # Timestamp outside recvWindow: resync the clock and retry once with a fresh timestamp
+                if signed and not attempt and status == 400 and is_timestamp_error(_loads(text)):
+                    logger.warning(f"Timestamp rejected for {endpoint}, resyncing server time")
+                    server_clock.invalidate()
+                    continue
+
+                if status >= 400:
+                    raise BinanceAPIException(_ResponseProxy(status, text, url), status, text)
+
+                return _loads(text)
+        except aiohttp.ClientError as e:
+            logger.error(f"Error making request to Binance: {e}")
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out making request to Binance: {method} {endpoint}")
+            raise
+
+    async def _send(self, method, endpoint, url, headers, params):
+        # (status, body text) of one HTTP exchange, recorded or replayed when a cassette is configured
+        if cassette.player is not None:
+            return await cassette.player.replay_async(self.api_key, method, endpoint, params)
+        started = time.time()
+        async with self.session.request(method, url, headers=headers, params=params) as response:
+            text = await response.text()
+        if cassette.recorder is not None:
+            cassette.recorder.record(self.api_key, method, endpoint, params, response.status, text,
+                                     started, time.time() - started)
+        return response.status, text
+
+    async def check_connection(self):
+        """Check if API connection is working"""
+        try:
+            await self._make_request('GET', '/fapi/v1/ping')
+            return True
+        except Exception as e:
+            logger.error(f"API connection test failed: {e}")
+            return False
+
+    async def get_account_info(self):
+        """Get account information"""
+        return await self._make_request('GET', '/fapi/v2/account', signed=True)
+
+    async def get_exchange_info(self):
+        """Get exchange information"""
+        return await self._make_request('GET', '/fapi/v1/exchangeInfo')
+
+    async def get_symbol_price(self, symbol):
+        """Get current price for a symbol"""
+        params = {'symbol': symbol}
+        return float((await self._make_request('GET', '/fapi/v1/ticker/price', params))['price'])
+
+    async def get_klines(self, symbol, interval, start_time=None, end_time=None, limit=500):
+        """Get klines (OHLCV candles) for a symbol"""
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'limit': limit
+        }
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+        return await self._make_request('GET', '/fapi/v1/klines', params)
+
+    async def change_margin_type(self, symbol, margin_type="ISOLATED"):
+        """Change margin type for a symbol"""
+        params = {
+            'symbol': symbol,
+            'marginType': margin_type
+        }
+        try:
+            return await self._make_request('POST', '/fapi/v1/marginType', params, signed=True)
+        except Exception as e:
+            # If already in this margin type, ignore error
+            if "No need to change" in str(e) or "Already" in str(e):
+                return {"msg": "Already in this margin type"}
+            raise
+
+    async def change_leverage(self, symbol, leverage):
+        """Change leverage for a symbol"""
+        params = {
+            'symbol': symbol,
+            'leverage': leverage
+        }
+        return await self._make_request('POST', '/fapi/v1/leverage', params, signed=True)
+
+    async def enable_hedge_mode(self):
+        """Enable hedge mode for futures trading"""
+        params = {
+            'dualSidePosition': 'true'
+        }
+        try:
+            return await self._make_request('POST', '/fapi/v1/positionSide/dual', params, signed=True)
+        except Exception as e:
+            # If already enabled, ignore error
+            if "no need to change" in str(e).lower() or "already" in str(e).lower():
+                return {"msg": "Hedge mode already enabled"}
+            raise
+
+    async def get_open_positions(self, symbol=None):
+        """Get all open positions or for a specific symbol"""
+        account_info = await self.get_account_info()
+        positions = account_info['positions']
+
+        if symbol:
+            positions = [p for p in positions if p['symbol'] == symbol]
+
+        return positions
+
+    async def get_precision(self, symbol, exchange_info=None):
+        """Get price and quantity precision for a symbol"""
+        if exchange_info is None:
+            exchange_info = await self.get_exchange_info()
+        return parse_symbol_precision(exchange_info, symbol)
+
+    async def get_quantizer(self, symbol, exchange_info=None):
+        """Integer tick/step arithmetic for a symbol, built once per exchangeInfo document"""
+        if exchange_info is None:
+            exchange_info = await self.get_exchange_info()
+        return symbol_quantizer(exchange_info, symbol)
+
+    async def place_order(self, symbol, side, position_side, type="LIMIT", quantity=None, price=None, reduce_only=False,
+                    client_order_id=None):
+        """Place an order on Binance Futures (see BinanceClient.place_order)"""
+        params = {
+            'symbol': symbol,
+            'side': side,
+            'positionSide': position_side,
+            'type': type,
+            'quantity': quantity,
+            'newOrderRespType': 'RESULT'
+        }
+
+        if type == 'LIMIT':
+            params['price'] = price
+            params['timeInForce'] = 'GTC'
+
+        if reduce_only:
+            params['reduceOnly'] = 'true'
+
+        if client_order_id:
+            params['newClientOrderId'] = client_order_id
+
+        return await self._make_request('POST', '/fapi/v1/order', params, signed=True)
+
+    async def cancel_order(self, symbol, order_id):
+        """Cancel an open order"""
+        params = {
+            'symbol': symbol,
+            'orderId': order_id
+        }
+        return await self._make_request('DELETE', '/fapi/v1/order', params, signed=True)
+
+    async def modify_order(self, symbol, order_id, side, quantity, price):
+        """Amend the price and/or quantity of an open LIMIT order in place"""
+        params = {
+            'symbol': symbol,
+            'orderId': order_id,
+            'side': side,
+            'quantity': quantity,
+            'price': price
+        }
+        return await self._make_request('PUT', '/fapi/v1/order', params, signed=True)
+
+    async def place_batch_orders(self, symbol, orders):
+        """Place up to 5 LIMIT orders in one request
+
+        ``orders`` are dicts with side, position_side, quantity, price and
+        optionally client_order_id. The response has one entry per order: the
+        order, or an error with code/msg.
+        """
+        batch = []
+        for order in orders:
+            item = {
+                'symbol': symbol,
+                'side': order['side'],
+                'positionSide': order['position_side'],
+                'type': 'LIMIT',
+                'timeInForce': 'GTC',
+                'quantity': format_decimal(order['quantity']),
+                'price': format_decimal(order['price']),
+                'newOrderRespType': 'RESULT'
+            }
+            if order.get('client_order_id'):
+                item['newClientOrderId'] = order['client_order_id']
+            batch.append(item)
+        params = {'batchOrders': json.dumps(batch, separators=(',', ':'))}
+        return await self._make_request('POST', '/fapi/v1/batchOrders', params, signed=True)
+
+    async def modify_batch_orders(self, symbol, orders):
+        """Amend up to 5 open orders in one request; ``orders`` are dicts with order_id, side, quantity and price"""
+        batch = [{
+            'symbol': symbol,
+            'orderId': order['order_id'],
+            'side': order['side'],
+            'quantity': format_decimal(order['quantity']),
+            'price': format_decimal(order['price'])
+        } for order in orders]
+        params = {'batchOrders': json.dumps(batch, separators=(',', ':'))}
+        return await self._make_request('PUT', '/fapi/v1/batchOrders', params, signed=True)
+
+    async def cancel_batch_orders(self, symbol, order_ids):
+        """Cancel up to 10 orders in one request"""
+        params = {
+            'symbol': symbol,
+            'orderIdList': json.dumps([int(order_id) for order_id in order_ids], separators=(',', ':'))
+        }
+        return await self._make_request('DELETE', '/fapi/v1/batchOrders', params, signed=True)
+
+    async def cancel_all_open_orders(self, symbol):
+        """Cancel every open order on a symbol in one request"""
+        return await self._make_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': symbol}, signed=True)
+
+    async def get_open_orders(self, symbol):
+        """Get all open orders on a symbol"""
+        return await self._make_request('GET', '/fapi/v1/openOrders', {'symbol': symbol}, signed=True)
+
+    async def get_all_orders(self, symbol, start_time=None, order_id=None, limit=1000):
+        """Get orders on a symbol (any status) created since ``start_time`` or from ``order_id`` on"""
+        params = {'symbol': symbol, 'limit': limit}
+        if order_id is not None:
+            params['orderId'] = order_id
+        elif start_time is not None:
+            params['startTime'] = start_time
+        return await self._make_request('GET', '/fapi/v1/allOrders', params, signed=True)
+
+    async def get_user_trades(self, symbol, start_time=None, from_id=None, limit=1000):
+        """Get account fills on a symbol since ``start_time`` or from trade ``from_id`` on"""
+        params = {'symbol': symbol, 'limit': limit}
+        if from_id is not None:
+            params['fromId'] = from_id
+        elif start_time is not None:
+            params['startTime'] = start_time
+        return await self._make_request('GET', '/fapi/v1/userTrades', params, signed=True)
+
+    async def get_position_risk(self, symbol):
+        """Get position size and side for a symbol (one entry per position side in hedge mode)"""
+        return await self._make_request('GET', '/fapi/v2/positionRisk', {'symbol': symbol}, signed=True)
+
+    async def get_order(self, symbol, order_id):
+        """Get order status"""
+        params = {
+            'symbol': symbol,
+            'orderId': order_id
+        }
+        return await self._make_request('GET', '/fapi/v1/order', params, signed=True)
+
+    async def get_order_by_client_id(self, symbol, client_order_id):
+        """Get order status by newClientOrderId"""
+        params = {
+            'symbol': symbol,
+            'origClientOrderId': client_order_id
+        }
+        return await self._make_request('GET', '/fapi/v1/order', params, signed=True)
+
+    async def find_order(self, symbol, client_order_id):
+        """The order placed under ``client_order_id``, or None if Binance never accepted it"""
+        try:
+            return await self.get_order_by_client_id(symbol, client_order_id)
+        except Exception as e:
+            if error_code(e) == UNKNOWN_ORDER:
+                return None
+            raise
+
+    async def submit_order(self, symbol, side, position_side, quantity, price, client_order_id, attempts=ORDER_ATTEMPTS):
+        """Place a LIMIT order under ``client_order_id``, retrying until its outcome is known.
+
+        A timeout, 5xx, -1001/-1007 or duplicate-id error does not say whether
+        the order exists, so the id is looked up: an existing order is returned
+        as if just placed, otherwise the same id is submitted again. Binance rejects
+        a second live order with the id, so retries never duplicate an order.
+        """
+        for attempt in range(attempts):
+            try:
+                return await self.place_order(symbol, side, position_side, "LIMIT", quantity, price,
+                                              client_order_id=client_order_id)
+            except AMBIGUOUS_ERRORS as e:
+                if not outcome_unknown(e):
+                    raise
+                existing = await self.find_order(symbol, client_order_id)
+                if existing is not None:
+                    logger.info(f"Recovered order {client_order_id} after: {e}")
+                    return existing
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"Retrying order {client_order_id} after: {e}")
+
+    async def setup_grid_trading(self, grid_config):
+        """Set up initial configuration for grid trading"""
+        try:
+            symbol = grid_config.symbol
+
+            # Enable hedge mode
+            await self.enable_hedge_mode()
+
+            # Change margin type to isolated
+            await self.change_margin_type(symbol)
+
+            # Set leverage
+            await self.change_leverage(symbol, grid_config.leverage)
+
+            return True
+        except Exception as e:
+            logger.error(f"Error setting up grid trading: {e}")
+            return False
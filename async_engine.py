@@ -0,0 +1,914 @@
+import os
+import atexit
+import socket
+import asyncio
+import logging
+import datetime
+import threading
+import numpy as np
+from sqlalchemy import true, select, func
+from exchange_errors import BinanceAPIException
+from app import db
+from models import User, GridConfig, GridPosition, TradeHistory, WriteBehindCheckpoint, ShardAssignment
+from async_binance_client import AsyncBinanceClient, create_session
+from server_time import server_clock
+from quantizer import symbol_quantizer
+from order_ids import (client_order_id, take_profit_order_id, level_index, parse_client_order_id,
+                       UNKNOWN_OUTCOME_CODES)
+from price_feed import PriceFeed
+from persistence import WriteBehindStore
+from grid_book import GridBook
+from rebalance import (target_ladder, plan_rebalance, shift_range, chunks, SIDES,
+                       CANCEL_BATCH_SIZE, PLACE_BATCH_SIZE, MODIFY_BATCH_SIZE)
+from tick_store import get_tick_store
+from sharding import ShardCoordinator
+from risk_ledger import RiskLedger
+import engine_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Older snapshots are not worth reconciling (Binance keeps order/fill history queries to 7 days)
+SNAPSHOT_MAX_AGE = datetime.timedelta(hours=24)
+# Clock skew allowance when asking the exchange for what happened since a snapshot
+SNAPSHOT_OVERLAP = datetime.timedelta(seconds=60)
+# How often each user's wallet balance is re-read for the risk ledger (seconds)
+RISK_RECONCILE_INTERVAL = float(os.environ.get("RISK_RECONCILE_INTERVAL", 60))
+# Seconds to wait at exit for the engine to write its snapshot and flush its stores
+ENGINE_SHUTDOWN_TIMEOUT = float(os.environ.get("ENGINE_SHUTDOWN_TIMEOUT", 20))
+
+
+class AsyncGridEngine:
+    """Event-driven grid engine running on a single asyncio event loop.
+
+    Every active grid's levels and positions are held in a GridBook. Price
+    updates from the PriceFeed are searched against the book's per-symbol
+    level index and only the grids (and levels) that were actually crossed
+    get any exchange traffic.
+    Grid membership is refreshed from the database every ``refresh_interval``
+    seconds without touching the exchange, and a full pass over every level of
+    every grid runs every ``resync_interval`` seconds as a safety net.
+
+    New and edited grids, and trailing grids whose price left the range, are
+    rebalanced first: their open orders are diffed against the target ladder
+    and moved with the fewest amend/cancel/place operations.
+
+    Position and trade writes go through a WriteBehindStore and reach the
+    database in batches rather than once per grid. Every price update is also
+    recorded in the TickStore for charts and analytics.
+
+    The book is snapshotted to ``snapshot_path`` every ``snapshot_interval``
+    seconds. A restart that finds a recent snapshot starts warm: it reloads
+    only the grids written since and asks the exchange for fills and orders
+    since the snapshot, instead of polling every open order.
+
+    With a ShardCoordinator the engine is one of several workers and only
+    runs the grids of the users assigned to it in ``shard_assignment``, and
+    only while its heartbeat holds the lease on them.
+
+    Orders are only sent when they fit the grid's wallet_allocation, checked
+    against a RiskLedger kept current from the same store writes.
+    """
+    def __init__(self, app, store, ticks=None, refresh_interval=10, resync_interval=300, max_connections=1000,
+                 snapshot_path=None, snapshot_interval=60, coordinator=None):
+        self.app = app
+        self.store = store
+        self.ticks = ticks
+        self.refresh_interval = refresh_interval
+        self.resync_interval = resync_interval
+        self.max_connections = max_connections
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.coordinator = coordinator
+        self._warm = None
+        self.session = None
+        self.exchange_info = None
+        self.book = GridBook()
+        # The book follows the engine's own position writes as they are staged
+        store.listeners.append(self.book.apply)
+        self.risk = RiskLedger()
+        store.listeners.append(self.risk.apply)
+        self.clients = {}
+        self._pending = {}
+        self._running = set()
+        self._rebalance = set()
+        self._recover = set()
+        # Last order generation assigned per grid; the database catches up when the store flushes
+        self._generations = {}
+        self._stop = None
+        self._stopping = False
+        self._loop = None
+        self.thread = None
+
+    async def run_forever(self):
+        """Run the price feed, refresh and resync loops until stop() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if self._stopping:
+            self._stop.set()
+        self.session = create_session(self.max_connections)
+        feed = PriceFeed(self.session, self.on_price)
+        tasks = [
+            feed.run(self._stop),
+            self._every(self.refresh_interval, self.refresh),
+            self._every(self.store.max_delay, self.flush),
+            self._every(1.0, self.flush_ticks),
+            self._every(5.0, self.sync_time),
+            self._every(RISK_RECONCILE_INTERVAL, self.reconcile_risk, delay=RISK_RECONCILE_INTERVAL),
+        ]
+        if self.snapshot_path:
+            tasks.append(self._every(self.snapshot_interval, self.save_snapshot, delay=self.snapshot_interval))
+        try:
+            if self._warm is not None:
+                await self.warm_start()
+                # The reconciliation replaces the startup full pass
+                tasks.append(self._every(self.resync_interval, self.run_cycle, delay=self.resync_interval))
+            else:
+                tasks.append(self._every(self.resync_interval, self.run_cycle))
+            await asyncio.gather(*tasks)
+        finally:
+            await self.session.close()
+            self.session = None
+            self.store.close()
+            if self.coordinator is not None:
+                self.coordinator.leave()
+            if self.snapshot_path:
+                try:
+                    engine_snapshot.write(self.snapshot_path, self._pack_snapshot())
+                except Exception as e:
+                    logger.error(f"Error writing engine snapshot on shutdown: {e}")
+            if self.ticks is not None:
+                self.ticks.flush()
+
+    def stop(self):
+        """Ask run_forever to finish; safe to call from any thread"""
+        self._stopping = True
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stop.set)
+            except RuntimeError:
+                # The loop has already finished
+                pass
+
+    def join(self, timeout=None):
+        """Stop the engine and wait for its shutdown (snapshot, flushes, shard leave); True once it is done"""
+        self.stop()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        return True
+
+    async def flush(self):
+        """Flush staged writes once the batch size or delay threshold is reached"""
+        if self.store.should_flush():
+            self.store.flush()
+
+    async def flush_ticks(self):
+        """Append recorded price ticks to the tick files"""
+        if self.ticks is not None:
+            self.ticks.flush()
+
+    async def sync_time(self):
+        """Keep the server clock sampled here so signed order requests never wait on it"""
+        if server_clock.claim_sync():
+            await AsyncBinanceClient(session=self.session)._sync_time()
+
+    def load_snapshot(self):
+        """Start from the snapshot at ``snapshot_path`` if there is a recent one; call before run_forever"""
+        if not self.snapshot_path:
+            return False
+        loaded = engine_snapshot.read(self.snapshot_path)
+        if loaded is None:
+            return False
+        header, book = loaded
+        age = datetime.datetime.utcnow() - header['created']
+        if age > SNAPSHOT_MAX_AGE:
+            logger.info(f"Engine snapshot is {age} old, starting cold")
+            return False
+        self.book.grids, self.book.symbols = book.grids, book.symbols
+        # exchangeInfo is not in the snapshot (most of it is symbols no grid trades); the first refresh fetches it
+        self._warm = header
+        logger.info(f"Loaded engine snapshot of {len(self.book)} grids from {header['created']:%Y-%m-%d %H:%M:%S}")
+        return True
+
+    def _pack_snapshot(self):
+        with self.app.app_context():
+            try:
+                # Trades after this id (and positions written after the snapshot) are the database delta
+                last_trade_id = db.session.execute(select(func.max(TradeHistory.id))).scalar() or 0
+            finally:
+                db.session.remove()
+        return engine_snapshot.pack(self.book, store_seq=self.store.seq, last_trade_id=last_trade_id)
+
+    async def save_snapshot(self):
+        """Copy the book on the loop, write it from a worker thread"""
+        packed = self._pack_snapshot()
+        await asyncio.get_running_loop().run_in_executor(None, engine_snapshot.write, self.snapshot_path, packed)
+        logger.debug(f"Wrote engine snapshot of {len(self.book)} grids")
+
+    async def warm_start(self):
+        """Bring a book loaded from a snapshot up to date with what changed since it was taken.
+
+        New, edited and removed grids are picked up by refresh() as usual.
+        Grids whose positions or trades were written after the snapshot are
+        reloaded from the database, and one order and one fill query per
+        user and symbol finds the orders that were placed, filled or
+        cancelled on the exchange meanwhile; only their levels are scheduled.
+        """
+        header, self._warm = self._warm, None
+        since = header['created'] - SNAPSHOT_OVERLAP
+        await self.refresh()
+
+        with self.app.app_context():
+            try:
+                checkpoint = db.session.get(WriteBehindCheckpoint, self.store.name)
+                touched = set()
+                if checkpoint is not None and checkpoint.last_seq != header['store_seq']:
+                    touched.update(db.session.execute(select(GridPosition.grid_config_id).distinct()
+                                                      .where(GridPosition.updated_at >= since)).scalars())
+                    touched.update(db.session.execute(select(TradeHistory.grid_config_id).distinct()
+                                                      .where(TradeHistory.id > header['last_trade_id'])).scalars())
+                touched &= set(self.book.grids)
+                if touched:
+                    rows = {}
+                    for row in GridPosition.query.filter(GridPosition.grid_config_id.in_(touched)):
+                        rows.setdefault(row.grid_config_id, []).append(row)
+                    for grid in GridConfig.query.filter(GridConfig.id.in_(touched)):
+                        self._register(grid, self.store.positions(grid.id, rows.get(grid.id, [])))
+                # Grids kept from the snapshot still need their risk ledger entries
+                unaccounted = [grid_id for grid_id in self.book.grids if grid_id not in self.risk.grids]
+                if unaccounted:
+                    for grid in db.session.execute(select(
+                            GridConfig.id, GridConfig.user_id, GridConfig.wallet_allocation, GridConfig.leverage
+                    ).where(GridConfig.id.in_(unaccounted))):
+                        self.risk.load_grid(grid.id, grid.user_id, grid.wallet_allocation, grid.leverage,
+                                            self.book.positions(grid.id))
+            finally:
+                db.session.remove()
+        await self.reconcile_risk(only_unknown=True)
+
+        groups = {}
+        for record in self.book.grids.values():
+            groups.setdefault((record.user_id, record.symbol), []).append(record)
+        start_time = int((since - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)
+        results = await asyncio.gather(*[
+            self.reconcile_symbol(self.clients[user_id], symbol, records, start_time)
+            for (user_id, symbol), records in groups.items() if user_id in self.clients
+        ], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error reconciling engine snapshot: {result}")
+        logger.info(f"Warm start: reloaded {len(touched)} grids, {len(self._pending)} grids have levels to settle")
+
+    async def reconcile_symbol(self, client, symbol, records, start_time):
+        """Schedule the levels of one user's grids on ``symbol`` that the exchange changed since ``start_time``"""
+        grids = {r.grid_id: r for r in records}
+        known = {}
+        for record in records:
+            for price, order_id in record.rows[:record.count][['price', 'order_id']].tolist():
+                known[order_id] = (record.grid_id, int(np.abs(record.levels - price).argmin()))
+
+        fills = await self._fetch_all(client.get_user_trades, symbol, start_time, 'from_id', 'id')
+        for trade in fills:
+            if trade['orderId'] in known:
+                grid_id, level = known[trade['orderId']]
+                self._schedule(grid_id, [level])
+
+        orders = await self._fetch_all(client.get_all_orders, symbol, start_time, 'order_id', 'orderId')
+        adopted = 0
+        for order in orders:
+            if order['orderId'] in known:
+                if order['status'] != 'NEW':
+                    grid_id, level = known[order['orderId']]
+                    self._schedule(grid_id, [level])
+                continue
+            parsed = parse_client_order_id(order.get('clientOrderId'))
+            if parsed is None or parsed[0] not in grids or order['status'] not in ('NEW', 'PARTIALLY_FILLED', 'FILLED'):
+                continue
+            # Placed after the snapshot and never written down before the restart
+            grid_id, _, position_type, level = parsed
+            self.store.insert_position(
+                grid_config_id=grid_id,
+                position_type=position_type,
+                price_level=float(order['price']),
+                quantity=float(order['origQty']),
+                order_id=order['orderId'],
+                is_filled=False,
+                client_order_id=order['clientOrderId']
+            )
+            self._schedule(grid_id, [level])
+            adopted += 1
+        if adopted:
+            logger.warning(f"Adopted {adopted} orders on {symbol} placed after the engine snapshot")
+
+    async def _fetch_all(self, method, symbol, start_time, cursor, key, limit=1000):
+        # Page forward by id (``cursor`` argument, ``key`` field) until a short page
+        items = await method(symbol, start_time=start_time, limit=limit)
+        result = list(items)
+        while len(items) == limit:
+            items = await method(symbol, limit=limit, **{cursor: items[-1][key] + 1})
+            result.extend(items)
+        return result
+
+    async def reconcile_risk(self, only_unknown=False):
+        """Refresh the ledger's wallet balances from one account request per user"""
+        users = [user for user in self.risk.users.values()
+                 if user.user_id in self.clients and not (only_unknown and user.balance is not None)]
+        accounts = await asyncio.gather(*[self.clients[user.user_id].get_account_info() for user in users],
+                                        return_exceptions=True)
+        for user, account in zip(users, accounts):
+            if isinstance(account, Exception):
+                logger.error(f"Error reconciling risk ledger for user {user.user_id}: {account}")
+                continue
+            self.risk.reconcile(user.user_id, account)
+
+    async def _every(self, interval, func, delay=0):
+        if delay:
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        while not self._stop.is_set():
+            try:
+                await func()
+            except Exception as e:
+                logger.error(f"Error in engine task {func.__name__}: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def on_price(self, symbol, price):
+        """Price update callback: schedule work only for grids whose levels were crossed"""
+        if self.ticks is not None:
+            self.ticks.append(symbol, price)
+        for grid_id in self.book.out_of_range(symbol, price).tolist():
+            # Trailing grid out of range: shift the range and move the orders with it
+            self._rebalance.add(grid_id)
+            self._schedule(grid_id)
+        owners, level_index = self.book.crossed(symbol, price)
+        if len(owners):
+            crossed = {}
+            for grid_id, level in zip(owners.tolist(), level_index.tolist()):
+                crossed.setdefault(grid_id, []).append(level)
+            for grid_id, levels in crossed.items():
+                self._schedule(grid_id, levels)
+
+    def _schedule(self, grid_id, levels=None):
+        # ``None`` means every level; it absorbs any partial level set
+        pending = self._pending.get(grid_id, set())
+        if levels is None or pending is None:
+            self._pending[grid_id] = None
+        else:
+            self._pending[grid_id] = pending | set(levels)
+        if grid_id not in self._running:
+            self._running.add(grid_id)
+            asyncio.get_running_loop().create_task(self._drain(grid_id))
+
+    async def _drain(self, grid_id):
+        # Crossings that arrive while a grid is being processed are merged and run next
+        try:
+            while grid_id in self._pending:
+                levels = self._pending.pop(grid_id)
+                record = self.book.get(grid_id)
+                if record is None:
+                    break
+                await self.process_grid(grid_id, levels, self.book.last_price(record.symbol))
+        finally:
+            self._running.discard(grid_id)
+
+    async def refresh(self):
+        """Sync the grid book with active grids in the database (no exchange requests)"""
+        handover = set()
+        if self.coordinator is not None:
+            try:
+                _, handover = self.coordinator.sync()
+            finally:
+                if not self.coordinator.holds_lease() and len(self.book):
+                    # Other workers may claim these users any moment; run them again once the heartbeat is back
+                    logger.error(f"Engine worker {self.coordinator.worker_id} lost its lease, "
+                                 f"stopping {len(self.book)} grids")
+                    for grid_id in list(self.book.grids):
+                        self._unregister(grid_id)
+            if not self.coordinator.holds_lease():
+                return
+        with self.app.app_context():
+            try:
+                # Only id/user/version per grid; full configs and positions are loaded for new or edited grids
+                query = select(GridConfig.id, GridConfig.user_id, GridConfig.updated_at).where(GridConfig.is_active == true())
+                if self.coordinator is not None:
+                    query = query.join(ShardAssignment, ShardAssignment.user_id == GridConfig.user_id).where(
+                        ShardAssignment.worker_id == self.coordinator.worker_id)
+                active_grids = [g for g in db.session.execute(query).all() if g.user_id not in handover]
+                users = {u.id: u for u in User.query.filter(User.id.in_(list({g.user_id for g in active_grids}))).all()}
+
+                if self.exchange_info is None and active_grids:
+                    self.exchange_info = await AsyncBinanceClient(session=self.session).get_exchange_info()
+
+                seen = set()
+                changed = []
+                for grid in active_grids:
+                    user = users.get(grid.user_id)
+                    if not user or not user.api_key or not user.api_secret:
+                        continue
+                    seen.add(grid.id)
+
+                    client = self.clients.get(user.id)
+                    if client is None or (client.api_key, client.api_secret) != (user.api_key, user.api_secret):
+                        self.clients[user.id] = AsyncBinanceClient(user.api_key, user.api_secret, session=self.session)
+
+                    record = self.book.get(grid.id)
+                    if record is None:
+                        # First time this process sees the grid: adopt orders a crashed pass left behind
+                        self._recover.add(grid.id)
+                    if record is None or record.version != grid.updated_at:
+                        changed.append(grid.id)
+
+                if changed:
+                    rows = {}
+                    for row in GridPosition.query.filter(GridPosition.grid_config_id.in_(changed)):
+                        rows.setdefault(row.grid_config_id, []).append(row)
+                    for grid in GridConfig.query.filter(GridConfig.id.in_(changed)):
+                        self._register(grid, self.store.positions(grid.id, rows.get(grid.id, [])))
+                        # New or edited grids are rebalanced and get a full pass straight away
+                        self._rebalance.add(grid.id)
+                        self._schedule(grid.id)
+
+                removed = set(self.book.grids) - seen
+                if removed:
+                    # Stopped grids lose their staged positions (the stop removes the rows); grids handed to
+                    # another worker keep them until they are flushed
+                    still_active = set(db.session.execute(select(GridConfig.id).where(
+                        GridConfig.id.in_(removed), GridConfig.is_active == true())).scalars())
+                    for grid_id in removed:
+                        self._unregister(grid_id)
+                        if grid_id not in still_active:
+                            self.store.discard(grid_id)
+
+                if changed:
+                    # New users need a balance before any of their orders can pass the risk check
+                    await self.reconcile_risk(only_unknown=True)
+
+                if handover:
+                    # Hand users over once none of their grids is mid-pass and their writes are flushed
+                    busy = set(db.session.execute(select(GridConfig.user_id).where(
+                        GridConfig.id.in_(list(self._running)))).scalars()) if self._running else set()
+                    idle = handover - busy
+                    if idle:
+                        self.store.flush()
+                        self.coordinator.release(idle)
+            finally:
+                db.session.remove()
+
+    def _register(self, grid, positions):
+        quantizer = symbol_quantizer(self.exchange_info, grid.symbol)
+        levels = quantizer.prices(quantizer.ladder(grid.lower_bound, grid.upper_bound, grid.grid_size))
+        self.book.load(grid.id, grid.user_id, grid.symbol, levels, grid.updated_at, bool(grid.trailing), positions)
+        self.risk.load_grid(grid.id, grid.user_id, grid.wallet_allocation, grid.leverage, positions)
+
+    def _unregister(self, grid_id):
+        self.book.remove(grid_id)
+        self.risk.remove_grid(grid_id)
+        self._pending.pop(grid_id, None)
+        self._rebalance.discard(grid_id)
+        self._recover.discard(grid_id)
+
+    def _generation(self, grid_config):
+        # A pass's grid_config may predate the flush of generations this process assigned
+        return max(self._generations.get(grid_config.id, 0), grid_config.order_generation or 0)
+
+    def _next_generation(self, grid_config):
+        """Assign the grid's next order generation without a database round trip on the loop.
+
+        The generation is journaled and fsynced before it is returned, so it
+        survives a crash before any order carrying it is sent; the store
+        writes it to grid_config on its next flush.
+        """
+        generation = self._generation(grid_config) + 1
+        self._generations[grid_config.id] = generation
+        self.store.set_generation(grid_config.id, generation)
+        self.store.sync()
+        return generation
+
+    def _holds_lease(self):
+        return self.coordinator is None or self.coordinator.holds_lease()
+
+    async def process_grid(self, grid_id, levels=None, current_price=None):
+        """Run the grid strategy for one grid, restricted to ``levels`` when given"""
+        with self.app.app_context():
+            try:
+                grid = GridConfig.query.get(grid_id)
+                client = self.clients.get(grid.user_id) if grid and grid.is_active else None
+                if client is None or grid_id not in self.book:
+                    return
+                positions = self.book.positions(grid_id)
+                # Nothing below writes through the session, release its connection before awaiting
+                db.session.remove()
+                # The lease is checked before every step that sends orders; a pass spans several requests
+                if not self._holds_lease():
+                    return
+                if grid_id in self._recover:
+                    self._recover.discard(grid_id)
+                    await self.recover_orders(client, grid, positions, self.exchange_info)
+                    positions = self.book.positions(grid_id)
+                if grid_id in self._rebalance:
+                    if not self._holds_lease():
+                        return
+                    self._rebalance.discard(grid_id)
+                    grid = await self.rebalance_grid(client, grid, positions, self.exchange_info, current_price)
+                    positions = self.book.positions(grid_id)
+                if not self._holds_lease():
+                    return
+                await self.execute_grid_strategy(client, grid, positions, self.exchange_info, current_price, levels)
+            except Exception as e:
+                logger.error(f"Error executing grid strategy: {e}")
+            finally:
+                db.session.remove()
+                self.store.sync()
+
+        if self.store.pending >= self.store.max_batch:
+            try:
+                self.store.flush()
+            except Exception:
+                # Already logged by the store; the batch stays staged for the next attempt
+                pass
+
+    async def run_cycle(self):
+        """Full resync: refresh exchangeInfo and re-evaluate every level of every grid"""
+        self.exchange_info = await AsyncBinanceClient(session=self.session).get_exchange_info()
+        await self.refresh()
+        for grid_id in list(self.book.grids):
+            self._schedule(grid_id)
+        logger.debug(f"Resynced {len(self.book)} active grid configurations")
+
+    async def rebalance_grid(self, client, grid_config, positions, exchange_info, current_price=None):
+        """Move the grid's open orders onto its target ladder with the fewest operations.
+
+        Trailing grids whose price left the range get their bounds shifted
+        first. Matching orders are kept, the rest are amended in place where
+        possible, and only the surplus is batch-cancelled or batch-placed.
+        Returns the (possibly updated) grid config.
+        """
+        symbol = grid_config.symbol
+        if current_price is None:
+            current_price = await client.get_symbol_price(symbol)
+        quantizer = await client.get_quantizer(symbol, exchange_info)
+
+        if grid_config.trailing and not grid_config.lower_bound <= current_price <= grid_config.upper_bound:
+            lower, upper = shift_range(grid_config.lower_bound, grid_config.upper_bound,
+                                       grid_config.grid_size, current_price)
+            lower, upper = quantizer.price(quantizer.ticks(lower)), quantizer.price(quantizer.ticks(upper))
+            GridConfig.query.filter_by(id=grid_config.id).update({'lower_bound': lower, 'upper_bound': upper})
+            db.session.commit()
+            grid_config = GridConfig.query.get(grid_config.id)
+            self._register(grid_config, self.book.positions(grid_config.id))
+            db.session.remove()
+            logger.info(f"Trailing grid {grid_config.id} shifted to {lower}-{upper}")
+
+        quantity = quantizer.round_quantity(grid_config.quantity_per_grid)
+        levels = quantizer.prices(
+            quantizer.ladder(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)).tolist()
+        tolerance = quantizer.tick / 2
+        plan = plan_rebalance(positions, target_ladder(levels, current_price, positions, tolerance),
+                              quantity, tolerance)
+        if not (plan.amend or plan.cancel or plan.place):
+            return grid_config
+
+        # Cancel first so the margin is free for the amended and new orders
+        batches = chunks(plan.cancel, CANCEL_BATCH_SIZE)
+        results = await asyncio.gather(*[
+            client.cancel_batch_orders(symbol, [p.order_id for p in batch]) for batch in batches
+        ], return_exceptions=True)
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error cancelling orders for grid {grid_config.id}: {result}")
+                continue
+            for position, item in zip(batch, result):
+                if 'code' in item:
+                    # Probably filled meanwhile; update_order_status will settle it
+                    logger.warning(f"Could not cancel order {position.order_id}: {item.get('msg')}")
+                    continue
+                self.store.delete_position(grid_config.id, position.order_id)
+
+        # An amend that moves an order up, or to a larger quantity, ties up more margin
+        amend = self._within_allocation(grid_config, plan.amend, [price for _, price in plan.amend], quantity,
+                                        replaces=[(p.price_level, p.quantity) for p, _ in plan.amend])
+        batches = chunks(amend, MODIFY_BATCH_SIZE)
+        try:
+            results = await asyncio.gather(*[
+                client.modify_batch_orders(symbol, [
+                    {'order_id': p.order_id, 'side': SIDES[p.position_type][0], 'quantity': quantity, 'price': price}
+                    for p, price in batch
+                ]) for batch in batches
+            ], return_exceptions=True)
+            for batch, result in zip(batches, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error amending orders for grid {grid_config.id}: {result}")
+                    continue
+                for (position, price), item in zip(batch, result):
+                    if 'code' in item:
+                        logger.warning(f"Could not amend order {position.order_id} to {price}: {item.get('msg')}")
+                        continue
+                    self.store.update_position(grid_config.id, position.order_id, price_level=price,
+                                               quantity=quantity)
+        finally:
+            for position, price in amend:
+                self.risk.settle(grid_config.id, price, quantity, replaces=(position.price_level, position.quantity))
+
+        place = self._within_allocation(grid_config, plan.place, [price for _, price in plan.place], quantity)
+        generation = self._next_generation(grid_config) if place else None
+        orders = [{'side': SIDES[t][0], 'position_side': SIDES[t][1], 'quantity': quantity, 'price': price,
+                   'client_order_id': client_order_id(grid_config.id, generation, t, level_index(levels, price))}
+                  for t, price in place]
+        batches = chunks(orders, PLACE_BATCH_SIZE)
+        try:
+            results = await asyncio.gather(*[
+                client.place_batch_orders(symbol, batch) for batch in batches
+            ], return_exceptions=True)
+            for batch, result in zip(batches, results):
+                if isinstance(result, Exception):
+                    # The batch may have been accepted before the error; look the orders up by client id
+                    logger.warning(f"Error placing orders for grid {grid_config.id}, recovering: {result}")
+                    result = await self._recover_batch(client, symbol, batch)
+                for order, item in zip(batch, result):
+                    if item is not None and item.get('code') in UNKNOWN_OUTCOME_CODES:
+                        item = (await self._recover_batch(client, symbol, [order]))[0]
+                    if item is None or 'code' in item:
+                        logger.error(f"Error placing {order['side']} order at {order['price']}: "
+                                     f"{item.get('msg') if item else 'not accepted'}")
+                        continue
+                    self.store.insert_position(
+                        grid_config_id=grid_config.id,
+                        position_type='long' if order['side'] == 'BUY' else 'short',
+                        price_level=order['price'],
+                        quantity=quantity,
+                        order_id=item['orderId'],
+                        is_filled=False,
+                        client_order_id=order['client_order_id']
+                    )
+        finally:
+            # Recorded orders are in the ledger now; drop the in-flight holds
+            for _, price in place:
+                self.risk.settle(grid_config.id, price, quantity)
+
+        logger.info(f"Rebalanced grid {grid_config.id}: kept {len(plan.keep)}, amended {len(amend)}, "
+                    f"cancelled {len(plan.cancel)}, placed {len(place)}")
+        return grid_config
+
+    def _within_allocation(self, grid_config, orders, prices, quantity, replaces=None):
+        # The orders whose margin the ledger could hold, in order; ``replaces`` lists what amends move from
+        replaces = replaces or [None] * len(orders)
+        allowed = [order for order, price, old in zip(orders, prices, replaces)
+                   if self.risk.reserve(grid_config.id, price, quantity, old)]
+        if len(allowed) < len(orders):
+            logger.warning(f"Grid {grid_config.id}: {len(orders) - len(allowed)} orders skipped, "
+                           f"wallet allocation of {grid_config.wallet_allocation}% reached")
+        return allowed
+
+    async def _recover_batch(self, client, symbol, orders):
+        # Each order as placed on the exchange, an error dict, or None when it was never accepted
+        found = await asyncio.gather(*[client.find_order(symbol, order['client_order_id']) for order in orders],
+                                     return_exceptions=True)
+        return [{'code': 0, 'msg': str(item)} if isinstance(item, Exception) else item for item in found]
+
+    async def recover_orders(self, client, grid_config, positions, exchange_info):
+        """Adopt orders of the grid's latest placement pass that never reached the database.
+
+        A crash between submitting orders and recording them leaves live
+        orders without a position. Their client ids are recomputed from the
+        grid's current generation for every level that has no order, and
+        looked up so the next pass does not place them again.
+        """
+        generation = self._generation(grid_config)
+        if not generation:
+            return
+        symbol = grid_config.symbol
+        quantizer = await client.get_quantizer(symbol, exchange_info)
+        ladder = quantizer.ladder(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
+        held = {(p.position_type, quantizer.ticks(p.price_level)) for p in positions}
+        known = {str(p.order_id) for p in positions}
+        missing = [(position_type, i, level)
+                   for i, (ticks, level) in enumerate(zip(ladder.tolist(), quantizer.prices(ladder).tolist()))
+                   for position_type in SIDES if (position_type, ticks) not in held]
+        found = await self._recover_batch(client, symbol, [
+            {'client_order_id': client_order_id(grid_config.id, generation, t, i)}
+            for t, i, _ in missing
+        ])
+        adopted = 0
+        for (position_type, i, level), order in zip(missing, found):
+            if order is None or 'code' in order or str(order['orderId']) in known:
+                continue
+            if order['status'] not in ('NEW', 'PARTIALLY_FILLED', 'FILLED'):
+                continue
+            # Fills are settled (trade + profit order) by the next update_order_status
+            self.store.insert_position(
+                grid_config_id=grid_config.id,
+                position_type=position_type,
+                price_level=level,
+                quantity=float(order['origQty']),
+                order_id=order['orderId'],
+                is_filled=False,
+                client_order_id=order['clientOrderId']
+            )
+            adopted += 1
+        if adopted:
+            logger.warning(f"Recovered {adopted} untracked orders for grid {grid_config.id}")
+
+    async def execute_grid_strategy(self, client, grid_config, positions, exchange_info, current_price=None, levels=None):
+        """Execute grid trading strategy for a configuration
+
+        ``positions`` are the grid's positions including staged writes. ``levels`` limits the pass to those ladder indices (the ones a price
+        move crossed); ``None`` evaluates every level.
+        """
+        logger.debug(f"Executing grid strategy for config {grid_config.id}")
+        if current_price is None:
+            current_price = await client.get_symbol_price(grid_config.symbol)
+        logger.debug(f"Current price for {grid_config.symbol}: {current_price}")
+
+        quantizer = await client.get_quantizer(grid_config.symbol, exchange_info)
+        record = self.book.get(grid_config.id)
+        ladder = quantizer.ticks_array(record.levels) if record is not None else \
+            quantizer.ladder(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
+        quantity_steps = quantizer.steps(grid_config.quantity_per_grid)
+        quantity = quantizer.quantity(quantity_steps)
+        quantity_text = quantizer.format_quantity(quantity_steps)
+
+        # Levels (in ticks) that already hold a position of each type
+        held = {(p.position_type, quantizer.ticks(p.price_level)) for p in positions}
+
+        # Work out every missing order first, then submit them all at once
+        pending = []
+        affected = set()
+        for i, (ticks, price_level) in enumerate(zip(ladder.tolist(), quantizer.prices(ladder).tolist())):
+            if levels is not None and i not in levels:
+                continue
+            affected.add(ticks)
+
+            if price_level < current_price and ('long', ticks) not in held:
+                pending.append(("long", "BUY", "LONG", price_level, i))
+            if price_level > current_price and ('short', ticks) not in held:
+                pending.append(("short", "SELL", "SHORT", price_level, i))
+
+        # Client order ids make every submission safe to retry and to run concurrently
+        pending = self._within_allocation(grid_config, pending, [p[3] for p in pending], quantity)
+        generation = self._next_generation(grid_config) if pending else None
+        try:
+            orders = await asyncio.gather(*[
+                client.submit_order(
+                    grid_config.symbol, side, position_side, quantity_text, quantizer.format_price(ladder[i]),
+                    client_order_id(grid_config.id, generation, position_type, i)
+                )
+                for position_type, side, position_side, price_level, i in pending
+            ], return_exceptions=True)
+
+            for (position_type, _, _, price_level, _), order in zip(pending, orders):
+                if isinstance(order, Exception):
+                    logger.error(f"Error placing {position_type} order at {price_level}: {order}")
+                    continue
+                self.store.insert_position(
+                    grid_config_id=grid_config.id,
+                    position_type=position_type,
+                    price_level=price_level,
+                    quantity=quantity,
+                    order_id=order['orderId'],
+                    is_filled=False,
+                    client_order_id=order.get('clientOrderId')
+                )
+                logger.debug(f"Placed {position_type} order at {price_level}")
+        finally:
+            for _, _, _, price_level, _ in pending:
+                self.risk.settle(grid_config.id, price_level, quantity)
+
+        await self.update_order_status(client, grid_config, positions, quantizer,
+                                       None if levels is None else affected)
+
+    async def update_order_status(self, client, grid_config, positions, quantizer, ticks=None):
+        """Update status of orders for a grid configuration, optionally only at the levels in ``ticks``"""
+        open_positions = [p for p in positions
+                          if p.order_id and not p.is_filled and
+                          (ticks is None or quantizer.ticks(p.price_level) in ticks)]
+
+        statuses = await asyncio.gather(*[
+            client.get_order(grid_config.symbol, position.order_id) for position in open_positions
+        ], return_exceptions=True)
+
+        grid_step = (grid_config.upper_bound - grid_config.lower_bound) / (grid_config.grid_size - 1)
+        profit_orders = []
+
+        for position, order_status in zip(open_positions, statuses):
+            if isinstance(order_status, BinanceAPIException):
+                # If order not found, remove from database
+                if order_status.code == -2013:
+                    self.store.delete_position(grid_config.id, position.order_id)
+                else:
+                    logger.error(f"Error checking order status: {order_status}")
+                continue
+            if isinstance(order_status, Exception):
+                logger.error(f"Unexpected error checking order status: {order_status}")
+                continue
+
+            if order_status['status'] == 'FILLED':
+                self.store.update_position(grid_config.id, position.order_id, is_filled=True)
+
+                self.store.insert_trade(
+                    user_id=grid_config.user_id,
+                    grid_config_id=grid_config.id,
+                    symbol=grid_config.symbol,
+                    order_id=position.order_id,
+                    side=order_status['side'],
+                    position_side=order_status['positionSide'],
+                    price=float(order_status['price']),
+                    quantity=float(order_status['executedQty']),
+                    realized_profit=0,  # To be calculated later
+                    commission=float(order_status.get('commission', 0)),
+                    executed_at=datetime.datetime.fromtimestamp(order_status['updateTime']/1000)
+                )
+
+                # For long positions, sell one level up; for short positions, buy one level down
+                fill_price = float(order_status['price'])
+                if order_status['positionSide'] == "LONG":
+                    profit_price = fill_price + grid_step
+                else:
+                    profit_price = fill_price - grid_step
+
+                profit_orders.append(client.submit_order(
+                    grid_config.symbol,
+                    "SELL" if order_status['side'] == "BUY" else "BUY",
+                    "LONG" if order_status['positionSide'] == "LONG" else "SHORT",
+                    order_status['executedQty'],
+                    quantizer.format_price(quantizer.ticks(profit_price)),
+                    take_profit_order_id(grid_config.id, position.order_id)
+                ))
+
+            elif order_status['status'] in ['CANCELED', 'EXPIRED', 'REJECTED']:
+                self.store.delete_position(grid_config.id, position.order_id)
+
+        for result in await asyncio.gather(*profit_orders, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Error placing profit taking order: {result}")
+
+
+def _slot_path(path, slot):
+    # Slot 0 keeps the unsuffixed name so single-worker journals and snapshots carry over
+    if slot == 0 or not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{slot}{ext}"
+
+
+def start_engine(app):
+    """Start the asyncio grid engine on a daemon thread with its own event loop.
+
+    The thread is ``engine.thread``; engine.join() stops the engine and
+    waits for it, and runs at interpreter exit so the shutdown snapshot and
+    flushes are written.
+
+    With ENGINE_SHARDING=1 up to ENGINE_WORKERS_PER_HOST processes on this
+    host (and any number of hosts) each run an engine for their share of the
+    users; every process takes the first free slot, whose journal lock it
+    holds for as long as it runs.
+    """
+    sharded = os.environ.get("ENGINE_SHARDING") == "1"
+    slots = int(os.environ.get("ENGINE_WORKERS_PER_HOST", 1)) if sharded else 1
+    journal = os.environ.get("WRITE_BEHIND_JOURNAL", os.path.join(app.instance_path, "write_behind.journal"))
+    for slot in range(slots):
+        try:
+            store = WriteBehindStore(
+                app,
+                _slot_path(journal, slot),
+                max_batch=int(os.environ.get("WRITE_BEHIND_MAX_BATCH", 500)),
+                max_delay=float(os.environ.get("WRITE_BEHIND_MAX_DELAY", 1.0))
+            )
+            break
+        except RuntimeError as e:
+            # Another worker on this host already owns the journal and runs the engine
+            logger.info(f"Grid engine slot {slot} not available in this process: {e}")
+    else:
+        logger.info("Grid engine not started in this process: every engine slot on this host is taken")
+        return None
+    store.recover()
+    coordinator = None
+    if sharded:
+        worker_id = f"{os.environ.get('ENGINE_WORKER_ID', socket.gethostname())}-{slot}"
+        coordinator = ShardCoordinator(app, worker_id)
+        logger.info(f"Grid engine running as shard worker {worker_id}")
+    engine = AsyncGridEngine(
+        app,
+        store,
+        # Every worker sees every price; one per host records them
+        ticks=get_tick_store(app) if slot == 0 else None,
+        refresh_interval=float(os.environ.get("ENGINE_REFRESH_INTERVAL", 10)),
+        resync_interval=float(os.environ.get("ENGINE_RESYNC_INTERVAL", 300)),
+        max_connections=int(os.environ.get("ENGINE_MAX_CONNECTIONS", 1000)),
+        snapshot_path=_slot_path(
+            os.environ.get("ENGINE_SNAPSHOT", os.path.join(app.instance_path, "engine.snapshot")), slot),
+        snapshot_interval=float(os.environ.get("ENGINE_SNAPSHOT_INTERVAL", 60)),
+        coordinator=coordinator
+    )
+    engine.load_snapshot()
+    engine.thread = threading.Thread(target=asyncio.run, args=(engine.run_forever(),),
+                                     name="grid-engine", daemon=True)
+    engine.thread.start()
+    # Daemon threads are killed at exit without running their finally blocks; shut down cleanly first
+    atexit.register(engine.join, ENGINE_SHUTDOWN_TIMEOUT)
+    return engine
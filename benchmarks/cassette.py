@@ -0,0 +1,58 @@
+"""Summarise the traffic shape of a recorded Binance cassette: rate, endpoints, errors, latency.
+
+Record with BINANCE_CASSETTE_MODE=record BINANCE_CASSETTE=instance/day.jsonl.gz,
+replay with BINANCE_CASSETTE_MODE=replay (BINANCE_CASSETTE_SPEED=0 for no latency)
+or through the engine with benchmarks/engine_replay.py.
+
+    python benchmarks/cassette.py instance/day.jsonl.gz
+"""
+import os
+import sys
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cassette import CassettePlayer  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0
+
+
+def summarise(player):
+    entries = player.entries
+    if player.prices:
+        span = player.prices[-1]['t'] - player.prices[0]['t'] or 1
+        print(f"{len(player.prices)} price feed messages over {span / 3600:.2f} h, "
+              f"{sum(len(message['b']) for message in player.prices)} prices")
+    if not entries:
+        print("no recorded requests")
+        return
+    span = entries[-1]['t'] - entries[0]['t'] or 1
+    per_second = defaultdict(int)
+    for entry in entries:
+        per_second[int(entry['t'])] += 1
+    print(f"{len(entries)} requests over {span / 3600:.2f} h from {len({e['a'] for e in entries})} accounts, "
+          f"mean {len(entries) / span:.1f}/s, peak {max(per_second.values())}/s")
+    by_endpoint = defaultdict(list)
+    for entry in entries:
+        by_endpoint[(entry['m'], entry['p'])].append(entry)
+    print(f"{'endpoint':40} {'count':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for (method, path), items in sorted(by_endpoint.items(), key=lambda kv: -len(kv[1])):
+        latencies = [e['d'] for e in items]
+        errors = sum(1 for e in items if e['s'] >= 400)
+        print(f"{method + ' ' + path:40} {len(items):8d} {errors:7d} {percentile(latencies, 0.5):8.1f} "
+              f"{percentile(latencies, 0.95):8.1f} {percentile(latencies, 0.99):8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    summarise(CassettePlayer(args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Replay a recorded trading day through the grid engine and report how long its work took.
+
+Starts the async engine in a child process against a copy of the database
+the cassette was recorded with (its users' API keys identify the recorded
+accounts) and a replaying cassette, so prices and exchange responses come
+from the recording and nothing reaches Binance. The price messages are
+published on the cassette's clock (--speed times the recorded pace, 0 for
+as fast as the engine keeps up) and every grid pass, full resync and
+refresh is timed. Run it on two revisions with the same cassette to
+compare them; --record appends the result as a JSON line.
+
+    python benchmarks/engine_replay.py instance/day.jsonl.gz --database instance/day.db --speed 60
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMED = ('process_grid', 'run_cycle', 'refresh')
+
+# Runs in the child with the replay environment; prints one JSON line of results
+CHILD = r'''
+import sys, time, json
+sys.path.insert(0, {root!r})
+from app import create_app, db
+from schema import upgrade_schema
+from cassette import cassette
+import async_engine
+
+timings = {{name: [] for name in {timed!r}}}
+
+def timed(name, func):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timings[name].append(time.perf_counter() - started)
+    return wrapper
+
+for name in timings:
+    setattr(async_engine.AsyncGridEngine, name, timed(name, getattr(async_engine.AsyncGridEngine, name)))
+
+app = create_app()
+with app.app_context():
+    upgrade_schema(app, db)
+started = time.perf_counter()
+engine = async_engine.start_engine(app)
+deadline = started + {duration}
+while not cassette.player.prices_done and time.perf_counter() < deadline:
+    time.sleep(0.05)
+replayed = time.perf_counter() - started
+# Grid passes triggered by the last prices
+while engine._running and time.perf_counter() < deadline + 30:
+    time.sleep(0.05)
+drained = time.perf_counter() - started
+engine.join(30)
+print(json.dumps({{
+    'replay_seconds': replayed,
+    'drain_seconds': drained,
+    'complete': cassette.player.prices_done,
+    'price_messages': len(cassette.player.prices),
+    'grids': len(engine.book),
+    'hits': cassette.player.hits,
+    'misses': cassette.player.misses,
+    'timings': timings,
+}}))
+'''
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cassette', help="recorded log (BINANCE_CASSETTE_MODE=record), with price messages")
+    parser.add_argument('--database', required=True,
+                        help="SQLite file (copied, never modified) or database URL the recording was made with")
+    parser.add_argument('--speed', type=float, default=0, help="replay pace; 1 is the recorded pace, 0 no waiting")
+    parser.add_argument('--duration', type=float, default=600, help="stop after this many seconds")
+    parser.add_argument('--record', help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if '://' not in database or database.startswith('sqlite:///'):
+            # The engine writes positions and trades; replay against a throwaway copy
+            path = database[len('sqlite:///'):] if database.startswith('sqlite:///') else database
+            shutil.copy(path, os.path.join(tmp, 'replay.db'))
+            database = f"sqlite:///{os.path.join(tmp, 'replay.db')}"
+        env = dict(os.environ, DATABASE_URL=database,
+                   BINANCE_CASSETTE_MODE='replay', BINANCE_CASSETTE=os.path.abspath(args.cassette),
+                   BINANCE_CASSETTE_SPEED=str(args.speed),
+                   WRITE_BEHIND_JOURNAL=os.path.join(tmp, 'write_behind.journal'),
+                   ENGINE_SNAPSHOT=os.path.join(tmp, 'engine.snapshot'),
+                   TICK_STORE_DIR=os.path.join(tmp, 'ticks'))
+        env.pop('ENGINE_SHARDING', None)
+        child = CHILD.format(root=ROOT, timed=TIMED, duration=args.duration)
+        output = subprocess.run([sys.executable, '-c', child], env=env, cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{result['price_messages']} price messages for {result['grids']} grids replayed in "
+          f"{result['replay_seconds']:.1f}s ({'complete' if result['complete'] else 'stopped at --duration'}), "
+          f"drained after {result['drain_seconds']:.1f}s; cassette hits {result['hits']}, misses {result['misses']}")
+    print(f"{'step':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'total':>10}")
+    for name in TIMED:
+        values = result['timings'][name]
+        mean = sum(values) / len(values) if values else 0
+        print(f"{name:<14}{len(values):>8}{mean * 1000:>8.1f}ms{percentile(values, 0.5) * 1000:>8.1f}ms"
+              f"{percentile(values, 0.95) * 1000:>8.1f}ms{percentile(values, 0.99) * 1000:>8.1f}ms"
+              f"{max(values, default=0) * 1000:>8.1f}ms{sum(values):>9.2f}s")
+
+    if args.record:
+        entry = {'time': time.time(), 'revision': git_revision(), 'cassette': args.cassette, 'speed': args.speed,
+                 'replay_seconds': result['replay_seconds'], 'complete': result['complete'],
+                 'hits': result['hits'], 'misses': result['misses'],
+                 'timings': {name: {'count': len(values), 'total': sum(values), 'p50': percentile(values, 0.5),
+                                    'p99': percentile(values, 0.99)}
+                             for name, values in result['timings'].items()}}
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark GridBook memory and per-tick crossing evaluation at engine scale.
+
+Loads ``--grids`` grids spread over ``--symbols`` symbols, each with
+``--levels`` levels and an open order per level, then replays a random walk
+of price ticks through GridBook.crossed/out_of_range and reports memory,
+ticks per second and the memory allocated per tick.
+
+    python benchmarks/grid_book.py --grids 50000 --symbols 20 --levels 40 --ticks 200000
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from grid_book import GridBook, StagedPosition  # noqa: E402
+
+
+def build(grids, symbols, levels, seed=1):
+    rng = np.random.default_rng(seed)
+    book = GridBook()
+    order_id = 1
+    for grid_id in range(1, grids + 1):
+        symbol = f"SYM{grid_id % symbols}USDT"
+        lower = 100 * rng.uniform(0.8, 0.99)
+        upper = 100 * rng.uniform(1.01, 1.2)
+        ladder = np.round(np.linspace(lower, upper, levels), 2)
+        positions = []
+        for price in ladder:
+            positions.append(StagedPosition(grid_id, 'long' if price < 100 else 'short', float(price), 1.0, order_id))
+            order_id += 1
+        book.load(grid_id, grid_id % 1000, symbol, ladder, None, grid_id % 10 == 0, positions)
+    return book
+
+
+def replay(book, symbols, ticks, seed=2):
+    rng = np.random.default_rng(seed)
+    walk = 100 + np.cumsum(rng.normal(0, 0.02, ticks))
+    names = [f"SYM{i}USDT" for i in range(symbols)]
+    crossings = 0
+    start = time.perf_counter()
+    for i, price in enumerate(walk.tolist()):
+        symbol = names[i % symbols]
+        book.out_of_range(symbol, price)
+        owners, _ = book.crossed(symbol, price)
+        crossings += len(owners)
+    return time.perf_counter() - start, crossings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grids', type=int, default=50000)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--levels', type=int, default=40)
+    parser.add_argument('--ticks', type=int, default=200000)
+    args = parser.parse_args()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    book = build(args.grids, args.symbols, args.levels)
+    # The first tick per symbol builds its index
+    for i in range(args.symbols):
+        book.crossed(f"SYM{i}USDT", 100.0)
+    load_time = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"loaded {args.grids} grids x {args.levels} levels in {load_time:.1f}s; "
+          f"arrays {book.nbytes() / 2**20:.0f} MiB, peak RSS +{(rss_after - rss_before) / 1024:.0f} MiB")
+
+    elapsed, crossings = replay(book, args.symbols, args.ticks)
+    print(f"{args.ticks} ticks in {elapsed:.2f}s ({args.ticks / elapsed:,.0f} ticks/s), {crossings} level crossings")
+
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    replay(book, args.symbols, 10000, seed=3)
+    grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename')
+                if stat.traceback[0].filename.endswith('grid_book.py'))
+    tracemalloc.stop()
+    print(f"memory retained by grid_book.py after 10000 ticks: {grown} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Measure how evenly the engine's consistent hash ring spreads users over workers
+and how many users move when a worker joins.
+
+    python benchmarks/shard_ring.py --users 100000 --workers 2 4 8 16
+"""
+import os
+import sys
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hash_ring import HashRing  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8, 16])
+    args = parser.parse_args()
+
+    users = range(1, args.users + 1)
+    for n in args.workers:
+        workers = [f"host-{i}" for i in range(n)]
+        ring = HashRing(workers)
+        owners = [ring.owner(u) for u in users]
+        counts = Counter(owners)
+        mean = args.users / n
+        grown = HashRing(workers + [f"host-{n}"])
+        moved = sum(1 for u, owner in zip(users, owners) if grown.owner(u) != owner)
+        print(f"{n:3d} workers: users per worker {min(counts.values())}-{max(counts.values())} "
+              f"(max {max(counts.values()) / mean:.2f}x mean); adding one moves "
+              f"{moved / args.users:.1%} (ideal {1 / (n + 1):.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark SQLite read/write throughput under concurrent engine and UI load.
+
+Runs writer threads that mimic the grid engine (batched GridPosition and
+TradeHistory writes) alongside reader threads that mimic dashboard polling
+(grid list, positions and the latest 50 trades), once with the default
+rollback-journal settings and once with the WAL profile from sqlite_profile.
+
+    python benchmarks/sqlite_concurrency.py --writers 1 --readers 8 --seconds 10
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import datetime
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_profile import apply_pragmas, create_read_engine, SQLITE_PRAGMAS  # noqa: E402
+
+SCHEMA = [
+    "CREATE TABLE grid_config (id INTEGER PRIMARY KEY, user_id INTEGER, symbol TEXT, is_active BOOLEAN)",
+    "CREATE TABLE grid_position (id INTEGER PRIMARY KEY, grid_config_id INTEGER, position_type TEXT, "
+    "price_level FLOAT, quantity FLOAT, order_id TEXT, is_filled BOOLEAN)",
+    "CREATE TABLE trade_history (id INTEGER PRIMARY KEY, grid_config_id INTEGER, side TEXT, "
+    "price FLOAT, quantity FLOAT, executed_at DATETIME)",
+]
+
+
+def setup(path, grids):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for stmt in SCHEMA:
+            conn.execute(text(stmt))
+        conn.execute(text("INSERT INTO grid_config (id, user_id, symbol, is_active) VALUES (:i, :u, 'BTCUSDT', 1)"),
+                     [{'i': i, 'u': i % 10} for i in range(1, grids + 1)])
+    engine.dispose()
+
+
+def make_engines(path, tuned):
+    if not tuned:
+        engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 5, 'check_same_thread': False})
+        return engine, engine
+    engine = create_engine(f"sqlite:///{path}",
+                           connect_args={'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000, 'check_same_thread': False})
+    event.listen(engine, 'connect', lambda conn, _: apply_pragmas(conn))
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+    return engine, create_read_engine(path)
+
+
+def writer(engine, grids, batch, stop, stats):
+    order_id = random.randint(0, 10**9)
+    while not stop.is_set():
+        grid_id = random.randint(1, grids)
+        rows = []
+        for _ in range(batch):
+            order_id += 1
+            rows.append({'g': grid_id, 'p': random.uniform(100, 200), 'o': str(order_id)})
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO grid_position (grid_config_id, position_type, price_level, quantity, "
+                                  "order_id, is_filled) VALUES (:g, 'long', :p, 0.01, :o, 0)"), rows)
+                conn.execute(text("INSERT INTO trade_history (grid_config_id, side, price, quantity, executed_at) "
+                                  "VALUES (:g, 'BUY', :p, 0.01, :t)"),
+                             [dict(r, t=datetime.datetime.utcnow()) for r in rows])
+            stats['writes'] += 1
+        except OperationalError:
+            stats['write_errors'] += 1
+
+
+def reader(engine, grids, stop, stats):
+    while not stop.is_set():
+        grid_id = random.randint(1, grids)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM grid_config WHERE user_id = :u"), {'u': grid_id % 10}).all()
+                conn.execute(text("SELECT * FROM grid_position WHERE grid_config_id = :g"), {'g': grid_id}).all()
+                conn.execute(text("SELECT * FROM trade_history WHERE grid_config_id = :g "
+                                  "ORDER BY executed_at DESC LIMIT 50"), {'g': grid_id}).all()
+            stats['reads'] += 1
+        except OperationalError:
+            stats['read_errors'] += 1
+
+
+def run(tuned, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup(path, args.grids)
+        write_engine, read_engine = make_engines(path, tuned)
+        stats = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+        stop = threading.Event()
+        threads = [threading.Thread(target=writer, args=(write_engine, args.grids, args.batch, stop, stats))
+                   for _ in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(read_engine, args.grids, stop, stats))
+                    for _ in range(args.readers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        write_engine.dispose()
+        read_engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=1, help='engine writer threads')
+    parser.add_argument('--readers', type=int, default=8, help='dashboard reader threads')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--grids', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=20, help='rows per write transaction')
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'writes/s':>12}{'reads/s':>12}{'w-errors':>10}{'r-errors':>10}")
+    for name, tuned in (('default', False), ('wal', True)):
+        stats = run(tuned, args)
+        print(f"{name:<10}{stats['writes'] / args.seconds:>12.1f}{stats['reads'] / args.seconds:>12.1f}"
+              f"{stats['write_errors']:>10}{stats['read_errors']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Measure how long a web worker takes to start: importing the app, create_app() and the first request.
+
+Every run is a fresh interpreter, like a gunicorn worker (re)spawn. The
+first run starts from an empty bytecode cache (a cold start after a
+deploy); the rest use the existing caches (a worker respawn). --record
+appends the result as a JSON line so startup time can be tracked across
+commits.
+
+    python benchmarks/startup.py --runs 10 --record instance/startup.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; prints one JSON line of phase timings
+CHILD = r'''
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+flask_app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({{
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'modules': len(sys.modules),
+    'binance_loaded': 'binance' in sys.modules,
+    'engine_loaded': 'async_engine' in sys.modules,
+}}))
+'''
+
+
+def run_once(env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT)], env=env, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+
+def summary(runs, key):
+    values = sorted(r[key] for r in runs)
+    return {'min': values[0], 'median': values[len(values) // 2], 'max': values[-1]}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help="respawn runs after the cold start")
+    parser.add_argument('--record', help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        # A throwaway database: startup must not need (or touch) the real one
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        env.pop('RUN_ENGINE', None)
+        # An empty bytecode cache: every module is compiled from source, as after a deploy
+        cold = run_once(dict(env, PYTHONPYCACHEPREFIX=os.path.join(tmp, 'pycache')))
+        respawns = [run_once(env) for _ in range(args.runs)]
+
+    phases = ('import', 'create_app', 'first_request', 'total')
+    print(f"{'phase':<14}{'cold':>10}{'respawn min':>14}{'median':>10}{'max':>10}")
+    for phase in phases:
+        stats = summary(respawns, phase) if respawns else {'min': 0, 'median': 0, 'max': 0}
+        print(f"{phase:<14}{cold[phase] * 1000:>8.0f}ms{stats['min'] * 1000:>12.0f}ms"
+              f"{stats['median'] * 1000:>8.0f}ms{stats['max'] * 1000:>8.0f}ms")
+    print(f"modules loaded: {cold['modules']}, python-binance loaded: {cold['binance_loaded']}, "
+          f"grid engine loaded: {cold['engine_loaded']}")
+
+    if args.record:
+        entry = {'time': time.time(), 'revision': git_revision(), 'python': sys.version.split()[0],
+                 'cold': cold, 'respawn': {phase: summary(respawns, phase) for phase in phases} if respawns else {}}
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+
+if __name__ == '__main__':
+    main()
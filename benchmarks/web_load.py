@@ -0,0 +1,314 @@
+"""Load-test the web tier: N simulated users polling the dashboard against gunicorn and a stand-in exchange.
+
+For every worker class and worker count it starts gunicorn on a throwaway
+SQLite database seeded with the users and their grids, points the Binance
+clients at a local stand-in exchange (BINANCE_FAPI_URL) that answers after
+--exchange-latency ms, and replays what dashboard.js does for each user:
+log in, load /dashboard, the wallet balance and a symbol price, fetch the
+full dashboard state, then poll it for changes every --poll-interval
+seconds (30 in the browser). Reports throughput, latency percentiles and
+error rates per configuration.
+
+    python benchmarks/web_load.py --users 200 --poll-interval 2 --duration 60 \\
+        --worker-class sync gthread --workers 2 4 --exchange-latency 150
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS = ('BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT')
+PASSWORD = 'load-test'
+# Same as CHART_WINDOW in grid_visualization.js
+CHART_WINDOW = 86400
+
+# Runs in a child process with the app's environment; creates the schema, users and grids
+SEED = r'''
+import sys
+sys.path.insert(0, {root!r})
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from schema import upgrade_schema
+from models import User, GridConfig
+app = create_app()
+with app.app_context():
+    upgrade_schema(app, db)
+    password_hash = generate_password_hash({password!r})
+    symbols = {symbols!r}
+    for i in range({users}):
+        user = User(username=f"load{{i}}", email=f"load{{i}}@example.com", password_hash=password_hash,
+                    api_key=f"key{{i}}", api_secret=f"secret{{i}}")
+        db.session.add(user)
+        db.session.flush()
+        for g in range({grids}):
+            db.session.add(GridConfig(user_id=user.id, symbol=symbols[(i + g) % len(symbols)], lower_bound=90,
+                                      upper_bound=110, grid_size=20, quantity_per_grid=0.01, leverage=1,
+                                      is_active=False))
+    db.session.commit()
+'''
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers the futures REST calls the web tier makes, after the configured latency"""
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        now = int(time.time() * 1000)
+        if url.path == '/fapi/v1/ping':
+            return self._reply(200, {})
+        if url.path == '/fapi/v1/time':
+            return self._reply(200, {'serverTime': now})
+        if url.path == '/fapi/v1/ticker/price':
+            return self._reply(200, {'symbol': params.get('symbol'), 'price': f"{100 + random.uniform(-1, 1):.2f}",
+                                     'time': now})
+        if url.path == '/fapi/v2/account':
+            return self._reply(200, {'totalInitialMargin': '0', 'assets': [
+                {'asset': 'USDT', 'walletBalance': '10000.00', 'availableBalance': '10000.00'}], 'positions': []})
+        if url.path == '/fapi/v1/exchangeInfo':
+            return self._reply(200, {'serverTime': now, 'symbols': [{
+                'symbol': symbol, 'status': 'TRADING', 'filters': [
+                    {'filterType': 'PRICE_FILTER', 'tickSize': '0.01'},
+                    {'filterType': 'LOT_SIZE', 'stepSize': '0.001', 'minQty': '0.001'},
+                    {'filterType': 'MIN_NOTIONAL', 'notional': '5'}]} for symbol in SYMBOLS]})
+        if url.path == '/fapi/v1/klines':
+            end = int(params.get('endTime', now))
+            start = int(params.get('startTime', end - 500 * 60000))
+            count = min(int(params.get('limit', 500)), 1500)
+            step = max(60000, (end - start) // count)
+            return self._reply(200, [[t, '100.0', '101.0', '99.0', '100.5', '10.0', t + step - 1]
+                                     for t in range(start, end, step)][:count])
+        return self._reply(404, {'code': -5000, 'msg': f"Path {url.path} is not served by the stand-in"})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+def run_stand_in(port, latency):
+    StandInHandler.latency = latency
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer(('127.0.0.1', port), StandInHandler).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, elapsed, ok):
+        self.latencies[name].append(elapsed)
+        if not ok:
+            self.errors[name] += 1
+
+    def all_latencies(self):
+        return [x for values in self.latencies.values() for x in values]
+
+
+async def timed(session, stats, name, method, url, expect=None, **kwargs):
+    """One request; returns the decoded JSON body (or None) and records its latency and outcome"""
+    started = time.perf_counter()
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            body = await response.read()
+            ok = response.status == expect if expect else response.status < 400
+            stats.record(name, time.perf_counter() - started, ok)
+            if ok and response.content_type == 'application/json':
+                return json.loads(body)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        stats.record(name, time.perf_counter() - started, False)
+    return None
+
+
+async def simulate_user(base, index, args, stats, deadline):
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(base, cookie_jar=aiohttp.CookieJar(unsafe=True), timeout=timeout) as session:
+        # Users don't all arrive in the same instant
+        await asyncio.sleep(random.uniform(0, args.ramp_up))
+        await timed(session, stats, 'login', 'POST', '/login',
+                    data={'username': f"load{index}", 'password': PASSWORD}, expect=302, allow_redirects=False)
+        # Page load: dashboard, create-grid form (balance, price), first full state
+        await timed(session, stats, 'dashboard', 'GET', '/dashboard')
+        await timed(session, stats, 'balance', 'GET', '/api/account/balance')
+        await timed(session, stats, 'price', 'GET', f"/api/symbol/{SYMBOLS[index % len(SYMBOLS)]}/price")
+        since = None
+        while time.monotonic() < deadline:
+            params = {'chart_width': 800, 'chart_window': CHART_WINDOW}
+            if since:
+                params['since'] = since
+            state = await timed(session, stats, 'state' if since else 'state (full)', 'GET',
+                                '/api/dashboard/state', params=params)
+            if state:
+                since = state.get('since')
+            await asyncio.sleep(random.uniform(0.9, 1.1) * args.poll_interval)
+
+
+async def generate_load(port, args):
+    stats = Stats()
+    deadline = time.monotonic() + args.ramp_up + args.duration
+    started = time.monotonic()
+    await asyncio.gather(*[simulate_user(f"http://127.0.0.1:{port}", i, args, stats, deadline)
+                           for i in range(args.users)])
+    return stats, time.monotonic() - started
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0
+
+
+def run_config(worker_class, workers, args, env):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', str(workers),
+               '--worker-class', worker_class, '--timeout', str(int(args.timeout) + 30), '--log-level', 'warning']
+    if worker_class == 'gthread':
+        command += ['--threads', str(args.threads)]
+    server = subprocess.Popen(command + ['main:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        stats, elapsed = asyncio.run(generate_load(port, args))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    latencies = stats.all_latencies()
+    errors = sum(stats.errors.values())
+    return {
+        'worker_class': worker_class, 'workers': workers,
+        'threads': args.threads if worker_class == 'gthread' else 1,
+        'users': args.users, 'requests': len(latencies), 'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.5), 'p90': percentile(latencies, 0.9), 'p99': percentile(latencies, 0.99),
+        'max': max(latencies, default=0), 'error_rate': errors / len(latencies) if latencies else 0,
+        'endpoints': {name: {'requests': len(values), 'p50': percentile(values, 0.5),
+                             'p99': percentile(values, 0.99), 'errors': stats.errors[name]}
+                      for name, values in sorted(stats.latencies.items())},
+    }
+
+
+def worker_class_available(worker_class):
+    module = {'gevent': 'gevent', 'eventlet': 'eventlet'}.get(worker_class)
+    if module is None:
+        return True
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--grids', type=int, default=2, help="grids per user")
+    parser.add_argument('--duration', type=float, default=60, help="seconds of polling after the ramp-up")
+    parser.add_argument('--ramp-up', type=float, default=5, help="users arrive spread over this many seconds")
+    parser.add_argument('--poll-interval', type=float, default=30, help="dashboard state poll interval (s)")
+    parser.add_argument('--exchange-latency', type=float, default=100, help="stand-in exchange latency (ms)")
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2])
+    parser.add_argument('--threads', type=int, default=4, help="threads per gthread worker")
+    parser.add_argument('--timeout', type=float, default=30, help="client timeout per request (s)")
+    parser.add_argument('--details', action='store_true', help="print per-endpoint latencies")
+    parser.add_argument('--record', help="append every result as a JSON line to this file")
+    args = parser.parse_args()
+
+    exchange_port = free_port()
+    stand_in = multiprocessing.Process(target=run_stand_in, args=(exchange_port, args.exchange_latency / 1000),
+                                       daemon=True)
+    stand_in.start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.update({
+                'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'load.db')}",
+                'TICK_STORE_DIR': os.path.join(tmp, 'ticks'),
+                'BINANCE_FAPI_URL': f"http://127.0.0.1:{exchange_port}",
+                'SESSION_SECRET': 'load-test',
+            })
+            for name in ('RUN_ENGINE', 'BINANCE_CASSETTE_MODE', 'CACHE_URL'):
+                env.pop(name, None)
+            subprocess.run([sys.executable, '-c', SEED.format(root=ROOT, password=PASSWORD, symbols=SYMBOLS,
+                                                              users=args.users, grids=args.grids)],
+                           cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wait_for_port(exchange_port)
+
+            print(f"{args.users} users, {args.grids} grids each, polling every {args.poll_interval}s for "
+                  f"{args.duration}s, exchange latency {args.exchange_latency}ms")
+            print(f"{'class':<9}{'workers':>8}{'threads':>8}{'requests':>10}{'req/s':>9}"
+                  f"{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'errors':>9}")
+            for worker_class in args.worker_class:
+                if not worker_class_available(worker_class):
+                    print(f"{worker_class:<9} skipped: not installed")
+                    continue
+                for workers in args.workers:
+                    result = run_config(worker_class, workers, args, env)
+                    results.append(result)
+                    print(f"{worker_class:<9}{workers:>8}{result['threads']:>8}{result['requests']:>10}"
+                          f"{result['throughput']:>9.1f}{result['p50'] * 1000:>7.0f}ms{result['p90'] * 1000:>7.0f}ms"
+                          f"{result['p99'] * 1000:>7.0f}ms{result['max'] * 1000:>7.0f}ms"
+                          f"{result['error_rate']:>9.1%}")
+                    if args.details:
+                        for name, endpoint in result['endpoints'].items():
+                            print(f"    {name:<14}{endpoint['requests']:>8} requests  "
+                                  f"p50 {endpoint['p50'] * 1000:.0f}ms  p99 {endpoint['p99'] * 1000:.0f}ms  "
+                                  f"{endpoint['errors']} errors")
+    finally:
+        stand_in.terminate()
+
+    if args.record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'a') as f:
+            for result in results:
+                f.write(json.dumps(dict(result, time=time.time(), exchange_latency=args.exchange_latency,
+                                        poll_interval=args.poll_interval)) + '\n')
+
+
+if __name__ == '__main__':
+    main()
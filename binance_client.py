@@ -1,32 +1,120 @@
 import os
+import json
 import logging
 import time
+import datetime
 import hmac
 import hashlib
+import functools
+import threading
 import requests
 from urllib.parse import urlencode
-import numpy as np
-from decimal import Decimal, ROUND_DOWN
+from sqlalchemy import true
+from decimal import Decimal
 from flask import current_app
-from binance.client import Client
-from binance.exceptions import BinanceAPIException
+from exchange_errors import BinanceAPIException
 from app import db
 from models import User, GridConfig, GridPosition, TradeHistory
+from shared_cache import cached
+from risk_ledger import order_margin, allocation_limit, wallet_balance
+from server_time import server_clock, is_timestamp_error, TIME_ENDPOINT
+from cassette import cassette
+from quantizer import SymbolQuantizer, symbol_quantizer
+from order_ids import (client_order_id, take_profit_order_id, next_generation,
+                       UNKNOWN_ORDER, UNKNOWN_OUTCOME_CODES, ORDER_ATTEMPTS)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# USDⓈ-M futures REST endpoint; BINANCE_FAPI_URL points both clients at a stand-in exchange (load tests)
+FAPI_URL = os.environ.get("BINANCE_FAPI_URL", "https://fapi.binance.com")
+
+# Seconds a response is shared between threads and workers through the shared cache
+EXCHANGE_INFO_TTL = 300
+PRICE_TTL = 2
+ACCOUNT_TTL = 5
+
+def parse_symbol_precision(exchange_info, symbol):
+    """Extract price and quantity precision for a symbol from exchangeInfo"""
+    quantizer = symbol_quantizer(exchange_info, symbol)
+    return {
+        'price_precision': quantizer.price_decimals,
+        'qty_precision': quantizer.qty_decimals,
+        'min_qty': quantizer.min_qty,
+        'min_notional': quantizer.min_notional
+    }
+
+@functools.lru_cache(maxsize=None)
+def _step_quantizer(step_size):
+    return SymbolQuantizer(None, step_size, step_size)
+
+def format_decimal(value):
+    """Plain decimal string for a number (no exponent), as batch endpoints expect strings"""
+    return format(Decimal(str(value)).normalize(), 'f')
+
+def error_payload(response):
+    """Decoded JSON error body of a response, or None"""
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def error_code(exc):
+    """Binance error code carried by an exception from either client, or None"""
+    if isinstance(exc, BinanceAPIException):
+        return exc.code
+    response = getattr(exc, 'response', None)
+    payload = error_payload(response) if response is not None else None
+    return payload.get('code') if isinstance(payload, dict) else None
+
+def error_status(exc):
+    """HTTP status of the response behind an exception from either client, or None if there was no response"""
+    if isinstance(exc, BinanceAPIException):
+        return exc.status_code
+    response = getattr(exc, 'response', None)
+    return response.status_code if response is not None else None
+
+def outcome_unknown(exc):
+    """Whether an order submission that raised ``exc`` may still have been placed.
+
+    True for timeouts and dropped connections (no response), any 5xx and the
+    codes Binance uses for "sent, status unknown" (-1001, -1007) or a reused
+    client order id (-4116); other 4xx rejections are definite failures.
+    """
+    if error_code(exc) in UNKNOWN_OUTCOME_CODES:
+        return True
+    status = error_status(exc)
+    return status is None or status >= 500
+
+# Errors after which an order may or may not exist on the exchange
+AMBIGUOUS_ERRORS = (requests.exceptions.RequestException, BinanceAPIException)
+
 class BinanceClient:
     def __init__(self, api_key=None, api_secret=None):
         self.api_key = api_key
         self.api_secret = api_secret
-        self.base_url = "https://fapi.binance.com"
+        self.base_url = FAPI_URL
+        # Keep-alive connections per thread: a client is shared by request threads and requests.Session is not thread-safe
+        self._local = threading.local()
         
-        # If API keys are provided, create client
-        if api_key and api_secret:
-            self.client = Client(api_key, api_secret)
-        else:
-            self.client = None
+        # python-binance's Client pings Binance and imports its whole package, so it is built on first use
+        self._client = None
+
+    @property
+    def session(self):
+        """This thread's requests.Session for the client"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    @property
+    def client(self):
+        """python-binance Client for the same keys (None without keys or while replaying)"""
+        if self._client is None and self.api_key and self.api_secret and cassette.player is None:
+            from binance.client import Client
+            self._client = Client(self.api_key, self.api_secret)
+        return self._client
 
     def _generate_signature(self, params):
         """Generate HMAC SHA256 signature for API authentication"""
@@ -38,6 +126,17 @@ class BinanceClient:
         ).hexdigest()
         return signature
 
+    def _sync_time(self):
+        """Sample /fapi/v1/time into the shared server clock"""
+        if cassette.player is not None:
+            return
+        try:
+            sent = time.time() * 1000
+            server_time = self.session.get(f"{self.base_url}{TIME_ENDPOINT}", timeout=5).json()['serverTime']
+            server_clock.record(sent, server_time, time.time() * 1000)
+        except Exception as e:
+            logger.warning(f"Could not sync server time: {e}")
+
     def _make_request(self, method, endpoint, params=None, signed=False):
         """Make API request to Binance with proper authentication"""
         url = f"{self.base_url}{endpoint}"
@@ -48,30 +147,33 @@ class BinanceClient:
         if params is None:
             params = {}
             
-        if signed:
-            params['timestamp'] = int(time.time() * 1000)
-            params['signature'] = self._generate_signature(params)
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise ValueError(f"Unsupported method: {method}")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, params=params)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, params=params)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, params=params)
-            else:
-                raise ValueError(f"Unsupported method: {method}")
+            for attempt in (0, 1):
+                if signed:
+                    if server_clock.claim_sync():
+                        self._sync_time()
+                    params.pop('signature', None)
+                    server_clock.stamp(params)
+                    params['signature'] = self._generate_signature(params)
+                
+                response = self._send(method, endpoint, url, headers, params)
+                
+                # Timestamp outside recvWindow: resync the clock and retry once with a fresh timestamp
+                if signed and not attempt and response.status_code == 400 and is_timestamp_error(error_payload(response)):
+                    logger.warning(f"Timestamp rejected for {endpoint}, resyncing server time")
+                    server_clock.invalidate()
+                    continue
+                break
             
             # Check for geographic restriction error (HTTP 451)
             if response.status_code == 451:
-                error_data = response.json()
-                logger.error(f"Geographic restriction error: {error_data}")
-                raise BinanceAPIException(
-                    status_code=response.status_code,
-                    response=response,
-                    code=error_data.get('code', 0),
-                    msg="Service unavailable from your location due to geographic restrictions. Please try using a VPN from a supported region or deploy this bot on a server in a supported region."
-                )
+                logger.error(f"Geographic restriction error: {response.text}")
+                error = BinanceAPIException(response, response.status_code, response.text)
+                error.message = "Service unavailable from your location due to geographic restrictions. Please try using a VPN from a supported region or deploy this bot on a server in a supported region."
+                raise error
             
             response.raise_for_status()
             return response.json()
@@ -82,6 +184,22 @@ class BinanceClient:
             logger.error(f"Error making request to Binance: {e}")
             raise
 
+    def _send(self, method, endpoint, url, headers, params):
+        """One HTTP exchange, recorded or replayed when a cassette is configured"""
+        if cassette.player is not None:
+            status, text = cassette.player.replay(self.api_key, method, endpoint, params)
+            response = requests.Response()
+            response.status_code = status
+            response._content = text.encode()
+            response.url = url
+            return response
+        started = time.time()
+        response = self.session.request(method, url, headers=headers, params=params)
+        if cassette.recorder is not None:
+            cassette.recorder.record(self.api_key, method, endpoint, params, response.status_code, response.text,
+                                     started, time.time() - started)
+        return response
+
     def check_connection(self):
         """Check if API connection is working"""
         try:
@@ -91,18 +209,37 @@ class BinanceClient:
             logger.error(f"API connection test failed: {e}")
             return False
 
-    def get_account_info(self):
-        """Get account information"""
-        return self._make_request('GET', '/fapi/v2/account', signed=True)
+    def get_account_info(self, max_age=0):
+        """Get account information; ``max_age`` > 0 accepts a snapshot shared for that many seconds"""
+        if not max_age:
+            return self._make_request('GET', '/fapi/v2/account', signed=True)
+        account = hashlib.sha256(self.api_key.encode()).hexdigest()[:16]
+        return cached(f"account:{account}", max_age,
+                      lambda: self._make_request('GET', '/fapi/v2/account', signed=True))
 
     def get_exchange_info(self):
         """Get exchange information"""
-        return self._make_request('GET', '/fapi/v1/exchangeInfo')
+        return cached("exchangeInfo", EXCHANGE_INFO_TTL,
+                      lambda: self._make_request('GET', '/fapi/v1/exchangeInfo'))
 
     def get_symbol_price(self, symbol):
         """Get current price for a symbol"""
         params = {'symbol': symbol}
-        return float(self._make_request('GET', '/fapi/v1/ticker/price', params)['price'])
+        return cached(f"price:{symbol}", PRICE_TTL,
+                      lambda: float(self._make_request('GET', '/fapi/v1/ticker/price', params)['price']))
+
+    def get_klines(self, symbol, interval, start_time=None, end_time=None, limit=500):
+        """Get klines (OHLCV candles) for a symbol"""
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'limit': limit
+        }
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+        return self._make_request('GET', '/fapi/v1/klines', params)
 
     def change_margin_type(self, symbol, margin_type="ISOLATED"):
         """Change margin type for a symbol"""
@@ -151,36 +288,18 @@ class BinanceClient:
 
     def get_precision(self, symbol):
         """Get price and quantity precision for a symbol"""
-        exchange_info = self.get_exchange_info()
-        symbol_info = next((s for s in exchange_info['symbols'] if s['symbol'] == symbol), None)
-        
-        if not symbol_info:
-            raise ValueError(f"Symbol {symbol} not found")
-        
-        price_precision = 0
-        qty_precision = 0
-        
-        for f in symbol_info['filters']:
-            if f['filterType'] == 'PRICE_FILTER':
-                tick_size = float(f['tickSize'])
-                price_precision = len(str(tick_size).rstrip('0').split('.')[-1])
-            elif f['filterType'] == 'LOT_SIZE':
-                step_size = float(f['stepSize'])
-                qty_precision = len(str(step_size).rstrip('0').split('.')[-1])
-                
-        return {
-            'price_precision': price_precision,
-            'qty_precision': qty_precision,
-            'min_qty': float(symbol_info['filters'][1]['minQty']),
-            'min_notional': float(symbol_info['filters'][5]['notional'])
-        }
+        return parse_symbol_precision(self.get_exchange_info(), symbol)
+
+    def get_quantizer(self, symbol):
+        """Integer tick/step arithmetic for a symbol, built once per exchangeInfo refresh"""
+        return symbol_quantizer(self.get_exchange_info(), symbol)
 
     def round_step_size(self, quantity, step_size):
-        """Round quantity to valid step size"""
-        precision = len(str(step_size).rstrip('0').split('.')[-1])
-        return float(Decimal(str(quantity)).quantize(Decimal(str(step_size)), rounding=ROUND_DOWN))
+        """Round quantity down to a valid step size"""
+        return _step_quantizer(str(step_size)).round_quantity(quantity)
 
-    def place_order(self, symbol, side, position_side, type="LIMIT", quantity=None, price=None):
+    def place_order(self, symbol, side, position_side, type="LIMIT", quantity=None, price=None, reduce_only=False,
+                    client_order_id=None):
         """
         Place an order on Binance Futures
         
@@ -191,6 +310,9 @@ class BinanceClient:
             type (str): Order type (LIMIT, MARKET)
             quantity (float): Order quantity
             price (float): Order price (for LIMIT orders)
+            reduce_only (bool): Only reduce an existing position (one-way mode only;
+                in hedge mode the position side already makes the order a close)
+            client_order_id (str): newClientOrderId, unique among open orders
         """
         params = {
             'symbol': symbol,
@@ -204,6 +326,12 @@ class BinanceClient:
         if type == 'LIMIT':
             params['price'] = price
             params['timeInForce'] = 'GTC'
+
+        if reduce_only:
+            params['reduceOnly'] = 'true'
+
+        if client_order_id:
+            params['newClientOrderId'] = client_order_id
         
         return self._make_request('POST', '/fapi/v1/order', params, signed=True)
 
@@ -215,6 +343,74 @@ class BinanceClient:
         }
         return self._make_request('DELETE', '/fapi/v1/order', params, signed=True)
 
+    def modify_order(self, symbol, order_id, side, quantity, price):
+        """Amend the price and/or quantity of an open LIMIT order in place"""
+        params = {
+            'symbol': symbol,
+            'orderId': order_id,
+            'side': side,
+            'quantity': quantity,
+            'price': price
+        }
+        return self._make_request('PUT', '/fapi/v1/order', params, signed=True)
+
+    def place_batch_orders(self, symbol, orders):
+        """Place up to 5 LIMIT orders in one request
+
+        ``orders`` are dicts with side, position_side, quantity, price and
+        optionally client_order_id. The response has one entry per order: the
+        order, or an error with code/msg.
+        """
+        batch = []
+        for order in orders:
+            item = {
+                'symbol': symbol,
+                'side': order['side'],
+                'positionSide': order['position_side'],
+                'type': 'LIMIT',
+                'timeInForce': 'GTC',
+                'quantity': format_decimal(order['quantity']),
+                'price': format_decimal(order['price']),
+                'newOrderRespType': 'RESULT'
+            }
+            if order.get('client_order_id'):
+                item['newClientOrderId'] = order['client_order_id']
+            batch.append(item)
+        params = {'batchOrders': json.dumps(batch, separators=(',', ':'))}
+        return self._make_request('POST', '/fapi/v1/batchOrders', params, signed=True)
+
+    def modify_batch_orders(self, symbol, orders):
+        """Amend up to 5 open orders in one request; ``orders`` are dicts with order_id, side, quantity and price"""
+        batch = [{
+            'symbol': symbol,
+            'orderId': order['order_id'],
+            'side': order['side'],
+            'quantity': format_decimal(order['quantity']),
+            'price': format_decimal(order['price'])
+        } for order in orders]
+        params = {'batchOrders': json.dumps(batch, separators=(',', ':'))}
+        return self._make_request('PUT', '/fapi/v1/batchOrders', params, signed=True)
+
+    def cancel_batch_orders(self, symbol, order_ids):
+        """Cancel up to 10 orders in one request"""
+        params = {
+            'symbol': symbol,
+            'orderIdList': json.dumps([int(order_id) for order_id in order_ids], separators=(',', ':'))
+        }
+        return self._make_request('DELETE', '/fapi/v1/batchOrders', params, signed=True)
+
+    def cancel_all_open_orders(self, symbol):
+        """Cancel every open order on a symbol in one request"""
+        return self._make_request('DELETE', '/fapi/v1/allOpenOrders', {'symbol': symbol}, signed=True)
+
+    def get_open_orders(self, symbol):
+        """Get all open orders on a symbol"""
+        return self._make_request('GET', '/fapi/v1/openOrders', {'symbol': symbol}, signed=True)
+
+    def get_position_risk(self, symbol):
+        """Get position size and side for a symbol (one entry per position side in hedge mode)"""
+        return self._make_request('GET', '/fapi/v2/positionRisk', {'symbol': symbol}, signed=True)
+
     def get_order(self, symbol, order_id):
         """Get order status"""
         params = {
@@ -223,6 +419,46 @@ class BinanceClient:
         }
         return self._make_request('GET', '/fapi/v1/order', params, signed=True)
 
+    def get_order_by_client_id(self, symbol, client_order_id):
+        """Get order status by newClientOrderId"""
+        params = {
+            'symbol': symbol,
+            'origClientOrderId': client_order_id
+        }
+        return self._make_request('GET', '/fapi/v1/order', params, signed=True)
+
+    def find_order(self, symbol, client_order_id):
+        """The order placed under ``client_order_id``, or None if Binance never accepted it"""
+        try:
+            return self.get_order_by_client_id(symbol, client_order_id)
+        except Exception as e:
+            if error_code(e) == UNKNOWN_ORDER:
+                return None
+            raise
+
+    def submit_order(self, symbol, side, position_side, quantity, price, client_order_id, attempts=ORDER_ATTEMPTS):
+        """Place a LIMIT order under ``client_order_id``, retrying until its outcome is known.
+
+        A timeout, 5xx, -1001/-1007 or duplicate-id error does not say whether
+        the order exists, so the id is looked up: an existing order is returned
+        as if just placed, otherwise the same id is submitted again. Binance rejects
+        a second live order with the id, so retries never duplicate an order.
+        """
+        for attempt in range(attempts):
+            try:
+                return self.place_order(symbol, side, position_side, "LIMIT", quantity, price,
+                                        client_order_id=client_order_id)
+            except AMBIGUOUS_ERRORS as e:
+                if not outcome_unknown(e):
+                    raise
+                existing = self.find_order(symbol, client_order_id)
+                if existing is not None:
+                    logger.info(f"Recovered order {client_order_id} after: {e}")
+                    return existing
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"Retrying order {client_order_id} after: {e}")
+
     def setup_grid_trading(self, grid_config):
         """Set up initial configuration for grid trading"""
         try:
@@ -250,38 +486,45 @@ class BinanceClient:
             current_price = self.get_symbol_price(grid_config.symbol)
             logger.debug(f"Current price for {grid_config.symbol}: {current_price}")
             
-            # Calculate grid levels
-            grid_levels = np.linspace(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
+            # Calculate grid levels as whole ticks of the symbol
+            quantizer = self.get_quantizer(grid_config.symbol)
+            ladder = quantizer.ladder(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
+            grid_levels = zip(ladder.tolist(), quantizer.prices(ladder).tolist(), quantizer.format_prices(ladder))
+            
+            # Round quantity down to the step size
+            quantity_steps = quantizer.steps(grid_config.quantity_per_grid)
+            quantity = quantizer.quantity(quantity_steps)
+            quantity_text = quantizer.format_quantity(quantity_steps)
+            
+            # Levels (in ticks) that already hold a position of each type
+            long_levels = {quantizer.ticks(p.price_level) for p in grid_config.long_positions}
+            short_levels = {quantizer.ticks(p.price_level) for p in grid_config.short_positions}
+            
+            # One order generation per pass, bumped only if the pass places something
+            generation = None
             
-            # Get precision for the symbol
-            precision_info = self.get_precision(grid_config.symbol)
-            price_precision = precision_info['price_precision']
-            qty_precision = precision_info['qty_precision']
+            # Margin this grid may still tie up under its wallet allocation
+            headroom = self.allocation_headroom(grid_config)
             
-            # Format quantity based on precision
-            quantity = round(grid_config.quantity_per_grid, qty_precision)
+            def within_allocation(price_level):
+                nonlocal headroom
+                margin = order_margin(price_level, quantity, grid_config.leverage)
+                if margin > headroom:
+                    logger.warning(f"Skipping order at {price_level} for grid {grid_config.id}: wallet allocation reached")
+                    return False
+                headroom -= margin
+                return True
             
             # Check existing positions and place new orders if needed
-            for i, price_level in enumerate(grid_levels):
-                # Format price to match required precision
-                price_level = round(price_level, price_precision)
-                
-                # Check for long position
-                long_position = next((p for p in grid_config.long_positions if abs(p.price_level - price_level) < 0.0001), None)
-                
-                # Check for short position
-                short_position = next((p for p in grid_config.short_positions if abs(p.price_level - price_level) < 0.0001), None)
-                
+            for i, (ticks, price_level, price_text) in enumerate(grid_levels):
                 # Place long order if price is below current and no long position exists at this level
-                if price_level < current_price and not long_position:
+                if price_level < current_price and ticks not in long_levels and within_allocation(price_level):
                     try:
-                        order = self.place_order(
-                            symbol=grid_config.symbol,
-                            side="BUY",
-                            position_side="LONG",
-                            type="LIMIT",
-                            quantity=quantity,
-                            price=price_level
+                        if generation is None:
+                            generation = next_generation(grid_config.id)
+                        order = self.submit_order(
+                            grid_config.symbol, "BUY", "LONG", quantity_text, price_text,
+                            client_order_id(grid_config.id, generation, "long", i)
                         )
                         
                         # Create new grid position
@@ -291,6 +534,7 @@ class BinanceClient:
                             price_level=price_level,
                             quantity=quantity,
                             order_id=order['orderId'],
+                            client_order_id=order.get('clientOrderId'),
                             is_filled=False
                         )
                         db.session.add(new_position)
@@ -299,15 +543,13 @@ class BinanceClient:
                         logger.error(f"Error placing long order at {price_level}: {e}")
                 
                 # Place short order if price is above current and no short position exists at this level
-                if price_level > current_price and not short_position:
+                if price_level > current_price and ticks not in short_levels and within_allocation(price_level):
                     try:
-                        order = self.place_order(
-                            symbol=grid_config.symbol,
-                            side="SELL",
-                            position_side="SHORT",
-                            type="LIMIT",
-                            quantity=quantity,
-                            price=price_level
+                        if generation is None:
+                            generation = next_generation(grid_config.id)
+                        order = self.submit_order(
+                            grid_config.symbol, "SELL", "SHORT", quantity_text, price_text,
+                            client_order_id(grid_config.id, generation, "short", i)
                         )
                         
                         # Create new grid position
@@ -317,6 +559,7 @@ class BinanceClient:
                             price_level=price_level,
                             quantity=quantity,
                             order_id=order['orderId'],
+                            client_order_id=order.get('clientOrderId'),
                             is_filled=False
                         )
                         db.session.add(new_position)
@@ -336,6 +579,15 @@ class BinanceClient:
             logger.error(f"Error executing grid strategy: {e}")
             return False
 
+    def allocation_headroom(self, grid_config):
+        """Margin a grid may still use: the rest of its wallet_allocation, capped by the account's free margin"""
+        account = self.get_account_info(max_age=ACCOUNT_TTL)
+        balance = wallet_balance(account)
+        used = sum(order_margin(p.price_level, p.quantity, grid_config.leverage)
+                   for p in grid_config.long_positions + grid_config.short_positions if p.order_id)
+        return min(allocation_limit(balance, grid_config.wallet_allocation) - used,
+                   balance - float(account.get('totalInitialMargin', 0)))
+
     def update_order_status(self, grid_config):
         """Update status of all orders for a grid configuration"""
         # Get all positions with order_id
@@ -384,21 +636,14 @@ class BinanceClient:
                             else:
                                 profit_price = current_price - grid_step
                                 
-                            # Get precision for formatting
-                            precision_info = self.get_precision(grid_config.symbol)
-                            price_precision = precision_info['price_precision']
-                            
-                            # Format profit price
-                            profit_price = round(profit_price, price_precision)
+                            # Snap the profit price to the symbol's tick
+                            quantizer = self.get_quantizer(grid_config.symbol)
                             
                             # Place opposite order
-                            self.place_order(
-                                symbol=grid_config.symbol,
-                                side=opposite_side,
-                                position_side=opposite_position_side,
-                                type="LIMIT",
-                                quantity=float(order_status['executedQty']),
-                                price=profit_price
+                            self.submit_order(
+                                grid_config.symbol, opposite_side, opposite_position_side,
+                                order_status['executedQty'], quantizer.format_price(quantizer.ticks(profit_price)),
+                                take_profit_order_id(grid_config.id, position.order_id)
                             )
                             
                         except Exception as e:
@@ -418,13 +663,12 @@ class BinanceClient:
                 except Exception as e:
                     logger.error(f"Unexpected error checking order status: {e}")
 
-def update_active_grids():
+def update_active_grids(app):
     """Update all active grid configurations"""
-    from app import app
     with app.app_context():
         try:
             # Get all active grid configurations
-            active_grids = GridConfig.query.filter_by(is_active=True).all()
+            active_grids = GridConfig.query.filter(GridConfig.is_active == true()).all()
             
             for grid in active_grids:
                 # Get the user
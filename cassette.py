@@ -0,0 +1,195 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-request values that are never recorded (they are secrets or change on every request)
+STRIPPED_PARAMS = ('signature', 'timestamp', 'recvWindow')
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response for a request"""
+
+
+def account_tag(api_key):
+    """Stable, non-reversible label for the account behind an API key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12] if api_key else None
+
+
+def _params(params):
+    return {k: v for k, v in (params or {}).items() if k not in STRIPPED_PARAMS}
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + 't') if path.endswith('.gz') else open(path, mode)
+
+
+class CassetteRecorder:
+    """Appends every Binance request/response pair to a JSON-lines log (gzipped if the path ends in .gz).
+
+    One line per exchange: wall-clock start ``t``, latency ``d`` in ms,
+    account tag ``a``, method ``m``, path ``p``, params ``q`` without
+    signature/timestamp/recvWindow, status ``s`` and the body as JSON ``b``
+    (or raw text ``x``). API keys and secrets never reach the log. Price
+    feed messages are lines of kind ``k`` 'price' with the receive time
+    ``t`` and the [symbol, price] pairs ``b``.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = _open(path, 'a')
+        self._lock = threading.Lock()
+
+    def record(self, api_key, method, endpoint, params, status, text, started, elapsed):
+        entry = {'t': round(started, 3), 'd': round(elapsed * 1000, 1), 'a': account_tag(api_key),
+                 'm': method, 'p': endpoint, 'q': _params(params), 's': status}
+        try:
+            entry['b'] = json.loads(text)
+        except ValueError:
+            entry['x'] = text
+        self._write(entry)
+
+    def record_prices(self, prices, received):
+        """One price feed message: [symbol, price] pairs received at wall-clock ``received``"""
+        self._write({'t': round(received, 3), 'k': 'price', 'b': prices})
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class CassettePlayer:
+    """Answers requests from a recorded log instead of the exchange.
+
+    A request is matched on account, method, path and params, and failing
+    that on account, method and path alone (order ids and client ids differ
+    between runs). The last response of a key is repeated once the
+    recording runs out, so a run that polls more than the recorded one
+    still gets answers.
+
+    With a ``speed`` the recording is replayed on a clock that starts at
+    the first request or price and runs ``speed`` times faster than the
+    recorded day: price messages are published when their time comes round
+    (see PriceFeed), a request is answered with the latest response
+    recorded by then (the exchange's state at that moment) and latency is
+    divided by ``speed``. ``speed=0`` ignores the recorded times, answers
+    immediately and takes responses strictly in order.
+    """
+    def __init__(self, path, speed=1.0):
+        self.path = path
+        self.speed = speed
+        self.entries = []
+        self.prices = []
+        self._exact = {}
+        self._loose = {}
+        self._lock = threading.Lock()
+        with _open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a recorder that was killed mid-write
+                    continue
+                if entry.get('k') == 'price':
+                    self.prices.append(entry)
+                    continue
+                self.entries.append(entry)
+                self._exact.setdefault(self._key(entry['a'], entry['m'], entry['p'], entry['q']), deque()).append(entry)
+                self._loose.setdefault((entry['a'], entry['m'], entry['p']), deque()).append(entry)
+        # Recorded wall-clock time that replay time zero stands for
+        self.origin = min([items[0]['t'] for items in (self.entries, self.prices) if items], default=0)
+        self._started = None
+        self.prices_done = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(account, method, endpoint, params):
+        return account, method, endpoint, json.dumps(params, sort_keys=True, default=str)
+
+    def now(self):
+        """The recorded wall-clock time replay has reached, or None when replaying without a clock"""
+        if not self.speed:
+            return None
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+            return self.origin + (time.monotonic() - self._started) * self.speed
+
+    def wait_for(self, recorded):
+        """Seconds until the recorded wall-clock time ``recorded`` comes round (0 without a clock)"""
+        now = self.now()
+        return max(0.0, (recorded - now) / self.speed) if now is not None else 0.0
+
+    def lookup(self, api_key, method, endpoint, params):
+        """The recorded entry to answer a request with; raises CassetteMiss if there is none"""
+        account = account_tag(api_key)
+        now = self.now()
+        with self._lock:
+            for queue in (self._exact.get(self._key(account, method, endpoint, _params(params))),
+                          self._loose.get((account, method, endpoint))):
+                if queue:
+                    self.hits += 1
+                    # Skip to the latest response recorded by the replay time
+                    while now is not None and len(queue) > 1 and queue[1]['t'] <= now:
+                        queue.popleft()
+                    return queue.popleft() if len(queue) > 1 else queue[0]
+            self.misses += 1
+        raise CassetteMiss(f"No recorded response for {method} {endpoint}")
+
+    def latency(self, entry):
+        return entry['d'] / 1000 / self.speed if self.speed else 0
+
+    @staticmethod
+    def body(entry):
+        return json.dumps(entry['b'], separators=(',', ':')) if 'b' in entry else entry.get('x', '')
+
+    def replay(self, api_key, method, endpoint, params):
+        """(status, body text) of the recorded response, after its (scaled) latency"""
+        entry = self.lookup(api_key, method, endpoint, params)
+        time.sleep(self.latency(entry))
+        return entry['s'], self.body(entry)
+
+    async def replay_async(self, api_key, method, endpoint, params):
+        entry = self.lookup(api_key, method, endpoint, params)
+        await asyncio.sleep(self.latency(entry))
+        return entry['s'], self.body(entry)
+
+
+class Cassette:
+    """Process-wide record/replay switch read by both Binance clients"""
+    def __init__(self):
+        self.recorder = None
+        self.player = None
+
+    def configure(self, mode=None, path=None, speed=1.0):
+        """``mode`` 'record' or 'replay' with a log ``path``; anything else talks to the exchange"""
+        if self.recorder is not None:
+            self.recorder.close()
+        self.recorder = self.player = None
+        if mode == 'record' and path:
+            self.recorder = CassetteRecorder(path)
+            logger.info(f"Recording Binance traffic to {path}")
+        elif mode == 'replay' and path:
+            self.player = CassettePlayer(path, speed)
+            logger.info(f"Replaying {len(self.player.entries)} recorded Binance responses and "
+                        f"{len(self.player.prices)} price messages from {path} at {speed or 'maximum'}x")
+
+
+cassette = Cassette()
+cassette.configure(os.environ.get("BINANCE_CASSETTE_MODE"), os.environ.get("BINANCE_CASSETTE"),
+                   float(os.environ.get("BINANCE_CASSETTE_SPEED", 1.0)))
@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+import numpy as np
+from binance_client import BinanceClient
+from shared_cache import cached
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Kline intervals offered by /fapi/v1/klines, finest first
+RESOLUTIONS = [
+    ('1m', 60_000), ('3m', 180_000), ('5m', 300_000), ('15m', 900_000), ('30m', 1_800_000),
+    ('1h', 3_600_000), ('2h', 7_200_000), ('4h', 14_400_000), ('6h', 21_600_000),
+    ('12h', 43_200_000), ('1d', 86_400_000),
+]
+MAX_CANDLES = 1500  # /fapi/v1/klines limit
+PIXELS_PER_CANDLE = 4
+CHART_CACHE_TTL = float(os.environ.get("CHART_CACHE_TTL", 15))
+
+
+def pick_resolution(window_ms, width):
+    """Finest kline interval that fits the window into the viewport at PIXELS_PER_CANDLE"""
+    target = max(1, min(MAX_CANDLES, width // PIXELS_PER_CANDLE))
+    for name, ms in RESOLUTIONS:
+        if window_ms / ms <= target:
+            return name, ms
+    return RESOLUTIONS[-1]
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of (x, y) to ``threshold`` points"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the points between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = hi
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def _klines(symbol, interval, start, end):
+    rows = BinanceClient().get_klines(symbol, interval, start_time=start, end_time=end - 1, limit=MAX_CANDLES)
+    # [open time, open, high, low, close, volume]
+    return [[row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])] for row in rows]
+
+
+def market_series(symbol, window_ms, width, mode='ohlc', end=None, tick_store=None):
+    """Price history for a chart ``width`` pixels wide covering ``window_ms`` up to ``end``.
+
+    ``ohlc`` returns klines at a resolution picked from the width; ``line``
+    returns recorded ticks (or kline closes when none were recorded)
+    downsampled with LTTB to one point per pixel. Results are shared between
+    viewers (and workers, with a shared CACHE_URL) per (symbol, resolution, window).
+    """
+    resolution, resolution_ms = pick_resolution(window_ms, width)
+    # Align the window to the resolution so concurrent viewers hit the same key
+    end = end or int(time.time() * 1000)
+    end = -(-end // resolution_ms) * resolution_ms
+    start = end - window_ms
+
+    if mode == 'ohlc':
+        def compute():
+            return {'resolution': resolution, 'start': start, 'end': end,
+                    'candles': _klines(symbol, resolution, start, end)}
+        return cached(f"chart:{symbol}:{resolution}:{window_ms}:{end}:{mode}", CHART_CACHE_TTL, compute)
+
+    def compute_line():
+        source = 'ticks'
+        ts, prices = tick_store.range(symbol, start, end) if tick_store is not None else ((), ())
+        if len(ts) < 2:
+            source = resolution
+            candles = _klines(symbol, resolution, start, end)
+            ts = np.array([c[0] for c in candles], dtype=np.int64)
+            prices = np.array([c[4] for c in candles], dtype=np.float64)
+        ts, prices = lttb(ts, prices, max(3, width))
+        return {'resolution': source, 'start': start, 'end': end,
+                'line': [[int(t), float(p)] for t, p in zip(ts, prices)]}
+    return cached(f"chart:{symbol}:{resolution}:{window_ms}:{end}:{mode}", CHART_CACHE_TTL, compute_line)
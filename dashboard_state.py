@@ -0,0 +1,185 @@
+import json
+import base64
+import hashlib
+import logging
+import datetime
+from sqlalchemy import select, func
+from models import GridConfig, GridPosition, TradeHistory
+from grid_strategy import create_grid_levels, calculate_grid_profit, calculate_grid_performance, grid_trade_totals
+from chart_data import market_series
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RECENT_TRADES = 20
+MAX_FILLS = 1000
+MAX_DELTA_TRADES = 1000
+
+
+def encode_token(last_trade_id, fingerprints):
+    raw = json.dumps({'t': last_trade_id, 'g': fingerprints}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a ``since`` token from encode_token, raising ValueError if it is malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return int(data['t']), {int(k): str(v) for k, v in data['g'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError("Invalid since token") from e
+
+
+def _fingerprint(grid, positions):
+    # Changes whenever the config is edited or a position is added, updated or removed
+    count, id_sum, updated = positions or (0, 0, None)
+    raw = f"{grid.updated_at}|{grid.is_active}|{grid.shutdown_state()[0]}|{count}|{id_sum}|{updated}"
+    return hashlib.blake2b(raw.encode(), digest_size=6).hexdigest()
+
+
+def _trade_dict(trade):
+    return {
+        'id': trade.id,
+        'side': trade.side,
+        'position_side': trade.position_side,
+        'price': trade.price,
+        'quantity': trade.quantity,
+        'realized_profit': trade.realized_profit,
+        'executed_at': trade.executed_at.strftime('%Y-%m-%d %H:%M:%S'),
+        't': int(trade.executed_at.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    }
+
+
+def _latest_per_grid(session, grid_ids, limit, since=None):
+    # Newest ``limit`` trades of every grid in one query
+    rank = func.row_number().over(partition_by=TradeHistory.grid_config_id,
+                                  order_by=(TradeHistory.executed_at.desc(), TradeHistory.id.desc())).label('rank')
+    conditions = [TradeHistory.grid_config_id.in_(grid_ids)]
+    if since is not None:
+        conditions.append(TradeHistory.executed_at >= since)
+    ranked = select(TradeHistory.id, rank).where(*conditions).subquery()
+    return (session.query(TradeHistory)
+            .join(ranked, ranked.c.id == TradeHistory.id)
+            .filter(ranked.c.rank <= limit)
+            .order_by(TradeHistory.grid_config_id, TradeHistory.executed_at.desc(), TradeHistory.id.desc())
+            .all())
+
+
+def build_state(session, user_id, since=None, chart_width=None, chart_window=86400, tick_store=None):
+    """Everything the dashboard shows for a user's grids, or only what changed after ``since``.
+
+    Uses a fixed number of queries however many grids the user has. Prices
+    come from the tick store and charts from the shared chart cache, so no
+    exchange call is made per grid. A client more than MAX_DELTA_TRADES
+    trades behind gets a full response instead of a delta.
+    """
+    last_trade_id, known = decode_token(since) if since else (None, {})
+    full = since is None
+
+    grids = session.query(GridConfig).filter_by(user_id=user_id).order_by(GridConfig.id).all()
+    grid_ids = [grid.id for grid in grids]
+    position_stats = {
+        row[0]: row[1:] for row in session.execute(
+            select(GridPosition.grid_config_id, func.count(GridPosition.id), func.sum(GridPosition.id),
+                   func.max(GridPosition.updated_at))
+            .where(GridPosition.grid_config_id.in_(grid_ids))
+            .group_by(GridPosition.grid_config_id)
+        )
+    }
+    fingerprints = {grid.id: _fingerprint(grid, position_stats.get(grid.id)) for grid in grids}
+
+    # New trades since the token (ids only ever grow), or the recent trades of every grid. The next
+    # token only covers trades this response accounts for, so none committed meanwhile is skipped
+    if not full:
+        new_trades = (session.query(TradeHistory)
+                      .filter(TradeHistory.grid_config_id.in_(grid_ids), TradeHistory.id > last_trade_id)
+                      .order_by(TradeHistory.id.desc()).limit(MAX_DELTA_TRADES + 1).all())
+        max_trade_id = last_trade_id
+        if len(new_trades) > MAX_DELTA_TRADES:
+            # Too far behind for a delta: the trades left out would never be sent, so start over
+            full = True
+    if full:
+        max_trade_id = session.execute(
+            select(func.max(TradeHistory.id)).where(TradeHistory.grid_config_id.in_(grid_ids))
+        ).scalar() or 0
+        new_trades = _latest_per_grid(session, grid_ids, RECENT_TRADES)
+    max_trade_id = max([max_trade_id] + [trade.id for trade in new_trades])
+    changed = {grid_id for grid_id, fp in fingerprints.items() if full or known.get(grid_id) != fp}
+    trades = {}
+    for trade in new_trades:
+        trades.setdefault(trade.grid_config_id, []).append(_trade_dict(trade))
+
+    refresh = changed | set(trades)
+    positions = {}
+    if changed:
+        for pos in session.query(GridPosition).filter(GridPosition.grid_config_id.in_(changed)):
+            positions.setdefault(pos.grid_config_id, []).append({
+                'id': pos.id,
+                'position_type': pos.position_type,
+                'price_level': pos.price_level,
+                'quantity': pos.quantity,
+                'is_filled': pos.is_filled
+            })
+    totals = grid_trade_totals(session, list(refresh))
+
+    charts = {}
+    fills = {}
+    if chart_width:
+        for symbol in {grid.symbol for grid in grids}:
+            try:
+                charts[symbol] = market_series(symbol, chart_window * 1000, chart_width, 'ohlc', tick_store=tick_store)
+            except Exception as e:
+                logger.error(f"Error loading chart for {symbol}: {e}")
+        if full and charts:
+            window_start = datetime.datetime.utcfromtimestamp(min(c['start'] for c in charts.values()) / 1000)
+            for trade in _latest_per_grid(session, grid_ids, MAX_FILLS, since=window_start):
+                fills.setdefault(trade.grid_config_id, []).append(_trade_dict(trade))
+
+    prices = {}
+    for symbol in {grid.symbol for grid in grids}:
+        latest = tick_store.latest(symbol) if tick_store is not None else None
+        if latest:
+            prices[symbol] = latest[1]
+        elif charts.get(symbol, {}).get('candles'):
+            prices[symbol] = charts[symbol]['candles'][-1][4]
+
+    grid_states = []
+    for grid in grids:
+        if grid.id not in refresh:
+            continue
+        shutdown_status, shutdown_detail = grid.shutdown_state()
+        state = {
+            'id': grid.id,
+            'symbol': grid.symbol,
+            'is_active': grid.is_active,
+            'shutdown_status': shutdown_status,
+            'shutdown_detail': shutdown_detail,
+            'bot_type': grid.bot_type,
+            'wallet_allocation': grid.wallet_allocation,
+            'performance': calculate_grid_performance(grid, totals=totals[grid.id])
+        }
+        if grid.id in changed:
+            state.update({
+                'lower_bound': grid.lower_bound,
+                'upper_bound': grid.upper_bound,
+                'grid_size': grid.grid_size,
+                'quantity_per_grid': grid.quantity_per_grid,
+                'leverage': grid.leverage,
+                'grid_levels': create_grid_levels(grid.lower_bound, grid.upper_bound, grid.grid_size).tolist(),
+                'potential': calculate_grid_profit(grid),
+                'positions': positions.get(grid.id, [])
+            })
+        if grid.id in trades:
+            state['trades'] = trades[grid.id]
+        if full:
+            state['fills'] = fills.get(grid.id, [])
+        grid_states.append(state)
+
+    return {
+        'since': encode_token(max_trade_id, {str(k): v for k, v in fingerprints.items()}),
+        'full': full,
+        'grids': grid_states,
+        'removed': sorted(set(known) - set(grid_ids)),
+        'prices': prices,
+        'charts': charts
+    }
@@ -0,0 +1,104 @@
+import io
+import os
+import json
+import struct
+import logging
+import datetime
+import numpy as np
+from grid_book import GridBook, POSITION_DTYPE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'GRIDSNAP'
+# Bump whenever the layout below changes; older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+# Magic, format version, header length
+PREAMBLE = struct.Struct('<8sII')
+
+
+def pack(book, **meta):
+    """Copy a GridBook into flat arrays plus a JSON header.
+
+    Runs on the engine's event loop so the copy is consistent with the book;
+    the returned buffers are independent of it and can be written from a
+    worker thread. ``meta`` is stored in the header as is.
+    """
+    records = list(book.grids.values())
+    symbols = sorted({r.symbol for r in records})
+    codes = {symbol: i for i, symbol in enumerate(symbols)}
+    arrays = {
+        'grid_ids': np.array([r.grid_id for r in records], dtype=np.int64),
+        'user_ids': np.array([r.user_id for r in records], dtype=np.int64),
+        'symbols': np.array([codes[r.symbol] for r in records], dtype=np.int32),
+        'trailing': np.array([bool(r.trailing) for r in records], dtype=bool),
+        'level_offsets': np.cumsum([0] + [len(r.levels) for r in records], dtype=np.int64),
+        'row_offsets': np.cumsum([0] + [r.count for r in records], dtype=np.int64),
+    }
+    arrays['levels'] = np.concatenate([r.levels for r in records]) if records else np.empty(0)
+    arrays['rows'] = np.concatenate([r.rows[:r.count] for r in records]) if records else \
+        np.empty(0, dtype=POSITION_DTYPE)
+    header = dict(
+        meta,
+        created=datetime.datetime.utcnow().isoformat(),
+        symbols=symbols,
+        versions=[r.version.isoformat() if r.version else None for r in records],
+        prices={symbol: index.last_price for symbol, index in book.symbols.items()
+                if index.last_price is not None},
+    )
+    return json.dumps(header).encode(), arrays
+
+
+def write(path, packed):
+    """Write a packed snapshot atomically: temp file, fsync, rename, fsync the directory"""
+    header, arrays = packed
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read(path):
+    """Load a snapshot into a new GridBook; returns (header, book), or None if absent or unusable"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                logger.warning(f"Ignoring engine snapshot {path}: format {magic!r} v{version}")
+                return None
+            header = json.loads(f.read(length))
+            payload = np.load(io.BytesIO(f.read()))
+            arrays = {name: payload[name] for name in payload.files}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable engine snapshot {path}: {e}")
+        return None
+
+    header['created'] = datetime.datetime.fromisoformat(header['created'])
+    book = GridBook()
+    levels, rows = arrays['levels'], arrays['rows']
+    level_offsets, row_offsets = arrays['level_offsets'].tolist(), arrays['row_offsets'].tolist()
+    for i, grid_id in enumerate(arrays['grid_ids'].tolist()):
+        version = header['versions'][i]
+        book.restore(
+            grid_id, int(arrays['user_ids'][i]), header['symbols'][arrays['symbols'][i]],
+            levels[level_offsets[i]:level_offsets[i + 1]],
+            datetime.datetime.fromisoformat(version) if version else None,
+            bool(arrays['trailing'][i]),
+            rows[row_offsets[i]:row_offsets[i + 1]]
+        )
+    for symbol, price in header['prices'].items():
+        book.set_last_price(symbol, price)
+    return header, book
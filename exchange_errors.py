@@ -0,0 +1,25 @@
+import json
+
+
+class BinanceAPIException(Exception):
+    """Error response from the Binance API.
+
+    Same constructor and attributes as python-binance's exception of the
+    same name; both clients build their own, and importing python-binance's
+    pulls in its whole package (websockets, dateparser, the async client).
+    """
+    def __init__(self, response, status_code, text):
+        self.code = 0
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            self.message = f"Invalid JSON error message from Binance: {getattr(response, 'text', text)}"
+        else:
+            self.code = payload.get('code')
+            self.message = payload.get('msg')
+        self.status_code = status_code
+        self.response = response
+        self.request = getattr(response, 'request', None)
+
+    def __str__(self):
+        return f"APIError(code={self.code}): {self.message}"
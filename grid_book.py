@@ -0,0 +1,251 @@
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# One row per order/position of a grid
+POSITION_DTYPE = np.dtype([
+    ('price', '<f8'),
+    ('quantity', '<f8'),
+    ('order_id', '<i8'),
+    ('short', '?'),
+    ('filled', '?'),
+])
+POSITION_TYPES = ('long', 'short')
+INITIAL_CAPACITY = 4
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+EMPTY_LEVELS = np.empty(0, dtype=np.int32)
+
+
+class StagedPosition:
+    """Read-only view of a GridPosition with staged (unflushed) changes applied"""
+    __slots__ = ('grid_config_id', 'position_type', 'price_level', 'quantity', 'order_id', 'is_filled',
+                 'client_order_id')
+
+    def __init__(self, grid_config_id, position_type, price_level, quantity, order_id, is_filled=False,
+                 client_order_id=None, **_):
+        self.grid_config_id = grid_config_id
+        self.position_type = position_type
+        self.price_level = price_level
+        self.quantity = quantity
+        self.order_id = order_id
+        self.is_filled = is_filled
+        self.client_order_id = client_order_id
+
+    def __repr__(self):
+        return f'<StagedPosition {self.position_type} at {self.price_level}>'
+
+
+class GridRecord:
+    """A grid's ladder and positions: scalars in slots, levels and positions in NumPy arrays"""
+    __slots__ = ('grid_id', 'user_id', 'symbol', 'version', 'trailing', 'levels', 'rows', 'count')
+
+    def __init__(self, grid_id, user_id, symbol, levels, version, trailing=False, positions=()):
+        self.grid_id = grid_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.version = version
+        self.trailing = trailing
+        rows = [(p.price_level, p.quantity, int(p.order_id), p.position_type == 'short', bool(p.is_filled))
+                for p in positions if p.order_id is not None]
+        # Room for a quarter of the ladder to be re-placed before the array has to grow
+        self.rows = np.zeros(len(rows) + max(INITIAL_CAPACITY, len(self.levels) // 4), dtype=POSITION_DTYPE)
+        self.rows[:len(rows)] = rows
+        self.count = len(rows)
+
+    def _find(self, order_id):
+        hits = np.flatnonzero(self.rows['order_id'][:self.count] == int(order_id))
+        return int(hits[0]) if len(hits) else None
+
+    def insert(self, position_type, price_level, quantity, order_id, is_filled=False, **_):
+        if self._find(order_id) is not None:
+            self.update(order_id, price_level=price_level, quantity=quantity, is_filled=is_filled)
+            return
+        if self.count == len(self.rows):
+            grown = np.zeros(2 * len(self.rows), dtype=POSITION_DTYPE)
+            grown[:self.count] = self.rows[:self.count]
+            self.rows = grown
+        self.rows[self.count] = (price_level, quantity, int(order_id), position_type == 'short', bool(is_filled))
+        self.count += 1
+
+    def update(self, order_id, price_level=None, quantity=None, is_filled=None, **_):
+        i = self._find(order_id)
+        if i is None:
+            return
+        row = self.rows[i:i + 1]
+        if price_level is not None:
+            row['price'] = price_level
+        if quantity is not None:
+            row['quantity'] = quantity
+        if is_filled is not None:
+            row['filled'] = bool(is_filled)
+
+    def delete(self, order_id):
+        i = self._find(order_id)
+        if i is None:
+            return
+        # Swap-remove: row order carries no meaning
+        self.count -= 1
+        self.rows[i] = self.rows[self.count]
+
+    def positions(self):
+        """StagedPosition views of the rows, built only when the grid is processed"""
+        return [StagedPosition(self.grid_id, POSITION_TYPES[short], price, quantity, order_id, filled)
+                for price, quantity, order_id, short, filled in self.rows[:self.count].tolist()]
+
+
+class SymbolIndex:
+    """Every level of every grid on one symbol, sorted by price, for crossing lookups.
+
+    A price move from ``last`` to ``price`` crosses exactly the levels between
+    two searchsorted positions, so a tick costs two binary searches and
+    returns array views however many grids trade the symbol. Trailing grids'
+    bounds are indexed the same way to find the ones the price has left.
+    The arrays are rebuilt lazily after grids are added or removed.
+    """
+    __slots__ = ('grids', 'last_price', 'dirty', 'prices', 'owners', 'level_index',
+                 'lowers', 'lower_owners', 'uppers', 'upper_owners')
+
+    def __init__(self):
+        self.grids = {}
+        self.last_price = None
+        self.dirty = True
+
+    def rebuild(self):
+        records = list(self.grids.values())
+        if records:
+            prices = np.concatenate([r.levels for r in records])
+            owners = np.concatenate([np.full(len(r.levels), r.grid_id, dtype=np.int64) for r in records])
+            level_index = np.concatenate([np.arange(len(r.levels), dtype=np.int32) for r in records])
+        else:
+            prices, owners, level_index = np.empty(0), EMPTY_IDS, EMPTY_LEVELS
+        order = np.argsort(prices, kind='stable')
+        self.prices, self.owners, self.level_index = prices[order], owners[order], level_index[order]
+
+        trailing = [r for r in records if r.trailing and len(r.levels)]
+        lowers = np.array([r.levels[0] for r in trailing], dtype=np.float64)
+        uppers = np.array([r.levels[-1] for r in trailing], dtype=np.float64)
+        ids = np.array([r.grid_id for r in trailing], dtype=np.int64)
+        order = np.argsort(lowers)
+        self.lowers, self.lower_owners = lowers[order], ids[order]
+        order = np.argsort(uppers)
+        self.uppers, self.upper_owners = uppers[order], ids[order]
+        self.dirty = False
+
+    def crossed(self, price):
+        """(grid ids, level indices) of the levels between the previous price and ``price``"""
+        if self.dirty:
+            self.rebuild()
+        last = self.last_price
+        self.last_price = price
+        if last is None or price == last:
+            return EMPTY_IDS, EMPTY_LEVELS
+        low, high = (last, price) if last < price else (price, last)
+        i = self.prices.searchsorted(low, 'left')
+        j = self.prices.searchsorted(high, 'right')
+        return self.owners[i:j], self.level_index[i:j]
+
+    def out_of_range(self, price):
+        """Ids of trailing grids whose range ``price`` is outside of"""
+        if self.dirty:
+            self.rebuild()
+        above = self.lower_owners[self.lowers.searchsorted(price, 'right'):]
+        below = self.upper_owners[:self.uppers.searchsorted(price, 'left')]
+        if not len(above):
+            return below
+        if not len(below):
+            return above
+        return np.concatenate([above, below])
+
+
+class GridBook:
+    """In-memory state of every grid the engine runs, indexed by symbol.
+
+    Grids are loaded once (ladder plus positions) and then kept current from
+    the engine's own writes, which reach the book through the write-behind
+    store's listener, so processing a grid needs no position query and no
+    level recomputation.
+    """
+    def __init__(self):
+        self.grids = {}
+        self.symbols = {}
+
+    def __contains__(self, grid_id):
+        return grid_id in self.grids
+
+    def __len__(self):
+        return len(self.grids)
+
+    def get(self, grid_id):
+        return self.grids.get(grid_id)
+
+    def load(self, grid_id, user_id, symbol, levels, version, trailing, positions):
+        """Add or replace a grid; ``positions`` are its current positions (DB rows with staged writes)"""
+        self.remove(grid_id)
+        record = GridRecord(grid_id, user_id, symbol, levels, version, trailing, positions)
+        self.grids[grid_id] = record
+        index = self.symbols.setdefault(symbol, SymbolIndex())
+        index.grids[grid_id] = record
+        index.dirty = True
+        return record
+
+    def restore(self, grid_id, user_id, symbol, levels, version, trailing, rows):
+        """Add a grid from saved position rows (an array of POSITION_DTYPE)"""
+        record = self.load(grid_id, user_id, symbol, levels, version, trailing, ())
+        record.rows = np.zeros(len(rows) + max(INITIAL_CAPACITY, len(record.levels) // 4), dtype=POSITION_DTYPE)
+        record.rows[:len(rows)] = rows
+        record.count = len(rows)
+        return record
+
+    def remove(self, grid_id):
+        record = self.grids.pop(grid_id, None)
+        if record is not None:
+            index = self.symbols[record.symbol]
+            index.grids.pop(grid_id, None)
+            index.dirty = True
+            if not index.grids:
+                del self.symbols[record.symbol]
+        return record
+
+    def crossed(self, symbol, price):
+        index = self.symbols.get(symbol)
+        return index.crossed(price) if index is not None else (EMPTY_IDS, EMPTY_LEVELS)
+
+    def out_of_range(self, symbol, price):
+        index = self.symbols.get(symbol)
+        return index.out_of_range(price) if index is not None else EMPTY_IDS
+
+    def last_price(self, symbol):
+        index = self.symbols.get(symbol)
+        return index.last_price if index is not None else None
+
+    def set_last_price(self, symbol, price):
+        index = self.symbols.get(symbol)
+        if index is not None:
+            index.last_price = price
+
+    def positions(self, grid_id):
+        record = self.grids.get(grid_id)
+        return record.positions() if record is not None else []
+
+    def apply(self, op, grid_id, order_id, fields):
+        """WriteBehindStore listener: mirror a staged position write"""
+        record = self.grids.get(grid_id)
+        if record is None or order_id is None:
+            return
+        if op == 'insert_position':
+            record.insert(**fields)
+        elif op == 'update_position':
+            record.update(order_id, **fields)
+        elif op == 'delete_position':
+            record.delete(order_id)
+
+    def nbytes(self):
+        """Approximate memory held in arrays, for sizing"""
+        total = sum(r.levels.nbytes + r.rows.nbytes for r in self.grids.values())
+        for index in self.symbols.values():
+            if not index.dirty:
+                total += index.prices.nbytes + index.owners.nbytes + index.level_index.nbytes
+        return total
@@ -1,7 +1,9 @@
 import logging
 import numpy as np
+from sqlalchemy import select, func, case
 from models import GridConfig, GridPosition, TradeHistory
 from app import db
+from trade_archive import rollup_totals
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -32,13 +34,38 @@ def calculate_grid_profit(grid_config):
         'profit_percentage': profit_percentage
     }
 
-def calculate_grid_performance(grid_config):
+def grid_trade_totals(session, grid_ids):
+    """Trade count, win/loss counts, profit and commission per grid, live and archived"""
+    totals = {grid_id: {'trades': 0, 'winning_trades': 0, 'losing_trades': 0,
+                        'realized_profit': 0, 'commission': 0} for grid_id in grid_ids}
+    if not totals:
+        return totals
+    live = session.execute(select(
+        TradeHistory.grid_config_id,
+        func.count(TradeHistory.id),
+        func.sum(case((TradeHistory.realized_profit > 0, 1), else_=0)),
+        func.sum(case((TradeHistory.realized_profit < 0, 1), else_=0)),
+        func.coalesce(func.sum(TradeHistory.realized_profit), 0),
+        func.coalesce(func.sum(TradeHistory.commission), 0),
+    ).where(TradeHistory.grid_config_id.in_(totals)).group_by(TradeHistory.grid_config_id)).all()
+    for grid_id, trades, wins, losses, profit, commission in live:
+        totals[grid_id] = {'trades': trades, 'winning_trades': wins, 'losing_trades': losses,
+                           'realized_profit': profit, 'commission': commission}
+    # Archived months only survive as daily rollups
+    for grid_id, archived in rollup_totals(session, list(totals)).items():
+        for key, value in archived.items():
+            totals[grid_id][key] += value or 0
+    return totals
+
+def calculate_grid_performance(grid_config, session=None, totals=None):
     """Calculate actual performance of a grid strategy"""
-    # Get all completed trades for this grid
-    trades = TradeHistory.query.filter_by(grid_config_id=grid_config.id).all()
+    # Aggregate all completed trades for this grid unless the caller already did
+    if totals is None:
+        totals = grid_trade_totals(session or db.session, [grid_config.id])[grid_config.id]
+    total_trades = totals['trades']
     
-    total_profit = sum(trade.realized_profit or 0 for trade in trades)
-    total_commission = sum(trade.commission or 0 for trade in trades)
+    total_profit = totals['realized_profit']
+    total_commission = totals['commission']
     net_profit = total_profit - total_commission
     
     # Calculate ROI
@@ -46,12 +73,12 @@ def calculate_grid_performance(grid_config):
     roi = (net_profit / initial_investment) * 100 if initial_investment > 0 else 0
     
     # Calculate win/loss ratio
-    winning_trades = sum(1 for trade in trades if trade.realized_profit and trade.realized_profit > 0)
-    losing_trades = sum(1 for trade in trades if trade.realized_profit and trade.realized_profit < 0)
-    win_rate = (winning_trades / len(trades)) * 100 if trades else 0
+    winning_trades = totals['winning_trades']
+    losing_trades = totals['losing_trades']
+    win_rate = (winning_trades / total_trades) * 100 if total_trades else 0
     
     return {
-        'total_trades': len(trades),
+        'total_trades': total_trades,
         'winning_trades': winning_trades,
         'losing_trades': losing_trades,
         'win_rate': win_rate,
@@ -126,7 +153,7 @@ def validate_grid_parameters(symbol, lower_bound, upper_bound, grid_size, quanti
         
     return errors
 
-def create_grid_config(user_id, symbol, lower_bound, upper_bound, grid_size, quantity_per_grid, leverage, bot_type='both', wallet_allocation=10):
+def create_grid_config(user_id, symbol, lower_bound, upper_bound, grid_size, quantity_per_grid, leverage, bot_type='both', wallet_allocation=10, trailing=False):
     """Create a new grid configuration"""
     try:
         # Create grid config
@@ -140,6 +167,7 @@ def create_grid_config(user_id, symbol, lower_bound, upper_bound, grid_size, qua
             leverage=int(leverage),
             bot_type=bot_type,
             wallet_allocation=int(wallet_allocation),
+            trailing=bool(trailing),
             is_active=False
         )
         
@@ -152,8 +180,12 @@ def create_grid_config(user_id, symbol, lower_bound, upper_bound, grid_size, qua
         logger.error(f"Error creating grid config: {e}")
         raise
 
-def update_grid_config(grid_id, lower_bound=None, upper_bound=None, grid_size=None, quantity_per_grid=None, leverage=None, is_active=None):
-    """Update an existing grid configuration"""
+def update_grid_config(grid_id, lower_bound=None, upper_bound=None, grid_size=None, quantity_per_grid=None, leverage=None, is_active=None, trailing=None):
+    """Update an existing grid configuration
+
+    Open orders are not touched here; the engine sees the new version and
+    rebalances the existing ladder onto the new levels.
+    """
     try:
         grid_config = GridConfig.query.get(grid_id)
         
@@ -178,6 +210,9 @@ def update_grid_config(grid_id, lower_bound=None, upper_bound=None, grid_size=No
         if is_active is not None:
             grid_config.is_active = bool(is_active)
             
+        if trailing is not None:
+            grid_config.trailing = bool(trailing)
+            
         db.session.commit()
         
         return grid_config
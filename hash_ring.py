@@ -0,0 +1,30 @@
+import bisect
+import hashlib
+
+# Points per worker on the hash ring; more points spread users more evenly
+RING_REPLICAS = 128
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring of engine workers.
+
+    Each worker is placed at RING_REPLICAS points; a user belongs to the
+    first worker point at or after the hash of its id. Adding or removing a
+    worker only moves the users between it and its neighbours, about 1/N of
+    them, and every process that sees the same set of workers computes the
+    same owners.
+    """
+    def __init__(self, workers, replicas=RING_REPLICAS):
+        points = sorted((_hash(f"{worker}#{i}"), worker) for worker in workers for i in range(replicas))
+        self._keys = [key for key, _ in points]
+        self._workers = [worker for _, worker in points]
+
+    def owner(self, user_id):
+        if not self._keys:
+            return None
+        i = bisect.bisect_left(self._keys, _hash(str(user_id)))
+        return self._workers[i % len(self._keys)]
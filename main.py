@@ -1,4 +1,12 @@
-from app import app
+import os
+
+from app import create_app, start_background
+
+app = create_app()
+
+# The grid engine runs in the web process only when asked to; otherwise run it with `flask --app main run-engine`
+if os.environ.get("RUN_ENGINE") == "1":
+    start_background(app)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
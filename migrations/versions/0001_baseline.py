@@ -0,0 +1,85 @@
+"""Baseline schema (tables previously created by db.create_all)
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=64), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=256), nullable=True),
+    sa.Column('api_key', sa.String(length=256), nullable=True),
+    sa.Column('api_secret', sa.String(length=256), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('grid_config',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(length=20), nullable=False),
+    sa.Column('upper_bound', sa.Float(), nullable=False),
+    sa.Column('lower_bound', sa.Float(), nullable=False),
+    sa.Column('grid_size', sa.Integer(), nullable=False),
+    sa.Column('quantity_per_grid', sa.Float(), nullable=False),
+    sa.Column('leverage', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('bot_type', sa.String(length=10), nullable=True),
+    sa.Column('wallet_allocation', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('grid_position',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('grid_config_id', sa.Integer(), nullable=False),
+    sa.Column('position_type', sa.String(length=10), nullable=False),
+    sa.Column('price_level', sa.Float(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('order_id', sa.String(length=50), nullable=True),
+    sa.Column('is_filled', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['grid_config_id'], ['grid_config.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('trade_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('grid_config_id', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(length=20), nullable=False),
+    sa.Column('order_id', sa.String(length=50), nullable=True),
+    sa.Column('side', sa.String(length=10), nullable=True),
+    sa.Column('position_side', sa.String(length=10), nullable=True),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('realized_profit', sa.Float(), nullable=True),
+    sa.Column('commission', sa.Float(), nullable=True),
+    sa.Column('executed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['grid_config_id'], ['grid_config.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('trade_history')
+    op.drop_table('grid_position')
+    op.drop_table('grid_config')
+    op.drop_table('user')
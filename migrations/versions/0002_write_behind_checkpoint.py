@@ -0,0 +1,32 @@
+"""Add write_behind_checkpoint
+
+Revision ID: 0002_write_behind_checkpoint
+Revises: 0001_baseline
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_write_behind_checkpoint'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() after the table was added already have it
+    if 'write_behind_checkpoint' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('write_behind_checkpoint',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('write_behind_checkpoint')
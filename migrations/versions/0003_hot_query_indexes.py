@@ -0,0 +1,37 @@
+"""Indexes for the engine scan, position loads and trade history
+
+Revision ID: 0003_hot_query_indexes
+Revises: 0002_write_behind_checkpoint
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_query_indexes'
+down_revision = '0002_write_behind_checkpoint'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_grid_config_user_id', 'grid_config', ['user_id'])
+    # Partial index: the engine only ever scans active grids
+    op.create_index('ix_grid_config_active', 'grid_config', ['user_id'],
+                    postgresql_where=sa.text('is_active = true'),
+                    sqlite_where=sa.text('is_active = 1'))
+    op.create_index('ix_grid_position_grid_type_filled', 'grid_position',
+                    ['grid_config_id', 'position_type', 'is_filled'])
+    op.create_index('ix_grid_position_order', 'grid_position', ['order_id', 'grid_config_id'])
+    op.create_index('ix_trade_history_grid_executed', 'trade_history',
+                    ['grid_config_id', 'executed_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_trade_history_grid_executed', table_name='trade_history')
+    op.drop_index('ix_grid_position_order', table_name='grid_position')
+    op.drop_index('ix_grid_position_grid_type_filled', table_name='grid_position')
+    op.drop_index('ix_grid_config_active', table_name='grid_config')
+    op.drop_index('ix_grid_config_user_id', table_name='grid_config')
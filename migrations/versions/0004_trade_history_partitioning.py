@@ -0,0 +1,116 @@
+"""Partition trade_history by month on PostgreSQL and add trade_rollup
+
+Revision ID: 0004_trade_history_partitioning
+Revises: 0003_hot_query_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_trade_history_partitioning'
+down_revision = '0003_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+TRADE_COLUMNS = ("id, user_id, grid_config_id, symbol, order_id, side, position_side, "
+                 "price, quantity, realized_profit, commission, executed_at")
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    op.create_table('trade_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('grid_config_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('trades', sa.Integer(), nullable=False),
+    sa.Column('winning_trades', sa.Integer(), nullable=False),
+    sa.Column('losing_trades', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('notional', sa.Float(), nullable=False),
+    sa.Column('realized_profit', sa.Float(), nullable=False),
+    sa.Column('commission', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('grid_config_id', 'day', name='uq_trade_rollup_grid_day')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite has no partitioning; the archiver rotates closed months out of the table instead
+        return
+
+    op.execute("ALTER TABLE trade_history RENAME TO trade_history_unpartitioned")
+    op.execute("ALTER INDEX ix_trade_history_grid_executed RENAME TO ix_trade_history_unpartitioned_grid_executed")
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE trade_history (
+            id INTEGER NOT NULL DEFAULT nextval('trade_history_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES "user" (id),
+            grid_config_id INTEGER NOT NULL REFERENCES grid_config (id),
+            symbol VARCHAR(20) NOT NULL,
+            order_id VARCHAR(50),
+            side VARCHAR(10),
+            position_side VARCHAR(10),
+            price FLOAT,
+            quantity FLOAT,
+            realized_profit FLOAT,
+            commission FLOAT,
+            executed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (id, executed_at)
+        ) PARTITION BY RANGE (executed_at)
+    """)
+    op.execute("CREATE TABLE trade_history_default PARTITION OF trade_history DEFAULT")
+
+    oldest = bind.execute(sa.text("SELECT min(executed_at) FROM trade_history_unpartitioned")).scalar()
+    today = datetime.date.today()
+    month = datetime.date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(datetime.date(today.year, today.month, 1), 2)
+    while month <= last:
+        op.execute(f"CREATE TABLE trade_history_y{month:%Y}m{month:%m} PARTITION OF trade_history "
+                   f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')")
+        month = _add_months(month, 1)
+
+    op.execute(f"INSERT INTO trade_history ({TRADE_COLUMNS}) "
+               f"SELECT id, user_id, grid_config_id, symbol, order_id, side, position_side, price, quantity, "
+               f"realized_profit, commission, COALESCE(executed_at, now() AT TIME ZONE 'utc') "
+               f"FROM trade_history_unpartitioned")
+    # Move the id sequence over before the old table (its owner) is dropped
+    op.execute("ALTER SEQUENCE trade_history_id_seq OWNED BY trade_history.id")
+    op.execute("DROP TABLE trade_history_unpartitioned")
+    op.create_index('ix_trade_history_grid_executed', 'trade_history', ['grid_config_id', 'executed_at', 'id'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE trade_history RENAME TO trade_history_partitioned")
+        op.execute("ALTER INDEX ix_trade_history_grid_executed RENAME TO ix_trade_history_partitioned_grid_executed")
+        op.execute("""
+            CREATE TABLE trade_history (
+                id INTEGER NOT NULL DEFAULT nextval('trade_history_id_seq') PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES "user" (id),
+                grid_config_id INTEGER NOT NULL REFERENCES grid_config (id),
+                symbol VARCHAR(20) NOT NULL,
+                order_id VARCHAR(50),
+                side VARCHAR(10),
+                position_side VARCHAR(10),
+                price FLOAT,
+                quantity FLOAT,
+                realized_profit FLOAT,
+                commission FLOAT,
+                executed_at TIMESTAMP WITHOUT TIME ZONE
+            )
+        """)
+        op.execute(f"INSERT INTO trade_history ({TRADE_COLUMNS}) SELECT {TRADE_COLUMNS} FROM trade_history_partitioned")
+        op.execute("ALTER SEQUENCE trade_history_id_seq OWNED BY trade_history.id")
+        op.execute("DROP TABLE trade_history_partitioned CASCADE")
+        op.create_index('ix_trade_history_grid_executed', 'trade_history', ['grid_config_id', 'executed_at', 'id'])
+    op.drop_table('trade_rollup')
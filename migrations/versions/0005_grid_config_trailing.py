@@ -0,0 +1,26 @@
+"""Add grid_config.trailing
+
+Revision ID: 0005_grid_config_trailing
+Revises: 0004_trade_history_partitioning
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_grid_config_trailing'
+down_revision = '0004_trade_history_partitioning'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trailing', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.drop_column('trailing')
@@ -0,0 +1,28 @@
+"""Add grid_config shutdown status
+
+Revision ID: 0006_grid_config_shutdown_status
+Revises: 0005_grid_config_trailing
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_grid_config_shutdown_status'
+down_revision = '0005_grid_config_trailing'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shutdown_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('shutdown_detail', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.drop_column('shutdown_detail')
+        batch_op.drop_column('shutdown_status')
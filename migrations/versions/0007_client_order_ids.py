@@ -0,0 +1,32 @@
+"""Add client order ids and grid order generations
+
+Revision ID: 0007_client_order_ids
+Revises: 0006_grid_config_shutdown_status
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_client_order_ids'
+down_revision = '0006_grid_config_shutdown_status'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('order_generation', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('grid_position', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_order_id', sa.String(length=36), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('grid_position', schema=None) as batch_op:
+        batch_op.drop_column('client_order_id')
+
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.drop_column('order_generation')
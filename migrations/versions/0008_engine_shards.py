@@ -0,0 +1,50 @@
+"""Add engine_worker and shard_assignment
+
+Revision ID: 0008_engine_shards
+Revises: 0007_client_order_ids
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_engine_shards'
+down_revision = '0007_client_order_ids'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('engine_worker',
+    sa.Column('id', sa.String(length=100), nullable=False),
+    sa.Column('hostname', sa.String(length=255), nullable=True),
+    sa.Column('pid', sa.Integer(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('engine_worker', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_engine_worker_heartbeat_at'), ['heartbeat_at'], unique=False)
+
+    op.create_table('shard_assignment',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.String(length=100), nullable=True),
+    sa.Column('assigned_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('shard_assignment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_shard_assignment_worker_id'), ['worker_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('shard_assignment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_shard_assignment_worker_id'))
+
+    op.drop_table('shard_assignment')
+    with op.batch_alter_table('engine_worker', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_engine_worker_heartbeat_at'))
+
+    op.drop_table('engine_worker')
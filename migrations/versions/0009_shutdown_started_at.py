@@ -0,0 +1,26 @@
+"""Add grid_config shutdown_started_at
+
+Revision ID: 0009_shutdown_started_at
+Revises: 0008_engine_shards
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_shutdown_started_at'
+down_revision = '0008_engine_shards'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shutdown_started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('grid_config', schema=None) as batch_op:
+        batch_op.drop_column('shutdown_started_at')
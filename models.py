@@ -3,6 +3,9 @@ from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# A stop/delete still 'stopping' after this long lost its background job (worker restarted or killed)
+SHUTDOWN_TIMEOUT = datetime.timedelta(minutes=5)
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -37,8 +40,23 @@ class GridConfig(db.Model):
     bot_type = db.Column(db.String(10), default='both')
     # Wallet allocation percentage (1-100)
     wallet_allocation = db.Column(db.Integer, default=10)
+    # Trailing grids shift their range to follow the price when it leaves the bounds
+    trailing = db.Column(db.Boolean, default=False)
+    # Progress of the last stop/delete: 'stopping', 'stopped' or 'failed', with a summary
+    shutdown_status = db.Column(db.String(20))
+    shutdown_detail = db.Column(db.String(255))
+    shutdown_started_at = db.Column(db.DateTime)
+    # Bumped once per order placement pass; part of every entry order's client order id
+    order_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_grid_config_user_id', 'user_id'),
+        # Partial index: the engine only ever scans active grids
+        db.Index('ix_grid_config_active', 'user_id',
+                 postgresql_where=db.text('is_active = true'),
+                 sqlite_where=db.text('is_active = 1')),
+    )
     long_positions = db.relationship('GridPosition', backref='grid_config', 
                                   primaryjoin="and_(GridPosition.grid_config_id==GridConfig.id, GridPosition.position_type=='long')",
                                   lazy=True)
@@ -46,6 +64,14 @@ class GridConfig(db.Model):
                                    primaryjoin="and_(GridPosition.grid_config_id==GridConfig.id, GridPosition.position_type=='short')",
                                    lazy=True)
     
+    def shutdown_state(self):
+        """(status, detail) of the last stop/delete; one whose job was lost reads as 'failed' so it can be retried"""
+        if self.shutdown_status == 'stopping' and (
+                self.shutdown_started_at is None
+                or datetime.datetime.utcnow() - self.shutdown_started_at > SHUTDOWN_TIMEOUT):
+            return 'failed', 'Stopping was interrupted; some of its orders may still be open'
+        return self.shutdown_status, self.shutdown_detail
+
     def __repr__(self):
         return f'<GridConfig {self.symbol} {self.lower_bound}-{self.upper_bound}>'
 
@@ -56,9 +82,15 @@ class GridPosition(db.Model):
     price_level = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     order_id = db.Column(db.String(50))
+    client_order_id = db.Column(db.String(36))
     is_filled = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    __table_args__ = (
+        # Relationship loads filter on (grid_config_id, position_type), status checks add is_filled
+        db.Index('ix_grid_position_grid_type_filled', 'grid_config_id', 'position_type', 'is_filled'),
+        db.Index('ix_grid_position_order', 'order_id', 'grid_config_id'),
+    )
     
     def __repr__(self):
         return f'<GridPosition {self.position_type} at {self.price_level}>'
@@ -76,6 +108,59 @@ class TradeHistory(db.Model):
     realized_profit = db.Column(db.Float)
     commission = db.Column(db.Float)
     executed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        # Serves "latest trades for a grid" (ORDER BY executed_at DESC) and keyset paging on (executed_at, id)
+        db.Index('ix_trade_history_grid_executed', 'grid_config_id', 'executed_at', 'id'),
+    )
     
     def __repr__(self):
         return f'<TradeHistory {self.side} {self.symbol} at {self.price}>'
+
+class TradeRollup(db.Model):
+    # Daily per-grid summary of trades that have been moved to the archive
+    id = db.Column(db.Integer, primary_key=True)
+    grid_config_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    trades = db.Column(db.Integer, nullable=False, default=0)
+    winning_trades = db.Column(db.Integer, nullable=False, default=0)
+    losing_trades = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Float, nullable=False, default=0)
+    notional = db.Column(db.Float, nullable=False, default=0)
+    realized_profit = db.Column(db.Float, nullable=False, default=0)
+    commission = db.Column(db.Float, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('grid_config_id', 'day', name='uq_trade_rollup_grid_day'),
+    )
+    
+    def __repr__(self):
+        return f'<TradeRollup {self.grid_config_id} {self.day}>'
+
+class WriteBehindCheckpoint(db.Model):
+    # Last write-behind journal sequence number applied to the database, per journal
+    name = db.Column(db.String(100), primary_key=True)
+    last_seq = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WriteBehindCheckpoint {self.name} {self.last_seq}>'
+
+class EngineWorker(db.Model):
+    # A running grid engine process; live while its heartbeat is recent
+    id = db.Column(db.String(100), primary_key=True)
+    hostname = db.Column(db.String(255))
+    pid = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<EngineWorker {self.id}>'
+
+class ShardAssignment(db.Model):
+    # The engine worker that runs a user's grids; NULL while the user is between owners
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    worker_id = db.Column(db.String(100), index=True)
+    assigned_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ShardAssignment {self.user_id} {self.worker_id}>'
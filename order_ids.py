@@ -0,0 +1,63 @@
+import re
+from sqlalchemy import update, select
+from app import db
+from models import GridConfig
+
+# Binance error codes that make a submission's outcome a lookup rather than a failure
+UNKNOWN_ORDER = -2013
+DUPLICATE_CLIENT_ORDER_ID = -4116
+DISCONNECTED = -1001
+EXECUTION_STATUS_UNKNOWN = -1007
+UNKNOWN_OUTCOME_CODES = (DUPLICATE_CLIENT_ORDER_ID, DISCONNECTED, EXECUTION_STATUS_UNKNOWN)
+# Submissions per order before giving up on an ambiguous (timed out / 5xx) result
+ORDER_ATTEMPTS = 3
+ENTRY_ORDER_ID = re.compile(r'^gb(\d+)-(\d+)-([ls])(\d+)$')
+
+
+def client_order_id(grid_id, generation, position_type, level_index):
+    """newClientOrderId of a grid's entry order at a ladder level.
+
+    Stable for a given (grid, level, side, generation), so a retried or
+    recovered submission reuses the id and Binance refuses a second live
+    order under it. Fits Binance's 36-character ``[.A-Z:/a-z0-9_-]`` limit.
+    """
+    return f"gb{grid_id}-{generation}-{position_type[0]}{level_index}"
+
+
+def grid_order_prefix(grid_id):
+    """Prefix shared by the client order ids of every order a grid places"""
+    return f"gb{grid_id}-"
+
+
+def take_profit_order_id(grid_id, order_id):
+    """newClientOrderId of the profit-taking order for a filled entry order (one per fill)"""
+    return f"gb{grid_id}-tp{order_id}"
+
+
+def parse_client_order_id(value):
+    """(grid id, generation, position type, level index) of an entry order id, else None"""
+    match = ENTRY_ORDER_ID.match(value or '')
+    if match is None:
+        return None
+    grid_id, generation, side, index = match.groups()
+    return int(grid_id), int(generation), 'long' if side == 'l' else 'short', int(index)
+
+
+def level_index(levels, price):
+    return min(range(len(levels)), key=lambda i: abs(levels[i] - price))
+
+
+def next_generation(grid_id):
+    """Bump and return the grid's order generation, committed before any order of it is sent.
+
+    Every placement pass uses a new generation so that an id is never reused
+    for a later order at the same level; a crashed pass can be recovered by
+    looking up the ids of the latest generation. ``updated_at`` is kept so the
+    bump does not look like a config edit.
+    """
+    table = GridConfig.__table__
+    db.session.execute(update(table).where(table.c.id == grid_id).values(
+        order_generation=table.c.order_generation + 1, updated_at=table.c.updated_at))
+    generation = db.session.execute(select(table.c.order_generation).where(table.c.id == grid_id)).scalar()
+    db.session.commit()
+    return generation
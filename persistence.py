@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import datetime
+import threading
+from sqlalchemy import insert, update, delete, bindparam, select
+from app import db
+from models import GridConfig, GridPosition, TradeHistory, WriteBehindCheckpoint
+from grid_book import StagedPosition
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+def _encode(fields):
+    return {k: ({'$dt': v.isoformat()} if isinstance(v, datetime.datetime) else v) for k, v in fields.items()}
+
+
+def _decode(fields):
+    return {k: (datetime.datetime.fromisoformat(v['$dt']) if isinstance(v, dict) and '$dt' in v else v)
+            for k, v in fields.items()}
+
+
+class WriteBehindStore:
+    """Write-behind buffer for GridPosition, TradeHistory and order generation mutations.
+
+    Mutations are coalesced in memory per (grid, order id) and appended to a
+    local journal; ``sync()`` fsyncs the journal, after which the staged
+    changes survive a crash. ``flush()`` applies everything in one transaction
+    with executemany-style bulk INSERT/UPDATE/DELETE statements and records the
+    last journal sequence number in ``write_behind_checkpoint`` in the same
+    transaction, so replaying the journal after a crash never applies a
+    mutation twice.
+    """
+    def __init__(self, app, journal_path, max_batch=500, max_delay=1.0):
+        self.app = app
+        self.journal_path = journal_path
+        self.name = os.path.basename(journal_path)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._lock = threading.RLock()
+        self._positions = {}
+        self._by_grid = {}
+        self._trades = []
+        self._generations = {}
+        self._seq = 0
+        self._first_staged_at = None
+        # Called with (op, grid_id, order_id, fields) for every staged mutation
+        self.listeners = []
+
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        self._journal = open(journal_path, 'a+')
+        try:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._journal.close()
+            raise RuntimeError(f"Write-behind journal {journal_path} is in use by another process")
+
+    @property
+    def pending(self):
+        return len(self._positions) + len(self._trades) + len(self._generations)
+
+    @property
+    def seq(self):
+        """Sequence number of the last staged mutation"""
+        return self._seq
+
+    def recover(self):
+        """Replay journal entries newer than the database checkpoint and flush them"""
+        with self._lock:
+            with self.app.app_context():
+                checkpoint = db.session.get(WriteBehindCheckpoint, self.name)
+                last_seq = checkpoint.last_seq if checkpoint else 0
+                db.session.remove()
+
+            self._seq = last_seq
+            replayed = 0
+            self._journal.seek(0)
+            for line in self._journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write was never synced
+                    logger.warning("Skipping incomplete write-behind journal entry")
+                    continue
+                self._seq = max(self._seq, entry['seq'])
+                if entry['seq'] <= last_seq:
+                    continue
+                self._apply(entry['op'], entry.get('grid_id'), entry.get('order_id'), _decode(entry['fields']))
+                replayed += 1
+
+            if replayed:
+                logger.info(f"Recovered {replayed} write-behind entries from {self.journal_path}")
+            if not self.flush():
+                self._journal.truncate(0)
+
+    def insert_position(self, **fields):
+        self._stage('insert_position', fields['grid_config_id'], str(fields['order_id']), fields)
+
+    def update_position(self, grid_id, order_id, **fields):
+        self._stage('update_position', grid_id, str(order_id), fields)
+
+    def delete_position(self, grid_id, order_id):
+        self._stage('delete_position', grid_id, str(order_id), {})
+
+    def insert_trade(self, **fields):
+        self._stage('insert_trade', fields['grid_config_id'], None, fields)
+
+    def set_generation(self, grid_id, generation):
+        """Record a grid's order generation; sync() before sending orders that use it"""
+        self._stage('set_generation', grid_id, None, {'order_generation': generation})
+
+    def discard(self, grid_id):
+        """Drop the staged position writes of a grid that stopped trading; its trades are still written"""
+        self._stage('discard_grid', grid_id, None, {})
+
+    def positions(self, grid_id, rows):
+        """Merge database rows for a grid with its staged mutations"""
+        with self._lock:
+            merged = {str(row.order_id): StagedPosition(
+                row.grid_config_id, row.position_type, row.price_level,
+                row.quantity, row.order_id, row.is_filled, row.client_order_id
+            ) for row in rows}
+            for key in self._by_grid.get(grid_id, ()):
+                op, fields = self._positions[key]
+                order_id = key[1]
+                if op == DELETE:
+                    merged.pop(order_id, None)
+                elif op == INSERT:
+                    merged[order_id] = StagedPosition(**fields)
+                elif order_id in merged:
+                    for name, value in fields.items():
+                        setattr(merged[order_id], name, value)
+            return list(merged.values())
+
+    def _stage(self, op, grid_id, order_id, fields):
+        with self._lock:
+            self._seq += 1
+            self._journal.write(json.dumps({
+                'seq': self._seq, 'op': op, 'grid_id': grid_id,
+                'order_id': order_id, 'fields': _encode(fields)
+            }) + '\n')
+            self._apply(op, grid_id, order_id, fields)
+            if self._first_staged_at is None:
+                self._first_staged_at = time.monotonic()
+        for listener in self.listeners:
+            listener(op, grid_id, order_id, fields)
+
+    def _apply(self, op, grid_id, order_id, fields):
+        if op == 'insert_trade':
+            self._trades.append(fields)
+            return
+        if op == 'set_generation':
+            self._generations[grid_id] = fields['order_generation']
+            return
+        if op == 'discard_grid':
+            for key in self._by_grid.pop(grid_id, ()):
+                self._positions.pop(key, None)
+            return
+
+        key = (grid_id, order_id)
+        current = self._positions.get(key)
+        if op == 'insert_position':
+            self._positions[key] = (INSERT, dict(fields, order_id=order_id))
+        elif op == 'update_position':
+            if current is None:
+                self._positions[key] = (UPDATE, dict(fields))
+            elif current[0] != DELETE:
+                current[1].update(fields)
+        elif op == 'delete_position':
+            if current is not None and current[0] == INSERT:
+                # Never reached the database, nothing to delete
+                del self._positions[key]
+                self._by_grid[grid_id].discard(key)
+                return
+            self._positions[key] = (DELETE, {})
+        self._by_grid.setdefault(grid_id, set()).add(key)
+
+    def sync(self):
+        """Make every staged mutation durable by fsyncing the journal"""
+        with self._lock:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def should_flush(self):
+        return self.pending >= self.max_batch or (
+            self._first_staged_at is not None and time.monotonic() - self._first_staged_at >= self.max_delay)
+
+    def flush(self):
+        """Apply all staged mutations to the database in a single transaction"""
+        with self._lock:
+            if not self.pending:
+                return 0
+
+            inserts, deletes, updates = [], [], {}
+            for (grid_id, order_id), (op, fields) in self._positions.items():
+                if op == INSERT:
+                    inserts.append(fields)
+                elif op == DELETE:
+                    deletes.append({'g': grid_id, 'o': order_id})
+                else:
+                    # Rows are grouped by the set of columns they change so each group is one executemany
+                    updates.setdefault(tuple(sorted(fields)), []).append(dict(fields, g=grid_id, o=order_id))
+
+            count = self.pending
+            with self.app.app_context():
+                try:
+                    # New positions only for grids still trading (a stop cancels their orders and removes the
+                    # rows), trades for every grid that still exists
+                    grid_ids = {i['grid_config_id'] for i in inserts} | {t['grid_config_id'] for t in self._trades}
+                    rows = db.session.execute(select(GridConfig.id, GridConfig.is_active)
+                                              .where(GridConfig.id.in_(grid_ids))).all() if grid_ids else []
+                    live = {row.id for row in rows}
+                    active = {row.id for row in rows if row.is_active}
+                    inserts = [i for i in inserts if i['grid_config_id'] in active]
+                    trades = [t for t in self._trades if t['grid_config_id'] in live]
+                    # Generations are written even for stopped grids so a restart never reuses an order id
+                    generations = [{'g': grid_id, 'v': generation} for grid_id, generation in self._generations.items()]
+
+                    now = datetime.datetime.utcnow()
+                    conn = db.session.connection()
+                    position_table = GridPosition.__table__
+                    match = (position_table.c.grid_config_id == bindparam('g')) & (position_table.c.order_id == bindparam('o'))
+
+                    if inserts:
+                        # One executemany needs the same columns on every row (older journals have no client ids)
+                        conn.execute(insert(position_table), [
+                            dict(i, client_order_id=i.get('client_order_id'), created_at=now, updated_at=now)
+                            for i in inserts])
+                    for columns, rows in updates.items():
+                        stmt = update(position_table).where(match).values(
+                            updated_at=now, **{c: bindparam(f'v_{c}') for c in columns})
+                        conn.execute(stmt, [{'g': r['g'], 'o': r['o'], **{f'v_{c}': r[c] for c in columns}} for r in rows])
+                    if deletes:
+                        conn.execute(delete(position_table).where(match), deletes)
+                    if trades:
+                        conn.execute(insert(TradeHistory.__table__), trades)
+                    if generations:
+                        # updated_at is kept so the bump does not look like a config edit
+                        config_table = GridConfig.__table__
+                        conn.execute(update(config_table).where(config_table.c.id == bindparam('g')).values(
+                            order_generation=bindparam('v'), updated_at=config_table.c.updated_at), generations)
+
+                    checkpoint = db.session.get(WriteBehindCheckpoint, self.name)
+                    if checkpoint is None:
+                        db.session.add(WriteBehindCheckpoint(name=self.name, last_seq=self._seq))
+                    else:
+                        checkpoint.last_seq = self._seq
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error flushing write-behind batch: {e}")
+                    raise
+                finally:
+                    db.session.remove()
+
+            # Everything up to the checkpoint is in the database, start a fresh journal
+            self._positions.clear()
+            self._by_grid.clear()
+            self._trades.clear()
+            self._generations.clear()
+            self._first_staged_at = None
+            self._journal.flush()
+            self._journal.truncate(0)
+            self._journal.seek(0)
+            logger.debug(f"Flushed {count} write-behind mutations")
+            return count
+
+    def close(self):
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._journal.close()
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from binance_client import FAPI_URL
+from cassette import cassette
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# BINANCE_FSTREAM_URL and BINANCE_FAPI_URL point the feed at a stand-in exchange like the REST clients
+STREAM_URL = f"{os.environ.get('BINANCE_FSTREAM_URL', 'wss://fstream.binance.com')}/ws/!miniTicker@arr"
+TICKER_URL = f"{FAPI_URL}/fapi/v1/ticker/price"
+
+
+class PriceFeed:
+    """Pushes last-price updates for every futures symbol to a callback.
+
+    Prefers the all-market miniTicker websocket stream, which only carries
+    symbols that actually traded. If the stream cannot be kept open it falls
+    back to polling the bulk ticker endpoint (one request covers all symbols)
+    and retries the stream after ``retry_after`` seconds.
+
+    Received messages are written to a recording cassette, and a replaying
+    cassette stands in for the exchange: its price messages are published
+    on the replay clock and nothing is fetched.
+    """
+    def __init__(self, session, on_price, poll_interval=1.0, retry_after=60):
+        self.session = session
+        self.on_price = on_price
+        self.poll_interval = poll_interval
+        self.retry_after = retry_after
+        self.last_prices = {}
+
+    def _publish(self, symbol, price):
+        # Only forward real changes so unchanged symbols cost nothing downstream
+        if self.last_prices.get(symbol) != price:
+            self.last_prices[symbol] = price
+            self.on_price(symbol, price)
+
+    def _receive(self, prices):
+        # One message of (symbol, price) pairs from the stream or the ticker
+        if cassette.recorder is not None:
+            cassette.recorder.record_prices(prices, time.time())
+        for symbol, price in prices:
+            self._publish(symbol, price)
+
+    async def run(self, stop):
+        """Run until the ``stop`` event is set"""
+        if cassette.player is not None:
+            await self._replay(stop, cassette.player)
+            return
+        while not stop.is_set():
+            try:
+                await self._stream(stop)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Price stream unavailable, polling ticker instead: {e}")
+                await self._poll(stop, self.retry_after)
+
+    async def _stream(self, stop):
+        async with self.session.ws_connect(STREAM_URL, heartbeat=30) as ws:
+            logger.info("Connected to price stream")
+            async for msg in ws:
+                if stop.is_set():
+                    return
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self._receive([(ticker['s'], float(ticker['c'])) for ticker in json.loads(msg.data)])
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+        raise aiohttp.ClientError("price stream closed")
+
+    async def _poll(self, stop, duration):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        while not stop.is_set() and loop.time() < deadline:
+            try:
+                async with self.session.get(TICKER_URL) as response:
+                    response.raise_for_status()
+                    self._receive([(ticker['symbol'], float(ticker['price']))
+                                   for ticker in await response.json(content_type=None)])
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Error polling ticker prices: {e}")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _replay(self, stop, player):
+        """Publish the cassette's price messages at their recorded times, then wait for ``stop``"""
+        if not player.prices:
+            logger.warning("Replaying a cassette without price messages; no prices will be published")
+        for message in player.prices:
+            wait = player.wait_for(message['t'])
+            if wait:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Let the engine run between messages when replaying at full speed
+                await asyncio.sleep(0)
+            if stop.is_set():
+                return
+            for symbol, price in message['b']:
+                self._publish(symbol, price)
+        player.prices_done = True
+        logger.info(f"Replayed {len(player.prices)} recorded price messages")
+        await stop.wait()
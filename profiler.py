@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import signal
+import datetime
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_DURATION = 120
+# Longest profile a web request may ask for; gunicorn kills a sync worker after 30s by default
+REQUEST_MAX_DURATION = int(os.environ.get("PROFILE_REQUEST_MAX_SECONDS", 25))
+# Length of a profile taken on SIGUSR1 (see install_signal_handler)
+SIGNAL_DURATION = int(os.environ.get("PROFILE_SIGNAL_SECONDS", 30))
+DEFAULT_INTERVAL = 0.005
+TRACEMALLOC_FRAMES = 10
+# Only one profile per process at a time; samples from two would mix
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already running in this process"""
+
+
+def _frame_name(code, lineno):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+
+
+def sample_stacks(duration, interval=DEFAULT_INTERVAL):
+    """Sample the stack of every other thread every ``interval`` seconds for ``duration`` seconds.
+
+    Returns a Counter of (thread name, frames root-first) tuples. The
+    sampler reads sys._current_frames() from its own thread, so the sampled
+    threads (the grid engine loop, APScheduler's workers, request threads)
+    run unmodified and the overhead is one stack walk per thread per tick.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this process")
+    try:
+        me = threading.get_ident()
+        samples = Counter()
+        deadline = time.monotonic() + min(duration, MAX_DURATION)
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+                samples[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            time.sleep(interval)
+        return samples
+    finally:
+        _busy.release()
+
+
+def collapsed(samples):
+    """Brendan Gregg's collapsed stack format (flamegraph.pl, speedscope, inferno)"""
+    lines = [';'.join((thread,) + stack) + f" {count}" for (thread, stack), count in samples.most_common()]
+    return '\n'.join(lines) + '\n'
+
+
+def speedscope(samples, interval, name='gridbot'):
+    """A speedscope file with one sampled profile per thread"""
+    frames, index = [], {}
+    profiles = {}
+    for (thread, stack), count in samples.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame})
+            ids.append(index[frame])
+        profile = profiles.setdefault(thread, {'samples': [], 'weights': []})
+        profile['samples'].append(ids)
+        profile['weights'].append(count * interval * 1000)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'gridbot profiler',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': thread, 'unit': 'milliseconds',
+            'startValue': 0, 'endValue': sum(profile['weights']),
+            'samples': profile['samples'], 'weights': profile['weights'],
+        } for thread, profile in sorted(profiles.items())],
+    }
+
+
+def trace_allocations(duration, top=25):
+    """Allocation growth over ``duration`` seconds from two tracemalloc snapshots, largest first.
+
+    tracemalloc slows allocation-heavy code noticeably, so it only runs for
+    the duration of the request (unless it was already on).
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this process")
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot()
+        time.sleep(min(duration, MAX_DURATION))
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        stats = after.compare_to(before, 'traceback')[:top]
+        return {
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'top': [{
+                'size_diff': stat.size_diff,
+                'size': stat.size,
+                'count_diff': stat.count_diff,
+                'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            } for stat in stats],
+        }
+    finally:
+        if started:
+            tracemalloc.stop()
+        _busy.release()
+
+
+def write_profile(directory, duration, interval=DEFAULT_INTERVAL):
+    """Sample this process for ``duration`` seconds into collapsed and speedscope files; returns their stem"""
+    samples = sample_stacks(duration, interval)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"gridbot-{os.getpid()}-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}")
+    with open(f"{stem}.collapsed", 'w') as f:
+        f.write(collapsed(samples))
+    with open(f"{stem}.speedscope.json", 'w') as f:
+        json.dump(speedscope(samples, interval, name=f"gridbot pid {os.getpid()}"), f)
+    return stem
+
+
+def install_signal_handler(directory, duration=SIGNAL_DURATION, signum=signal.SIGUSR1):
+    """Profile this process for ``duration`` seconds whenever it receives ``signum`` (SIGUSR1).
+
+    For processes without a web server, like ``flask run-engine``: ``kill
+    -USR1 <pid>`` samples every thread from a background thread and writes
+    the result to ``directory``.
+    """
+    def run():
+        try:
+            logger.info(f"Profiling pid {os.getpid()} for {duration}s")
+            logger.info(f"Wrote profile {write_profile(directory, duration)}.*")
+        except ProfilerBusy as e:
+            logger.warning(str(e))
+        except Exception as e:
+            logger.error(f"Error profiling: {e}")
+
+    def handler(signum, frame):
+        threading.Thread(target=run, name='profiler', daemon=True).start()
+
+    signal.signal(signum, handler)
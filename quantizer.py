@@ -0,0 +1,139 @@
+import math
+from decimal import Decimal
+import numpy as np
+
+# Slack for float division noise when flooring a quantity to whole steps (0.3 / 0.1 = 2.9999999999999996)
+STEP_EPSILON = 1e-9
+
+
+def _filter(symbol_info, filter_type):
+    return next((f for f in symbol_info['filters'] if f['filterType'] == filter_type), {})
+
+
+def _filter_values(symbol_info):
+    # Everything a SymbolQuantizer is built from: symbol, tickSize, stepSize, minQty, notional
+    lot_size = _filter(symbol_info, 'LOT_SIZE')
+    return (symbol_info['symbol'],
+            _filter(symbol_info, 'PRICE_FILTER').get('tickSize', '1'),
+            lot_size.get('stepSize', '1'),
+            lot_size.get('minQty', 0),
+            _filter(symbol_info, 'MIN_NOTIONAL').get('notional', 0))
+
+
+def _format(units, decimals):
+    # Integer count of 10**-decimals units as a plain decimal string without trailing zeros
+    if not decimals:
+        return str(units)
+    sign = '-' if units < 0 else ''
+    whole, frac = divmod(abs(units), 10 ** decimals)
+    text = f"{sign}{whole}.{frac:0{decimals}d}".rstrip('0')
+    return text[:-1] if text.endswith('.') else text
+
+
+class SymbolQuantizer:
+    """Exact price and quantity arithmetic for one symbol in integer tick and step counts.
+
+    Built once per exchangeInfo from the tickSize and stepSize strings. A
+    price is an integer number of ticks, so comparing two prices is exact
+    for any tick size, and turning ticks back into a float or an order
+    string is integer arithmetic. Rounding to a number of decimals is
+    wrong for ticks like 0.5 or 10, and a fixed tolerance like 0.0001
+    merges neighbouring levels on low-priced symbols.
+    """
+    __slots__ = ('symbol', 'tick', 'step', 'price_decimals', 'qty_decimals', 'tick_units', 'step_units',
+                 'min_qty', 'min_notional')
+
+    def __init__(self, symbol, tick_size, step_size, min_qty=0.0, min_notional=0.0):
+        self.symbol = symbol
+        tick, step = Decimal(str(tick_size)).normalize(), Decimal(str(step_size)).normalize()
+        self.tick = float(tick)
+        self.step = float(step)
+        self.price_decimals = max(0, -tick.as_tuple().exponent)
+        self.qty_decimals = max(0, -step.as_tuple().exponent)
+        # Tick and step as whole numbers of the smallest decimal unit they need
+        self.tick_units = int(tick.scaleb(self.price_decimals))
+        self.step_units = int(step.scaleb(self.qty_decimals))
+        self.min_qty = float(min_qty)
+        self.min_notional = float(min_notional)
+
+    @classmethod
+    def from_symbol_info(cls, symbol_info):
+        """Quantizer for one entry of exchangeInfo['symbols']"""
+        return cls(*_filter_values(symbol_info))
+
+    def ticks(self, price):
+        """Nearest whole number of ticks for a price"""
+        return int(round(price / self.tick))
+
+    def ticks_array(self, prices):
+        return np.rint(np.asarray(prices, dtype=np.float64) / self.tick).astype(np.int64)
+
+    def ladder(self, lower_bound, upper_bound, grid_size):
+        """Grid levels from lower to upper bound, evenly spaced and snapped to ticks, as int64 tick counts"""
+        return self.ticks_array(np.linspace(lower_bound, upper_bound, grid_size))
+
+    def price(self, ticks):
+        """Float price of a tick count (the float nearest the exact decimal price)"""
+        return ticks * self.tick_units / 10 ** self.price_decimals
+
+    def prices(self, ticks):
+        return np.asarray(ticks, dtype=np.int64) * self.tick_units / 10 ** self.price_decimals
+
+    def steps(self, quantity):
+        """Whole steps in a quantity, rounded down as LOT_SIZE requires"""
+        return math.floor(quantity / self.step + STEP_EPSILON)
+
+    def quantity(self, steps):
+        return steps * self.step_units / 10 ** self.qty_decimals
+
+    def round_quantity(self, quantity):
+        """A quantity rounded down to the symbol's step size"""
+        return self.quantity(self.steps(quantity))
+
+    def format_price(self, ticks):
+        """Exact order string for a tick count"""
+        return _format(int(ticks) * self.tick_units, self.price_decimals)
+
+    def format_prices(self, ticks):
+        """Exact order strings for an array of tick counts"""
+        scale = 10 ** self.price_decimals
+        if not self.price_decimals:
+            return [str(units) for units in (np.asarray(ticks, dtype=np.int64) * self.tick_units).tolist()]
+        whole, frac = np.divmod(np.asarray(ticks, dtype=np.int64) * self.tick_units, scale)
+        texts = [f"{w}.{f:0{self.price_decimals}d}".rstrip('0') for w, f in zip(whole.tolist(), frac.tolist())]
+        return [text[:-1] if text.endswith('.') else text for text in texts]
+
+    def format_quantity(self, steps):
+        return _format(int(steps) * self.step_units, self.qty_decimals)
+
+
+def build_quantizers(exchange_info):
+    """symbol -> SymbolQuantizer for every symbol in an exchangeInfo response"""
+    return {s['symbol']: SymbolQuantizer.from_symbol_info(s) for s in exchange_info['symbols']}
+
+
+# Quantizers by their filter values, shared by every exchangeInfo document: the engine, the web
+# workers and each shared-cache refresh hand out different objects, but the filters rarely change
+_quantizers = {}
+# The last exchangeInfo document asked about, with the quantizers looked up for it so far
+_current = (None, {})
+
+
+def symbol_quantizer(exchange_info, symbol):
+    """The quantizer for ``symbol``; raises ValueError for an unknown symbol"""
+    global _current
+    info, table = _current
+    if info is not exchange_info:
+        table = {}
+        _current = (exchange_info, table)
+    quantizer = table.get(symbol)
+    if quantizer is None:
+        symbol_info = next((s for s in exchange_info['symbols'] if s['symbol'] == symbol), None)
+        if symbol_info is None:
+            raise ValueError(f"Symbol {symbol} not found")
+        values = _filter_values(symbol_info)
+        quantizer = _quantizers.get(values)
+        if quantizer is None:
+            quantizer = _quantizers[values] = SymbolQuantizer(*values)
+        table[symbol] = quantizer
+    return quantizer
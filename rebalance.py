@@ -0,0 +1,70 @@
+import math
+from collections import namedtuple
+
+# Orders are cancelled/placed/amended through the batch endpoints in chunks of these sizes
+CANCEL_BATCH_SIZE = 10
+PLACE_BATCH_SIZE = 5
+MODIFY_BATCH_SIZE = 5
+
+SIDES = {'long': ('BUY', 'LONG'), 'short': ('SELL', 'SHORT')}
+
+# keep: open orders already on a target level; amend: (order, new price) pairs;
+# cancel: open orders with no target left; place: (position_type, price) still missing
+RebalancePlan = namedtuple('RebalancePlan', ['keep', 'amend', 'cancel', 'place'])
+
+
+def target_ladder(levels, current_price, positions, tolerance):
+    """(position_type, price) for every order the grid should have open at ``current_price``.
+
+    Mirrors the strategy: longs below the price, shorts above, skipping levels
+    that already hold a filled position of that type.
+    """
+    filled = [(p.position_type, p.price_level) for p in positions if p.is_filled]
+    target = []
+    for level in levels:
+        for position_type, wanted in (('long', level < current_price), ('short', level > current_price)):
+            if wanted and not any(t == position_type and abs(price - level) < tolerance for t, price in filled):
+                target.append((position_type, level))
+    return target
+
+
+def plan_rebalance(positions, target, quantity, tolerance):
+    """Diff the open orders in ``positions`` against ``target`` using the fewest operations.
+
+    Orders already on a target level with the right quantity are kept. The
+    rest are paired with the remaining target levels in price order and
+    amended in place (one request instead of a cancel plus a place); only the
+    surplus on either side is cancelled or placed.
+    """
+    keep, amend, cancel, place = [], [], [], []
+    for position_type in SIDES:
+        orders = sorted((p for p in positions
+                         if p.position_type == position_type and p.order_id and not p.is_filled),
+                        key=lambda p: p.price_level)
+        wanted = sorted(price for t, price in target if t == position_type)
+
+        stale = []
+        for order in orders:
+            match = next((i for i, price in enumerate(wanted) if abs(price - order.price_level) < tolerance), None)
+            if match is not None and math.isclose(order.quantity, quantity, rel_tol=1e-9):
+                keep.append(order)
+                wanted.pop(match)
+            else:
+                stale.append(order)
+
+        amend.extend(zip(stale, wanted))
+        cancel.extend(stale[len(wanted):])
+        place.extend((position_type, price) for price in wanted[len(stale):])
+    return RebalancePlan(keep, amend, cancel, place)
+
+
+def shift_range(lower_bound, upper_bound, grid_size, current_price):
+    """Bounds moved by whole grid steps so ``current_price`` is back near the middle of the range"""
+    step = (upper_bound - lower_bound) / (grid_size - 1)
+    middle = (lower_bound + upper_bound) / 2
+    steps = round((current_price - middle) / step)
+    return lower_bound + steps * step, upper_bound + steps * step
+
+
+def chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
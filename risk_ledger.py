@@ -0,0 +1,205 @@
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MARGIN_ASSET = 'USDT'
+# Ledger vs exchange margin difference (fraction of the exchange figure) worth a warning
+DRIFT_WARNING = 0.05
+
+
+def order_margin(price, quantity, leverage):
+    """Initial margin an order or position ties up"""
+    return price * quantity / (leverage or 1)
+
+
+def allocation_limit(balance, wallet_allocation):
+    """Margin a grid may use: its wallet_allocation percent of the wallet (no allocation means all of it)"""
+    return balance * (wallet_allocation if wallet_allocation is not None else 100) / 100
+
+
+def wallet_balance(account):
+    """USDT wallet balance from a /fapi/v2/account response"""
+    for asset in account.get('assets', []):
+        if asset.get('asset') == MARGIN_ASSET:
+            return float(asset.get('walletBalance', 0))
+    return 0.0
+
+
+class GridRisk:
+    __slots__ = ('grid_id', 'user', 'allocation', 'leverage', 'orders', 'reserved', 'exposure', 'held')
+
+    def __init__(self, grid_id, user, allocation, leverage):
+        self.grid_id = grid_id
+        self.user = user
+        self.allocation = allocation
+        self.leverage = leverage or 1
+        # order id -> [price, quantity, filled]
+        self.orders = {}
+        self.reserved = 0.0
+        self.exposure = 0.0
+        self.held = 0.0
+
+    @property
+    def used(self):
+        return self.reserved + self.exposure + self.held
+
+
+class UserRisk:
+    __slots__ = ('user_id', 'balance', 'grids', 'reserved', 'exposure', 'held')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # Unknown until the first reconciliation; nothing is placed before that
+        self.balance = None
+        self.grids = set()
+        self.reserved = 0.0
+        self.exposure = 0.0
+        self.held = 0.0
+
+    @property
+    def used(self):
+        return self.reserved + self.exposure + self.held
+
+
+class RiskLedger:
+    """Per-user margin accounting for pre-trade checks without an account request per order.
+
+    Every grid's open orders (reserved margin) and filled positions
+    (exposure, as margin) are kept per grid and summed per user, updated
+    from the write-behind store's listener on every placement, amend, fill
+    and cancel the engine stages. An order may be placed when both the
+    grid's wallet_allocation share and the user's whole wallet have room
+    for it; reserve() holds the margin while the order is in flight so
+    concurrent passes cannot both spend it. The wallet balance comes from a
+    periodic reconcile() against /fapi/v2/account, which also reports how
+    far the ledger drifted from the exchange's own margin figures.
+    """
+    def __init__(self):
+        self.users = {}
+        self.grids = {}
+
+    def load_grid(self, grid_id, user_id, allocation, leverage, positions):
+        """Add or replace a grid from its current positions"""
+        # Holds of orders still in flight carry over to the reloaded grid
+        previous = self.remove_grid(grid_id)
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserRisk(user_id)
+        grid = self.grids[grid_id] = GridRisk(grid_id, user, allocation, leverage)
+        user.grids.add(grid_id)
+        if previous is not None:
+            grid.held = previous.held
+            user.held += previous.held
+            if user.balance is None and previous.user.user_id == user_id:
+                user.balance = previous.user.balance
+        for p in positions:
+            if p.order_id is not None:
+                self._add(grid, str(p.order_id), p.price_level, p.quantity, bool(p.is_filled))
+        return grid
+
+    def remove_grid(self, grid_id):
+        grid = self.grids.pop(grid_id, None)
+        if grid is None:
+            return None
+        user = grid.user
+        user.reserved -= grid.reserved
+        user.exposure -= grid.exposure
+        user.held -= grid.held
+        user.grids.discard(grid_id)
+        if not user.grids:
+            del self.users[user.user_id]
+        return grid
+
+    def headroom(self, grid_id):
+        """Margin still available to a grid, or None when its user's balance is not known yet"""
+        grid = self.grids.get(grid_id)
+        if grid is None or grid.user.balance is None:
+            return None
+        return min(allocation_limit(grid.user.balance, grid.allocation) - grid.used,
+                   grid.user.balance - grid.user.used)
+
+    def reserve(self, grid_id, price, quantity, replaces=None):
+        """Hold the margin of an order about to be sent; False if it does not fit.
+
+        ``replaces`` is the (price, quantity) of the open order an amend
+        moves, whose margin the ledger already counts.
+        """
+        grid = self.grids.get(grid_id)
+        if grid is None:
+            return True
+        margin = self._margin(grid, price, quantity, replaces)
+        headroom = self.headroom(grid_id)
+        if headroom is None or margin > headroom:
+            return False
+        grid.held += margin
+        grid.user.held += margin
+        return True
+
+    def settle(self, grid_id, price, quantity, replaces=None):
+        """Drop the hold taken by reserve() once the order is recorded (or failed)"""
+        grid = self.grids.get(grid_id)
+        if grid is None:
+            return
+        margin = self._margin(grid, price, quantity, replaces)
+        grid.held -= margin
+        grid.user.held -= margin
+
+    def apply(self, op, grid_id, order_id, fields):
+        """WriteBehindStore listener: account for a staged position write"""
+        grid = self.grids.get(grid_id)
+        if grid is None or order_id is None:
+            return
+        current = grid.orders.get(order_id)
+        if op == 'insert_position':
+            if current is not None:
+                self._remove(grid, order_id)
+            self._add(grid, order_id, fields['price_level'], fields['quantity'], bool(fields.get('is_filled')))
+        elif op == 'update_position' and current is not None:
+            price, quantity, filled = current
+            self._remove(grid, order_id)
+            self._add(grid, order_id, fields.get('price_level', price), fields.get('quantity', quantity),
+                      bool(fields.get('is_filled', filled)))
+        elif op == 'delete_position' and current is not None:
+            self._remove(grid, order_id)
+
+    def reconcile(self, user_id, account):
+        """Take the wallet balance from an account snapshot and log drift from the exchange's margin"""
+        user = self.users.get(user_id)
+        if user is None:
+            return
+        user.balance = wallet_balance(account)
+        exchange = float(account.get('totalInitialMargin', 0))
+        ledger = user.reserved + user.exposure
+        if exchange and abs(ledger - exchange) > DRIFT_WARNING * exchange:
+            # Manual trades, other bots or rounding; the balance check still uses the exchange's balance
+            logger.warning(f"Risk ledger for user {user_id} tracks {ledger:.2f} {MARGIN_ASSET} margin, "
+                           f"exchange reports {exchange:.2f}")
+        return ledger - exchange
+
+    def _margin(self, grid, price, quantity, replaces):
+        margin = order_margin(price, quantity, grid.leverage)
+        if replaces is not None:
+            # An amend only needs room for the margin it adds to the order it moves
+            margin = max(0.0, margin - order_margin(*replaces, grid.leverage))
+        return margin
+
+    def _add(self, grid, order_id, price, quantity, filled):
+        grid.orders[order_id] = [price, quantity, filled]
+        margin = order_margin(price, quantity, grid.leverage)
+        if filled:
+            grid.exposure += margin
+            grid.user.exposure += margin
+        else:
+            grid.reserved += margin
+            grid.user.reserved += margin
+
+    def _remove(self, grid, order_id):
+        price, quantity, filled = grid.orders.pop(order_id)
+        margin = order_margin(price, quantity, grid.leverage)
+        if filled:
+            grid.exposure -= margin
+            grid.user.exposure -= margin
+        else:
+            grid.reserved -= margin
+            grid.user.reserved -= margin
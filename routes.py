@@ -1,15 +1,27 @@
 import os
 import json
 import logging
+import datetime
+import functools
 import requests
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import (render_template, request, redirect, url_for, flash, jsonify, session,
+                   Response, stream_with_context)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from binance.exceptions import BinanceAPIException
-from app import db, app
+from exchange_errors import BinanceAPIException
+from app import db
 from models import User, GridConfig, GridPosition, TradeHistory
-from binance_client import BinanceClient
-from grid_strategy import (create_grid_levels, calculate_grid_profit, calculate_grid_performance,
+from binance_client import BinanceClient, ACCOUNT_TTL
+from sqlite_profile import read_session
+from trade_export import trades_page, export_csv, export_ndjson
+from tick_store import get_tick_store, now_ms
+from chart_data import market_series
+from dashboard_state import build_state
+from shutdown import begin_shutdown
+from user_cache import load_user as load_cached_user, invalidate_user, client_for
+from profiler import (sample_stacks, collapsed, speedscope, trace_allocations, ProfilerBusy, DEFAULT_INTERVAL,
+                      REQUEST_MAX_DURATION)
+from grid_strategy import (create_grid_levels, calculate_grid_profit, calculate_grid_performance, grid_trade_totals,
                           validate_grid_parameters, create_grid_config, update_grid_config, delete_grid_config)
 
 # Configure logging
@@ -18,6 +30,17 @@ logger = logging.getLogger(__name__)
 # Initialize LoginManager
 login_manager = LoginManager()
 
+def admin_required(view):
+    """Only users listed in ADMIN_USERS (comma-separated usernames) may call the view"""
+    @functools.wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        admins = {name.strip() for name in os.environ.get("ADMIN_USERS", "").split(',') if name.strip()}
+        if current_user.username not in admins:
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
 def register_routes(app):
     """Register all routes with the app"""
     login_manager.init_app(app)
@@ -25,7 +48,7 @@ def register_routes(app):
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
     
     # Home route
     @app.route('/')
@@ -108,13 +131,15 @@ def register_routes(app):
     @app.route('/dashboard')
     @login_required
     def dashboard():
-        # Get user's grid configs
-        grid_configs = GridConfig.query.filter_by(user_id=current_user.id).all()
-        
-        # Calculate performance for each grid
-        for grid in grid_configs:
-            grid.performance = calculate_grid_performance(grid)
-            grid.potential = calculate_grid_profit(grid)
+        with read_session(db) as db_session:
+            # Get user's grid configs
+            grid_configs = db_session.query(GridConfig).filter_by(user_id=current_user.id).all()
+            
+            # Calculate performance for each grid from one aggregate pass
+            totals = grid_trade_totals(db_session, [grid.id for grid in grid_configs])
+            for grid in grid_configs:
+                grid.performance = calculate_grid_performance(grid, totals=totals[grid.id])
+                grid.potential = calculate_grid_profit(grid)
             
         return render_template('dashboard.html', grid_configs=grid_configs)
         
@@ -156,6 +181,7 @@ def register_routes(app):
                     current_user.api_key = api_key
                     current_user.api_secret = api_secret
                     db.session.commit()
+                    invalidate_user(current_user.id)
                     flash('API keys saved without verification', 'success')
                 else:
                     # Test API connection
@@ -166,6 +192,7 @@ def register_routes(app):
                             current_user.api_key = api_key
                             current_user.api_secret = api_secret
                             db.session.commit()
+                            invalidate_user(current_user.id)
                             flash('API keys saved and verified successfully', 'success')
                         else:
                             flash('Invalid API keys or connection failed', 'danger')
@@ -190,6 +217,7 @@ def register_routes(app):
             leverage = request.form.get('leverage')
             bot_type = request.form.get('bot_type', 'both')  # Default to both if not specified
             wallet_allocation = request.form.get('wallet_allocation', 10)  # Default to 10% if not specified
+            trailing = request.form.get('trailing') == 'on'
             
             # Validate inputs
             errors = validate_grid_parameters(
@@ -213,7 +241,8 @@ def register_routes(app):
                     quantity_per_grid,
                     leverage,
                     bot_type,
-                    wallet_allocation
+                    wallet_allocation,
+                    trailing
                 )
                 
                 flash('Grid configuration created successfully', 'success')
@@ -252,12 +281,17 @@ def register_routes(app):
                 
             # Toggle grid active status
             is_active = not grid_config.is_active
+            if is_active and grid_config.shutdown_state()[0] == 'stopping':
+                flash('The grid bot is still stopping. Please wait for it to finish.', 'warning')
+                return redirect(url_for('dashboard'))
             
             # If activating, set up grid trading
             if is_active:
                 try:
-                    client = BinanceClient(current_user.api_key, current_user.api_secret)
+                    client = client_for(current_user)
                     if client.setup_grid_trading(grid_config):
+                        grid_config.shutdown_status = None
+                        grid_config.shutdown_detail = None
                         update_grid_config(grid_id, is_active=is_active)
                         flash('Grid bot started successfully', 'success')
                     else:
@@ -276,9 +310,9 @@ def register_routes(app):
                     logger.error(f"Error setting up grid trading: {e}")
                     flash(f'Failed to start grid bot: {str(e)}', 'danger')
             else:
-                # Deactivate grid
-                update_grid_config(grid_id, is_active=is_active)
-                flash('Grid bot stopped successfully', 'success')
+                # Deactivate now; open orders are cancelled (and positions closed) in the background
+                begin_shutdown(grid_config, flatten=request.form.get('flatten') == '1')
+                flash('Grid bot is stopping. Open orders are being cancelled.', 'info')
                 
             return redirect(url_for('dashboard'))
         except Exception as e:
@@ -296,11 +330,17 @@ def register_routes(app):
                 flash('Grid not found', 'danger')
                 return redirect(url_for('dashboard'))
                 
-            # Can't delete an active grid
-            if grid_config.is_active:
-                flash('Please stop the grid bot before deleting', 'danger')
+            if grid_config.shutdown_state()[0] == 'stopping':
+                flash('The grid bot is still stopping. Please wait for it to finish.', 'warning')
                 return redirect(url_for('dashboard'))
-                
+
+            # Grids that may still have orders on the exchange are shut down first, then deleted
+            has_orders = grid_config.is_active or GridPosition.query.filter_by(grid_config_id=grid_id).first()
+            if has_orders and current_user.api_key and current_user.api_secret:
+                begin_shutdown(grid_config, delete=True)
+                flash('Grid bot is stopping and will be deleted once its orders are cancelled.', 'info')
+                return redirect(url_for('dashboard'))
+
             # Delete grid
             delete_grid_config(grid_id)
             flash('Grid configuration deleted successfully', 'success')
@@ -311,35 +351,56 @@ def register_routes(app):
             return redirect(url_for('dashboard'))
             
     # API routes for AJAX requests
+    @app.route('/api/dashboard/state')
+    @login_required
+    def get_dashboard_state():
+        """All of the user's grids in one response; pass the returned ``since`` back for deltas"""
+        chart_width = request.args.get('chart_width', type=int)
+        if chart_width is not None:
+            chart_width = max(50, min(chart_width, 4000))
+        chart_window = max(60, min(request.args.get('chart_window', 86400, type=int), 90 * 86400))
+        try:
+            with read_session(db) as db_session:
+                state = build_state(db_session, current_user.id, since=request.args.get('since'),
+                                    chart_width=chart_width, chart_window=chart_window,
+                                    tick_store=get_tick_store(app))
+            return jsonify(state)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error getting dashboard state: {e}")
+            return jsonify({'error': str(e)}), 500
+            
     @app.route('/api/grid/<int:grid_id>/positions')
     @login_required
     def get_grid_positions(grid_id):
         try:
-            grid_config = GridConfig.query.get(grid_id)
-            
-            if not grid_config or grid_config.user_id != current_user.id:
-                return jsonify({'error': 'Grid not found'}), 404
+            with read_session(db) as db_session:
+                grid_config = db_session.get(GridConfig, grid_id)
                 
-            # Get grid positions
-            long_positions = [
-                {
-                    'id': pos.id,
-                    'price_level': pos.price_level,
-                    'quantity': pos.quantity,
-                    'is_filled': pos.is_filled
-                }
-                for pos in grid_config.long_positions
-            ]
-            
-            short_positions = [
-                {
-                    'id': pos.id,
-                    'price_level': pos.price_level,
-                    'quantity': pos.quantity,
-                    'is_filled': pos.is_filled
-                }
-                for pos in grid_config.short_positions
-            ]
+                if not grid_config or grid_config.user_id != current_user.id:
+                    return jsonify({'error': 'Grid not found'}), 404
+                    
+                # Get grid positions
+                long_positions = [
+                    {
+                        'id': pos.id,
+                        'price_level': pos.price_level,
+                        'quantity': pos.quantity,
+                        'is_filled': pos.is_filled
+                    }
+                    for pos in grid_config.long_positions
+                ]
+                
+                short_positions = [
+                    {
+                        'id': pos.id,
+                        'price_level': pos.price_level,
+                        'quantity': pos.quantity,
+                        'is_filled': pos.is_filled
+                    }
+                    for pos in grid_config.short_positions
+                ]
             
             # Get grid levels
             grid_levels = create_grid_levels(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
@@ -348,7 +409,7 @@ def register_routes(app):
             current_price = None
             if current_user.api_key and current_user.api_secret:
                 try:
-                    client = BinanceClient(current_user.api_key, current_user.api_secret)
+                    client = client_for(current_user)
                     current_price = client.get_symbol_price(grid_config.symbol)
                 except BinanceAPIException as e:
                     logger.error(f"Error getting current price: {e}")
@@ -374,13 +435,19 @@ def register_routes(app):
     @login_required
     def get_grid_trades(grid_id):
         try:
-            grid_config = GridConfig.query.get(grid_id)
-            
-            if not grid_config or grid_config.user_id != current_user.id:
-                return jsonify({'error': 'Grid not found'}), 404
+            with read_session(db) as db_session:
+                grid_config = db_session.get(GridConfig, grid_id)
                 
-            # Get trades for this grid
-            trades = TradeHistory.query.filter_by(grid_config_id=grid_id).order_by(TradeHistory.executed_at.desc()).limit(50).all()
+                if not grid_config or grid_config.user_id != current_user.id:
+                    return jsonify({'error': 'Grid not found'}), 404
+                    
+                # Get one page of trades for this grid, newest first
+                try:
+                    trades, next_cursor = trades_page(db_session, grid_id,
+                                                      cursor=request.args.get('cursor'),
+                                                      limit=request.args.get('limit', 50, type=int))
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
             
             trade_data = [
                 {
@@ -395,11 +462,125 @@ def register_routes(app):
                 for trade in trades
             ]
             
-            return jsonify({'trades': trade_data})
+            return jsonify({'trades': trade_data, 'next_cursor': next_cursor})
         except Exception as e:
             logger.error(f"Error getting grid trades: {e}")
             return jsonify({'error': str(e)}), 500
             
+    @app.route('/api/grid/<int:grid_id>/trades/export')
+    @login_required
+    def export_grid_trades(grid_id):
+        """Stream the grid's full trade history as CSV (default) or NDJSON"""
+        export_format = request.args.get('format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+            
+        with read_session(db) as db_session:
+            grid_config = db_session.get(GridConfig, grid_id)
+            if not grid_config or grid_config.user_id != current_user.id:
+                return jsonify({'error': 'Grid not found'}), 404
+            symbol = grid_config.symbol
+            
+        def generate():
+            with read_session(db) as db_session:
+                exporter = export_csv if export_format == 'csv' else export_ndjson
+                yield from exporter(db_session, grid_id)
+                
+        filename = f"trades_{symbol}_{grid_id}.{export_format}"
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+            
+    @app.route('/api/grid/<int:grid_id>/ticks')
+    @login_required
+    def get_grid_ticks(grid_id):
+        """Recorded price ticks for the grid's symbol between start and end (epoch ms)"""
+        grid_config = GridConfig.query.get(grid_id)
+        if not grid_config or grid_config.user_id != current_user.id:
+            return jsonify({'error': 'Grid not found'}), 404
+            
+        end = request.args.get('end', type=int) or now_ms()
+        start = request.args.get('start', end - 3600 * 1000, type=int)
+        limit = max(1, min(request.args.get('limit', 5000, type=int), 50000))
+        ts, prices = get_tick_store(app).range(grid_config.symbol, start, end)
+        # Keep the newest ticks when the window holds more than the limit
+        ts, prices = ts[-limit:], prices[-limit:]
+        return jsonify({
+            'symbol': grid_config.symbol,
+            'timestamps': ts.tolist(),
+            'prices': prices.tolist()
+        })
+            
+    @app.route('/api/grid/<int:grid_id>/chart')
+    @login_required
+    def get_grid_chart(grid_id):
+        """Downsampled price history with the grid's levels, open orders and fills overlaid"""
+        mode = request.args.get('mode', 'ohlc')
+        if mode not in ('ohlc', 'line'):
+            return jsonify({'error': 'mode must be ohlc or line'}), 400
+        width = max(50, min(request.args.get('width', 800, type=int), 4000))
+        window_ms = max(60, min(request.args.get('window', 86400, type=int), 90 * 86400)) * 1000
+        
+        try:
+            with read_session(db) as db_session:
+                grid_config = db_session.get(GridConfig, grid_id)
+                
+                if not grid_config or grid_config.user_id != current_user.id:
+                    return jsonify({'error': 'Grid not found'}), 404
+                    
+                series = market_series(grid_config.symbol, window_ms, width, mode,
+                                       end=request.args.get('end', type=int), tick_store=get_tick_store(app))
+                
+                positions = [
+                    {
+                        'price_level': pos.price_level,
+                        'position_type': pos.position_type,
+                        'is_filled': pos.is_filled
+                    }
+                    for pos in db_session.query(GridPosition).filter_by(grid_config_id=grid_id)
+                ]
+                
+                window_start = datetime.datetime.utcfromtimestamp(series['start'] / 1000)
+                window_end = datetime.datetime.utcfromtimestamp(series['end'] / 1000)
+                fills = [
+                    {
+                        't': int(trade.executed_at.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000),
+                        'price': trade.price,
+                        'side': trade.side,
+                        'position_side': trade.position_side
+                    }
+                    for trade in db_session.query(TradeHistory)
+                    .filter(TradeHistory.grid_config_id == grid_id,
+                            TradeHistory.executed_at >= window_start,
+                            TradeHistory.executed_at < window_end)
+                    .order_by(TradeHistory.executed_at).limit(1000)
+                ]
+                
+                grid_levels = create_grid_levels(grid_config.lower_bound, grid_config.upper_bound, grid_config.grid_size)
+                bot_type = grid_config.bot_type
+                
+            if series.get('candles'):
+                current_price = series['candles'][-1][4]
+            elif series.get('line'):
+                current_price = series['line'][-1][1]
+            else:
+                current_price = None
+                
+            return jsonify(dict(
+                series,
+                mode=mode,
+                grid_levels=grid_levels.tolist(),
+                positions=positions,
+                fills=fills,
+                current_price=current_price,
+                bot_type=bot_type
+            ))
+        except Exception as e:
+            logger.error(f"Error getting grid chart: {e}")
+            return jsonify({'error': str(e)}), 500
+            
     @app.route('/api/symbols')
     @login_required
     def get_symbols():
@@ -414,7 +595,7 @@ def register_routes(app):
             ]
                 
             try:
-                client = BinanceClient(current_user.api_key, current_user.api_secret)
+                client = client_for(current_user)
                 exchange_info = client.get_exchange_info()
                 
                 # Filter for USDT futures symbols
@@ -465,7 +646,7 @@ def register_routes(app):
                 return jsonify({'error': 'API keys not set'}), 400
                 
             try:
-                client = BinanceClient(current_user.api_key, current_user.api_secret)
+                client = client_for(current_user)
                 price = client.get_symbol_price(symbol)
                 return jsonify({'price': price})
             except BinanceAPIException as e:
@@ -499,8 +680,8 @@ def register_routes(app):
                 return jsonify({'error': 'API keys not set'}), 400
                 
             try:
-                client = BinanceClient(current_user.api_key, current_user.api_secret)
-                account_info = client.get_account_info()
+                client = client_for(current_user)
+                account_info = client.get_account_info(max_age=ACCOUNT_TTL)
                 
                 # Get USDT balance
                 usdt_balance = 0
@@ -534,3 +715,37 @@ def register_routes(app):
         except Exception as e:
             logger.error(f"Error getting account balance: {e}")
             return jsonify({'error': str(e)}), 500
+
+    @app.route('/admin/profile')
+    @admin_required
+    def admin_profile():
+        """Profile this process for ``seconds``: sampled stacks of every thread, or tracemalloc growth.
+
+        ``format`` is ``collapsed`` (text for flamegraph tools), ``speedscope``
+        (a file for speedscope.app) or ``allocations``. Only the worker that
+        serves the request is profiled, for at most REQUEST_MAX_DURATION
+        seconds; the grid engine runs in the ``flask run-engine`` process,
+        which profiles itself on SIGUSR1.
+        """
+        seconds = max(1, min(request.args.get('seconds', 10, type=int), REQUEST_MAX_DURATION))
+        interval = max(0.001, request.args.get('interval_ms', DEFAULT_INTERVAL * 1000, type=float) / 1000)
+        output = request.args.get('format', 'collapsed')
+        if output not in ('collapsed', 'speedscope', 'allocations'):
+            return jsonify({'error': 'format must be collapsed, speedscope or allocations'}), 400
+        try:
+            logger.info(f"{current_user.username} started a {seconds}s {output} profile of pid {os.getpid()}")
+            if output == 'allocations':
+                return jsonify(dict(trace_allocations(seconds, top=request.args.get('top', 25, type=int)),
+                                    pid=os.getpid()))
+            samples = sample_stacks(seconds, interval)
+            if output == 'collapsed':
+                return Response(collapsed(samples), mimetype='text/plain')
+            filename = f"gridbot-{os.getpid()}-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.speedscope.json"
+            return Response(json.dumps(speedscope(samples, interval, name=f"gridbot pid {os.getpid()}")),
+                            mimetype='application/json',
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error profiling: {e}")
+            return jsonify({'error': str(e)}), 500
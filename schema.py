@@ -0,0 +1,103 @@
+import os
+import sys
+import fcntl
+import datetime
+import logging
+from contextlib import contextmanager
+import click
+from flask_migrate import Migrate, upgrade, stamp
+from sqlalchemy import inspect, select, true, text, and_, or_
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Revision matching the tables db.create_all() used to build before migrations existed
+BASELINE_REVISION = '0001_baseline'
+
+migrate = Migrate(directory=MIGRATIONS_DIR)
+
+
+@contextmanager
+def _schema_lock(app, db):
+    """Serialise schema upgrades between workers (flock on this host, advisory lock on PostgreSQL)"""
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, '.schema.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.connect() as conn:
+                conn.execute(text("SELECT pg_advisory_lock(hashtext('grid_bot_schema'))"))
+                try:
+                    yield
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(hashtext('grid_bot_schema'))"))
+        else:
+            yield
+
+
+def upgrade_schema(app, db):
+    """Bring the database up to the latest migration, adopting pre-migration databases"""
+    with _schema_lock(app, db):
+        tables = set(inspect(db.engine).get_table_names())
+        if 'alembic_version' not in tables and 'grid_config' in tables:
+            # Built by db.create_all() before migrations existed
+            logger.info(f"Stamping existing database at {BASELINE_REVISION}")
+            stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+        upgrade(directory=MIGRATIONS_DIR)
+
+
+def hot_queries():
+    """(description, expected index, statement) for every query on a hot path"""
+    from models import GridConfig, GridPosition, TradeHistory
+    return [
+        ('engine active-grid scan', 'ix_grid_config_active',
+         select(GridConfig).where(GridConfig.is_active == true())),
+        ('dashboard grids for user', 'ix_grid_config_user_id',
+         select(GridConfig).where(GridConfig.user_id == 1)),
+        ('position load', 'ix_grid_position_grid_type_filled',
+         select(GridPosition).where(GridPosition.grid_config_id == 1, GridPosition.position_type == 'long')),
+        ('position by order id', 'ix_grid_position_order',
+         select(GridPosition).where(GridPosition.order_id == '1', GridPosition.grid_config_id == 1)),
+        ('latest trades for grid', 'ix_trade_history_grid_executed',
+         select(TradeHistory).where(TradeHistory.grid_config_id == 1)
+         .order_by(TradeHistory.executed_at.desc()).limit(50)),
+        ('trades keyset page', 'ix_trade_history_grid_executed',
+         select(TradeHistory).where(
+             TradeHistory.grid_config_id == 1,
+             or_(TradeHistory.executed_at < datetime.datetime(2026, 1, 1),
+                 and_(TradeHistory.executed_at == datetime.datetime(2026, 1, 1), TradeHistory.id < 1)))
+         .order_by(TradeHistory.executed_at.desc(), TradeHistory.id.desc()).limit(50)),
+    ]
+
+
+def explain(db, stmt):
+    """Return the database's query plan for ``stmt`` as text"""
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'postgresql':
+            # Small or empty tables make sequential scans look cheapest; ask whether the index is usable
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            return '\n'.join(row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}"))
+        return '\n'.join(str(row[-1]) for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def register_commands(app, db):
+    """Register schema CLI commands on the app"""
+
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """Create or upgrade the database schema (run once per deploy, before the app starts)."""
+        upgrade_schema(app, db)
+        click.echo("Schema is up to date")
+
+    @app.cli.command('explain-hot-queries')
+    def explain_hot_queries():
+        """Check that every hot query is planned with its intended index."""
+        failures = 0
+        for description, index, stmt in hot_queries():
+            plan = explain(db, stmt)
+            ok = index in plan
+            failures += not ok
+            click.echo(f"[{'ok' if ok else 'MISSING'}] {description}: expected {index}")
+            click.echo('    ' + plan.replace('\n', '\n    '))
+        sys.exit(1 if failures else 0)
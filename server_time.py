@@ -0,0 +1,89 @@
+import os
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TIME_ENDPOINT = '/fapi/v1/time'
+# Re-sample the server clock this often (seconds)
+TIME_SYNC_INTERVAL = float(os.environ.get("TIME_SYNC_INTERVAL", 60))
+# Binance accepts recvWindow up to 60000 ms
+RECV_WINDOW_MIN = 3000
+RECV_WINDOW_MAX = 60000
+RECV_WINDOW_MARGIN = 1000
+SMOOTHING = 0.2
+TIMESTAMP_ERROR = -1021
+
+
+class ServerClock:
+    """Smoothed estimate of Binance server time relative to the local clock.
+
+    Each sample of /fapi/v1/time gives an offset (server time minus the local
+    midpoint of the request) and a round-trip time. Both are smoothed with an
+    EWMA, and samples whose RTT is far above normal are left out of the offset
+    because their midpoint is unreliable. recvWindow is sized from the smoothed
+    RTT and its deviation, like a TCP retransmission timeout.
+    """
+    def __init__(self, interval=TIME_SYNC_INTERVAL):
+        self.interval = interval
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.rtt_dev_ms = 0.0
+        self._last_sync = None
+        self._lock = threading.Lock()
+
+    def claim_sync(self):
+        """True for exactly one caller once a new sample is due"""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_sync is not None and now - self._last_sync < self.interval:
+                return False
+            self._last_sync = now
+            return True
+
+    def invalidate(self):
+        """Force a new sample before the next signed request (after a -1021)"""
+        with self._lock:
+            self._last_sync = None
+
+    def record(self, sent_ms, server_ms, received_ms):
+        rtt = max(0.0, received_ms - sent_ms)
+        offset = server_ms - (sent_ms + received_ms) / 2
+        with self._lock:
+            if self.rtt_ms is None:
+                self.offset_ms, self.rtt_ms, self.rtt_dev_ms = offset, rtt, rtt / 2
+            else:
+                noisy = rtt > self.rtt_ms + 4 * self.rtt_dev_ms
+                self.rtt_dev_ms += SMOOTHING * (abs(rtt - self.rtt_ms) - self.rtt_dev_ms)
+                self.rtt_ms += SMOOTHING * (rtt - self.rtt_ms)
+                if not noisy:
+                    self.offset_ms += SMOOTHING * (offset - self.offset_ms)
+        logger.debug(f"Server clock sample: offset {offset:.0f} ms, rtt {rtt:.0f} ms "
+                     f"(smoothed {self.offset_ms:.0f} ms / {self.rtt_ms:.0f} ms)")
+
+    def timestamp(self):
+        """Local time in epoch ms shifted onto the server clock"""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def recv_window(self):
+        if self.rtt_ms is None:
+            return 5000
+        window = self.rtt_ms + 4 * self.rtt_dev_ms + RECV_WINDOW_MARGIN
+        return int(min(RECV_WINDOW_MAX, max(RECV_WINDOW_MIN, window)))
+
+    def stamp(self, params):
+        """Add recvWindow and timestamp to a signed request's params"""
+        params['recvWindow'] = self.recv_window()
+        params['timestamp'] = self.timestamp()
+        return params
+
+
+def is_timestamp_error(payload):
+    """True when an error body is Binance's -1021 (timestamp outside recvWindow)"""
+    return isinstance(payload, dict) and payload.get('code') == TIMESTAMP_ERROR
+
+
+# One clock per process, shared by the sync and async clients
+server_clock = ServerClock()
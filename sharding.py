@@ -0,0 +1,133 @@
+import os
+import socket
+import logging
+import datetime
+from sqlalchemy import select, update, delete, or_, true
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import GridConfig, EngineWorker, ShardAssignment
+from hash_ring import HashRing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# A worker whose heartbeat is older than this is considered gone and its users are claimed
+WORKER_TTL = datetime.timedelta(seconds=float(os.environ.get("ENGINE_WORKER_TTL", 30)))
+# Rows of workers gone for this long are removed
+WORKER_EXPIRY = 10 * WORKER_TTL
+
+
+class ShardCoordinator:
+    """Assigns users (and with them all their grids) to engine workers through the database.
+
+    ``shard_assignment`` holds exactly one owner per user. The hash ring of
+    live workers decides who *should* own a user; a worker only takes a user
+    over with a conditional UPDATE when the row has no owner or its owner's
+    heartbeat has expired, and a worker that loses a user on the ring stops
+    running it before clearing the row.
+
+    The row alone cannot stop a worker whose heartbeat stalls (a slow
+    database, a paused process) from still trading users another worker has
+    claimed. So a worker only acts on its users while it holds its lease
+    (holds_lease()): its last heartbeat is younger than half the TTL, leaving
+    the other half as margin for requests already in flight and for clock
+    skew between hosts before anyone may take the users over.
+    """
+    def __init__(self, app, worker_id, ttl=WORKER_TTL):
+        self.app = app
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.live = []
+        self._last_heartbeat = None
+
+    def sync(self):
+        """Heartbeat, claim this worker's users and return (owned user ids, user ids to hand over)"""
+        now = datetime.datetime.utcnow()
+        with self.app.app_context():
+            try:
+                self._heartbeat(now)
+                self.live = sorted(db.session.execute(
+                    select(EngineWorker.id).where(EngineWorker.heartbeat_at >= now - self.ttl)).scalars())
+                ring = HashRing(self.live)
+
+                users = db.session.execute(
+                    select(GridConfig.user_id).distinct().where(GridConfig.is_active == true())).scalars().all()
+                assigned = dict(db.session.execute(select(ShardAssignment.user_id, ShardAssignment.worker_id)).all())
+                mine = [u for u in users if ring.owner(u) == self.worker_id]
+                missing = [u for u in mine if u not in assigned]
+                if missing:
+                    self._insert_missing(missing, now)
+                # Take over users without a live owner; a live owner hands them over itself
+                orphaned = [u for u in mine if u in assigned and assigned[u] not in self.live]
+                if orphaned:
+                    db.session.execute(update(ShardAssignment).where(
+                        ShardAssignment.user_id.in_(orphaned),
+                        or_(ShardAssignment.worker_id.is_(None), ShardAssignment.worker_id.notin_(self.live))
+                    ).values(worker_id=self.worker_id, assigned_at=now))
+                db.session.execute(delete(EngineWorker).where(EngineWorker.heartbeat_at < now - WORKER_EXPIRY))
+                db.session.commit()
+
+                owned = set(db.session.execute(
+                    select(ShardAssignment.user_id).where(ShardAssignment.worker_id == self.worker_id)).scalars())
+                self._last_heartbeat = now
+            except Exception:
+                db.session.rollback()
+                if self._last_heartbeat is not None and now - self._last_heartbeat >= self.ttl / 2:
+                    # Others may already consider this worker gone; stop running anything
+                    logger.error(f"Engine worker {self.worker_id} lost its heartbeat, dropping all shards")
+                    self._last_heartbeat = None
+                    return set(), set()
+                raise
+            finally:
+                db.session.remove()
+        handover = {u for u in owned if ring.owner(u) != self.worker_id}
+        return owned, handover
+
+    def holds_lease(self):
+        """Whether the last heartbeat is recent enough for this worker to place orders for its users"""
+        return (self._last_heartbeat is not None
+                and datetime.datetime.utcnow() - self._last_heartbeat < self.ttl / 2)
+
+    def release(self, user_ids):
+        """Give up users this worker has stopped running so their new owner can claim them"""
+        if not user_ids:
+            return
+        with self.app.app_context():
+            try:
+                db.session.execute(update(ShardAssignment).where(
+                    ShardAssignment.user_id.in_(list(user_ids)), ShardAssignment.worker_id == self.worker_id
+                ).values(worker_id=None))
+                db.session.commit()
+            finally:
+                db.session.remove()
+        logger.info(f"Engine worker {self.worker_id} handed over {len(user_ids)} users")
+
+    def leave(self):
+        """Release every user and deregister, so the other workers take over without waiting for the TTL"""
+        with self.app.app_context():
+            try:
+                db.session.execute(update(ShardAssignment).where(
+                    ShardAssignment.worker_id == self.worker_id).values(worker_id=None))
+                db.session.execute(delete(EngineWorker).where(EngineWorker.id == self.worker_id))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error deregistering engine worker {self.worker_id}: {e}")
+            finally:
+                db.session.remove()
+
+    def _heartbeat(self, now):
+        updated = db.session.execute(update(EngineWorker).where(
+            EngineWorker.id == self.worker_id).values(heartbeat_at=now)).rowcount
+        if not updated:
+            db.session.add(EngineWorker(id=self.worker_id, hostname=socket.gethostname(), pid=os.getpid(),
+                                        started_at=now, heartbeat_at=now))
+            db.session.flush()
+
+    def _insert_missing(self, user_ids, now):
+        # Two workers with different views of the ring may insert the same user; the second insert is skipped
+        dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        db.session.execute(
+            dialect.insert(ShardAssignment.__table__).on_conflict_do_nothing(index_elements=['user_id']),
+            [{'user_id': u, 'worker_id': self.worker_id, 'assigned_at': now} for u in user_ids]
+        )
@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from urllib.parse import urlparse
+import click
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# memory:// keeps the cache in each process; redis://host:port/db or unix:///path/to.sock
+# share it between gunicorn workers through Redis or `flask cache-server`
+CACHE_URL = os.environ.get("CACHE_URL", "memory://")
+CACHE_PREFIX = os.environ.get("CACHE_PREFIX", "gridbot:")
+FRONT_SIZE = int(os.environ.get("CACHE_FRONT_SIZE", 1024))
+# How long a process serves a shared value from its own LRU before looking again
+FRONT_TTL = float(os.environ.get("CACHE_FRONT_TTL", 1.0))
+# A refresh holds the key's lock at most this long; waiters then compute themselves
+LOCK_TIMEOUT = 10.0
+LOCK_POLL = 0.05
+STRIPES = 64
+
+
+class LRUCache:
+    """Thread-safe LRU of ``key -> (expires, value)`` with monotonic expiry"""
+    def __init__(self, size=FRONT_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class RespBackend:
+    """Minimal client for a Redis-protocol server (Redis, Valkey, or ``flask cache-server``).
+
+    Only GET, SET (EX/PX/NX) and DEL are used. Each thread keeps its own
+    connection and reconnects once when a command fails on a dropped socket.
+    """
+    def __init__(self, url, timeout=2.0):
+        parsed = urlparse(url)
+        if parsed.scheme == 'unix':
+            self.address = (socket.AF_UNIX, parsed.path)
+        else:
+            self.address = (socket.AF_INET, (parsed.hostname or '127.0.0.1', parsed.port or 6379))
+        self.db = int(parsed.path.strip('/') or 0) if parsed.scheme != 'unix' else 0
+        self.password = parsed.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        family, address = self.address
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(address)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile('rb')
+        if self.password:
+            self._roundtrip(('AUTH', self.password))
+        if self.db:
+            self._roundtrip(('SELECT', self.db))
+
+    def _roundtrip(self, args):
+        self._local.sock.sendall(encode_command(args))
+        return read_reply(self._local.reader)
+
+    def command(self, *args):
+        for attempt in (0, 1):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._roundtrip(args)
+            except (OSError, EOFError):
+                self.close()
+                if attempt:
+                    raise
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl):
+        self.command('SET', key, value, 'PX', max(1, int(ttl * 1000)))
+
+    def add(self, key, ttl):
+        """Set ``key`` only if it does not exist; True when this call created it"""
+        return self.command('SET', key, '1', 'PX', max(1, int(ttl * 1000)), 'NX') == 'OK'
+
+    def delete(self, key):
+        self.command('DEL', key)
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = self._local.reader = None
+
+
+class RespError(Exception):
+    pass
+
+
+def encode_command(args):
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    line = reader.readline()
+    if not line:
+        raise EOFError("Connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        raise RespError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply: {line!r}")
+
+
+class SharedCache:
+    """Read-through cache: an in-process LRU in front of an optional shared backend.
+
+    ``get_or_compute`` coalesces concurrent misses for a key into one
+    ``compute()`` call, within a process through striped locks and across
+    processes through a short-lived lock key on the backend. Shared entries
+    outlive their TTL by a grace period so that, while one process refreshes
+    an expired key, the others keep serving the stale value instead of all
+    hitting Binance at once. Backend errors are logged and the value computed
+    locally, so a cache outage never blocks trading.
+    """
+    def __init__(self, backend=None, front_size=FRONT_SIZE, front_ttl=FRONT_TTL, prefix=CACHE_PREFIX):
+        self.backend = backend
+        self.front = LRUCache(front_size)
+        self.front_ttl = front_ttl
+        self.prefix = prefix
+        self._stripes = [threading.Lock() for _ in range(STRIPES)]
+
+    def _backend_call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            logger.warning(f"Shared cache {method} failed: {e}")
+            return None
+
+    def _remember(self, key, value, expires):
+        remaining = expires - time.time()
+        if remaining > 0:
+            self.front.set(key, value, remaining if self.backend is None else min(self.front_ttl, remaining))
+
+    def get_or_compute(self, key, ttl, compute):
+        """The cached value for ``key`` (a string), calling ``compute()`` at most once per ``ttl`` seconds.
+
+        Values must be JSON-serialisable when a shared backend is configured.
+        """
+        hit = self.front.get(key)
+        if hit is not None:
+            return hit[1]
+        with self._stripes[hash(key) % STRIPES]:
+            hit = self.front.get(key)
+            if hit is not None:
+                return hit[1]
+            if self.backend is None:
+                value = compute()
+                self.front.set(key, value, ttl)
+                return value
+            return self._shared(key, ttl, compute)
+
+    def _shared(self, key, ttl, compute):
+        shared_key = self.prefix + key
+        stale = None
+        raw = self._backend_call('get', shared_key)
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry['e'] > time.time():
+                self._remember(key, entry['v'], entry['e'])
+                return entry['v']
+            stale = entry
+
+        lock_key = shared_key + ':lock'
+        owner = self._backend_call('add', lock_key, LOCK_TIMEOUT)
+        if not owner and stale is not None:
+            # Someone else is refreshing; the stale value is at most one TTL old
+            return stale['v']
+        if owner is False:
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL)
+                raw = self._backend_call('get', shared_key)
+                if raw is not None:
+                    entry = json.loads(raw)
+                    if entry['e'] > time.time():
+                        self._remember(key, entry['v'], entry['e'])
+                        return entry['v']
+        try:
+            value = compute()
+            expires = time.time() + ttl
+            self._backend_call('set', shared_key, json.dumps({'v': value, 'e': expires}, separators=(',', ':')), 2 * ttl)
+            self._remember(key, value, expires)
+            return value
+        finally:
+            if owner:
+                self._backend_call('delete', lock_key)
+
+    def invalidate(self, key):
+        self.front.delete(key)
+        if self.backend is not None:
+            self._backend_call('delete', self.prefix + key)
+
+
+def create_cache(url=CACHE_URL):
+    scheme = urlparse(url).scheme
+    if scheme == 'memory':
+        return SharedCache()
+    if scheme in ('redis', 'unix'):
+        return SharedCache(RespBackend(url))
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide SharedCache configured by CACHE_URL"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
+
+
+def cached(key, ttl, compute):
+    return get_cache().get_or_compute(key, ttl, compute)
+
+
+class _RespStandIn:
+    """In-memory store behind ``flask cache-server``: the subset of Redis that RespBackend uses"""
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is not None and item[0] is not None and item[0] <= time.monotonic():
+            del self.data[key]
+            return None
+        return item
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        with self.lock:
+            if name == 'PING':
+                return b'+PONG\r\n'
+            if name in ('SELECT', 'AUTH'):
+                return b'+OK\r\n'
+            if name == 'GET':
+                item = self._live(args[1])
+                return b'$-1\r\n' if item is None else b"$%d\r\n%s\r\n" % (len(item[1]), item[1])
+            if name == 'SET':
+                key, value, options = args[1], args[2], [a.decode().upper() for a in args[3:]]
+                expires = None
+                if 'PX' in options:
+                    expires = time.monotonic() + int(options[options.index('PX') + 1]) / 1000
+                elif 'EX' in options:
+                    expires = time.monotonic() + int(options[options.index('EX') + 1])
+                if 'NX' in options and self._live(key) is not None:
+                    return b'$-1\r\n'
+                self.data[key] = (expires, value)
+                return b'+OK\r\n'
+            if name == 'DEL':
+                removed = 0
+                for key in args[1:]:
+                    if self._live(key) is not None:
+                        del self.data[key]
+                        removed += 1
+                return b":%d\r\n" % removed
+            if name == 'FLUSHDB':
+                self.data.clear()
+                return b'+OK\r\n'
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    def sweep(self):
+        with self.lock:
+            for key in [k for k in self.data if self._live(k) is None]:
+                self.data.pop(key, None)
+
+
+def _handler(store):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    args = read_reply(self.rfile)
+                except (EOFError, OSError, ValueError, RespError):
+                    return
+                if not isinstance(args, list) or not args:
+                    return
+                self.wfile.write(store.execute(args))
+    return Handler
+
+
+def serve(url):
+    """Run a Redis-protocol stand-in on ``url`` (redis://host:port or unix:///path) until interrupted"""
+    parsed = urlparse(url)
+    store = _RespStandIn()
+    if parsed.scheme == 'unix':
+        if os.path.exists(parsed.path):
+            os.unlink(parsed.path)
+        server = socketserver.ThreadingUnixStreamServer(parsed.path, _handler(store))
+    else:
+        server = socketserver.ThreadingTCPServer((parsed.hostname or '127.0.0.1', parsed.port or 6379),
+                                                 _handler(store))
+    server.daemon_threads = True
+
+    def sweeper():
+        while True:
+            time.sleep(60)
+            store.sweep()
+    threading.Thread(target=sweeper, daemon=True).start()
+    return server
+
+
+@click.command()
+@click.option('--url', default=None, help="Address to listen on; defaults to CACHE_URL.")
+def cache_server(url):
+    """Serve the shared cache for single-host deployments without Redis."""
+    url = url or CACHE_URL
+    if urlparse(url).scheme not in ('redis', 'unix'):
+        click.echo("Set CACHE_URL (or --url) to redis://host:port or unix:///path", err=True)
+        sys.exit(1)
+    server = serve(url)
+    click.echo(f"Shared cache listening on {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    # Also runs standalone (python shared_cache.py) without building the app
+    cache_server()
@@ -0,0 +1,145 @@
+import logging
+import datetime
+from flask import current_app
+from sqlalchemy import true, false, or_
+from app import db, scheduler, start_scheduler
+from models import GridConfig, GridPosition
+from binance_client import BinanceClient, format_decimal
+from grid_strategy import delete_grid_config
+from order_ids import grid_order_prefix
+from rebalance import chunks, CANCEL_BATCH_SIZE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def begin_shutdown(grid_config, flatten=False, delete=False):
+    """Deactivate a grid now and cancel its orders on the exchange in the background.
+
+    The grid is marked inactive (so the engine stops trading it on its next
+    refresh) and ``shutdown_status`` is set to 'stopping'; the dashboard
+    state reports 'stopped' or 'failed' once run_shutdown has finished. The
+    job lives in this process's scheduler, so a shutdown that is still
+    'stopping' after SHUTDOWN_TIMEOUT reads as failed and can be retried.
+    """
+    grid_config.is_active = False
+    grid_config.shutdown_status = 'stopping'
+    grid_config.shutdown_detail = None
+    grid_config.shutdown_started_at = datetime.datetime.utcnow()
+    db.session.commit()
+    scheduler.add_job(run_shutdown, args=[current_app._get_current_object(), grid_config.id, flatten, delete],
+                      id=f"shutdown-{grid_config.id}", replace_existing=True)
+    # Web workers that do not run the engine start the scheduler on their first shutdown
+    start_scheduler()
+
+
+def run_shutdown(app, grid_id, flatten=False, delete=False):
+    """Background job: cancel the grid's orders, optionally flatten, then record the outcome"""
+    with app.app_context():
+        try:
+            grid_config = GridConfig.query.get(grid_id)
+            if grid_config is None:
+                return
+            user = grid_config.user
+            positions = GridPosition.query.filter_by(grid_config_id=grid_id).all()
+            client = BinanceClient(user.api_key, user.api_secret)
+            detail = stop_grid_orders(client, grid_config, positions, flatten)
+
+            if delete:
+                delete_grid_config(grid_id)
+                logger.info(f"Deleted grid {grid_id}: {detail}")
+                return
+            # The orders are gone; filled positions stay tracked unless they were just closed
+            conditions = [GridPosition.is_filled == false(), GridPosition.is_filled.is_(None)]
+            if flatten:
+                conditions.append(GridPosition.is_filled == true())
+            GridPosition.query.filter(GridPosition.grid_config_id == grid_id, or_(*conditions)).delete()
+            grid_config.shutdown_status = 'stopped'
+            grid_config.shutdown_detail = detail[:255]
+            db.session.commit()
+            logger.info(f"Stopped grid {grid_id}: {detail}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error shutting down grid {grid_id}: {e}")
+            GridConfig.query.filter_by(id=grid_id).update({'shutdown_status': 'failed',
+                                                           'shutdown_detail': str(e)[:255]})
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def stop_grid_orders(client, grid_config, positions, flatten=False):
+    """Cancel every open order of a grid and optionally close what it holds; returns a summary.
+
+    When no other active grid of the user trades the symbol, one
+    allOpenOrders request clears the book, including the untracked
+    take-profit orders. Otherwise only the grid's own orders are cancelled,
+    10 per batch request. A single reconciliation pass then re-reads the
+    open orders and cancels anything left over: on a shared symbol, orders
+    tracked for the grid or carrying its client order id prefix.
+    """
+    symbol = grid_config.symbol
+    shared = GridConfig.query.filter(
+        GridConfig.user_id == grid_config.user_id, GridConfig.symbol == symbol,
+        GridConfig.id != grid_config.id, GridConfig.is_active == true()
+    ).count() > 0
+    order_ids = [str(p.order_id) for p in positions if p.order_id and not p.is_filled]
+    failures = 0
+
+    if not shared:
+        client.cancel_all_open_orders(symbol)
+    else:
+        for batch in chunks(order_ids, CANCEL_BATCH_SIZE):
+            results = client.cancel_batch_orders(symbol, batch)
+            failures += sum(1 for item in results if 'code' in item)
+
+    # Reconciliation: anything still open is cancelled once more. On a shared symbol the grid's orders are
+    # also told apart by client order id, which covers orders of an in-flight engine pass or still journaled
+    tracked = set(order_ids)
+    prefix = grid_order_prefix(grid_config.id)
+    leftover = [str(o['orderId']) for o in client.get_open_orders(symbol)
+                if not shared or str(o['orderId']) in tracked or (o.get('clientOrderId') or '').startswith(prefix)]
+    remaining = 0
+    for batch in chunks(leftover, CANCEL_BATCH_SIZE):
+        results = client.cancel_batch_orders(symbol, batch)
+        remaining += sum(1 for item in results if 'code' in item)
+
+    parts = [f"cancelled all open {symbol} orders" if not shared
+             else f"cancelled {len(order_ids) - failures} of {len(order_ids)} grid orders"]
+    if remaining:
+        parts.append(f"{remaining} orders could not be cancelled")
+
+    if flatten:
+        closed = close_positions(client, grid_config, positions, shared)
+        parts.append(f"closed {', '.join(closed)}" if closed else "no positions to close")
+    return '; '.join(parts)
+
+
+def close_positions(client, grid_config, positions, shared):
+    """Close the grid's positions with market orders; capped at the grid's own fills when the symbol is shared"""
+    held = {'LONG': 0.0, 'SHORT': 0.0}
+    for p in positions:
+        if p.is_filled:
+            held['LONG' if p.position_type == 'long' else 'SHORT'] += p.quantity
+
+    closed = []
+    for position in client.get_position_risk(grid_config.symbol):
+        amount = float(position['positionAmt'])
+        if amount == 0:
+            continue
+        position_side = position['positionSide']
+        direction = position_side if position_side != 'BOTH' else ('LONG' if amount > 0 else 'SHORT')
+        quantity = min(abs(amount), held[direction]) if shared else abs(amount)
+        if quantity <= 0:
+            continue
+        client.place_order(
+            symbol=grid_config.symbol,
+            side='SELL' if direction == 'LONG' else 'BUY',
+            position_side=position_side,
+            type='MARKET',
+            quantity=format_decimal(quantity),
+            # One-way mode needs reduceOnly; in hedge mode the position side already makes it a close
+            reduce_only=position_side == 'BOTH'
+        )
+        closed.append(f"{format_decimal(quantity)} {direction.lower()}")
+    return closed
@@ -0,0 +1,92 @@
+import os
+import logging
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Connection settings for the SQLite fallback database. WAL lets the engine
+# thread write while request threads read; NORMAL sync is durable across
+# application crashes (only an OS crash can lose the last transactions).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative = KiB
+}
+
+
+def apply_pragmas(dbapi_connection, pragmas=SQLITE_PRAGMAS, read_only=False):
+    """Apply the SQLite tuning pragmas to a raw DB-API connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def sqlite_engine_options(options):
+    """Engine options for SQLite: wait on a locked database instead of failing immediately"""
+    options = dict(options)
+    options['connect_args'] = dict(options.get('connect_args', {}),
+                                   timeout=SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                                   check_same_thread=False)
+    return options
+
+
+def create_read_engine(database_path, pool_size=None):
+    """Create a pooled, read-only engine for dashboard queries against a SQLite file"""
+    engine = create_engine(
+        f"sqlite:///file:{database_path}?mode=ro&uri=true",
+        pool_size=pool_size or int(os.environ.get('SQLITE_READ_POOL_SIZE', 8)),
+        max_overflow=0,
+        pool_pre_ping=True,
+        connect_args={'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000, 'check_same_thread': False},
+    )
+    # journal_mode can only be changed by a writer; readers inherit WAL from the file
+    read_pragmas = {k: v for k, v in SQLITE_PRAGMAS.items() if k != 'journal_mode'}
+    event.listen(engine, 'connect', lambda conn, _: apply_pragmas(conn, read_pragmas, read_only=True))
+    return engine
+
+
+def configure_sqlite(app, db):
+    """Install the SQLite profile on the app's engine and set up the read-only pool.
+
+    Must be called inside an app context. Does nothing for other databases.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+        return
+
+    event.listen(engine, 'connect', lambda conn, _: apply_pragmas(conn))
+    # Connections opened before the listener existed (e.g. by init) are discarded
+    engine.dispose()
+
+    # Make sure the file exists and is in WAL mode before readers attach
+    with engine.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    app.extensions['read_engine'] = create_read_engine(engine.url.database)
+    logger.info(f"SQLite profile enabled (journal_mode={mode})")
+
+
+@contextmanager
+def read_session(db):
+    """Session for read-only dashboard queries.
+
+    Uses the SQLite read-only pool when configured, so page loads never take
+    the writer's connection; otherwise falls back to the regular session.
+    """
+    from flask import current_app
+    engine = current_app.extensions.get('read_engine')
+    if engine is None:
+        yield db.session
+        return
+    session = Session(bind=engine, expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        session.close()
@@ -14,9 +14,32 @@ function toggleGridBot(gridId) {
     document.querySelector(`#toggleForm${gridId}`).submit();
 }
 
-// Update grid statistics
-function updateGridStats(gridId) {
-    fetch(`/api/grid/${gridId}/stats`)
+// Dashboard state: one request for every grid; later refreshes only carry changes
+const dashboardState = {
+    since: null,
+    grids: {},
+    charts: {}
+};
+
+// Keep this many trades per grid for the trade tables
+const DASHBOARD_TRADES = 20;
+
+// Poll this often (ms) while a grid is shutting down
+const SHUTDOWN_POLL_INTERVAL = 2000;
+let shutdownPoll = null;
+
+// Fetch the dashboard state (or the changes since the last fetch) and redraw
+function refreshDashboardState() {
+    const canvas = document.querySelector('canvas[id^="gridChart"]');
+    const params = new URLSearchParams({
+        chart_width: canvas ? Math.max(50, Math.round(canvas.clientWidth || 800)) : 800,
+        chart_window: CHART_WINDOW
+    });
+    if (dashboardState.since) {
+        params.set('since', dashboardState.since);
+    }
+    
+    fetch(`/api/dashboard/state?${params}`)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
@@ -24,25 +47,141 @@ function updateGridStats(gridId) {
             return response.json();
         })
         .then(data => {
-            // Update displayed statistics
-            const statsContainer = document.querySelector(`#gridStats${gridId}`);
-            if (statsContainer && data) {
-                // Update profit stats
-                if (data.performance) {
-                    document.querySelector(`#totalProfit${gridId}`).textContent = 
-                        formatNumber(data.performance.net_profit, 4);
-                    document.querySelector(`#winRate${gridId}`).textContent = 
-                        formatNumber(data.performance.win_rate) + '%';
-                    document.querySelector(`#totalTrades${gridId}`).textContent = 
-                        data.performance.total_trades;
+            dashboardState.since = data.since;
+            dashboardState.charts = data.charts;
+            data.removed.forEach(gridId => {
+                delete dashboardState.grids[gridId];
+                // Deleted once its shutdown finished
+                const badge = document.querySelector(`#statusBadge${gridId}`);
+                const card = badge ? badge.closest('.card') : null;
+                if (card) card.remove();
+            });
+            
+            data.grids.forEach(update => {
+                const grid = dashboardState.grids[update.id] || { trades: [], fills: [] };
+                const newTrades = update.trades || [];
+                delete update.trades;
+                Object.assign(grid, update);
+                if (data.full) {
+                    grid.trades = newTrades;
+                } else if (newTrades.length > 0) {
+                    grid.trades = newTrades.concat(grid.trades).slice(0, DASHBOARD_TRADES);
+                    grid.fills = grid.fills.concat(newTrades);
                 }
+                dashboardState.grids[update.id] = grid;
+                
+                updateGridStats(update.id, grid);
+                updateGridStatus(update.id, grid);
+                if (newTrades.length > 0 || data.full) {
+                    renderTradeHistory(update.id, grid.trades);
+                }
+            });
+            
+            // Charts and prices change for every grid, not just the ones in the delta
+            Object.values(dashboardState.grids).forEach(grid => {
+                const chartData = data.charts[grid.symbol] || {};
+                const end = chartData.end || Date.now();
+                const start = chartData.start || end - CHART_WINDOW * 1000;
+                grid.fills = grid.fills.filter(fill => fill.t >= start);
+                renderGridChart(grid.id, Object.assign({}, chartData, {
+                    start: start,
+                    end: end,
+                    grid_levels: grid.grid_levels,
+                    positions: grid.positions,
+                    fills: grid.fills,
+                    current_price: data.prices[grid.symbol],
+                    bot_type: grid.bot_type
+                }));
+            });
+            
+            // Follow a stop/delete closely until the exchange side has finished
+            const stopping = Object.values(dashboardState.grids).some(grid => grid.shutdown_status === 'stopping');
+            if (stopping && !shutdownPoll) {
+                shutdownPoll = setTimeout(() => {
+                    shutdownPoll = null;
+                    refreshDashboardState();
+                }, SHUTDOWN_POLL_INTERVAL);
             }
         })
         .catch(error => {
-            console.error('Error updating grid stats:', error);
+            console.error('Error updating dashboard state:', error);
         });
 }
 
+// Update a grid's status badge (Active, Stopping..., Inactive, Stop failed)
+function updateGridStatus(gridId, grid) {
+    const badge = document.querySelector(`#statusBadge${gridId}`);
+    if (!badge) return;
+    
+    let label = 'Inactive';
+    let style = 'bg-secondary';
+    if (grid.is_active) {
+        label = 'Active';
+        style = 'bg-success';
+    } else if (grid.shutdown_status === 'stopping') {
+        label = 'Stopping...';
+        style = 'bg-warning';
+    } else if (grid.shutdown_status === 'failed') {
+        label = 'Stop failed';
+        style = 'bg-danger';
+    }
+    badge.textContent = label;
+    badge.className = `badge ${style} me-2`;
+    badge.title = grid.shutdown_detail || '';
+}
+
+// Update grid statistics
+function updateGridStats(gridId, grid) {
+    const performance = grid.performance;
+    if (!performance) return;
+    
+    const totalProfit = document.querySelector(`#totalProfit${gridId}`);
+    const winRate = document.querySelector(`#winRate${gridId}`);
+    const totalTrades = document.querySelector(`#totalTrades${gridId}`);
+    const roi = document.querySelector(`#roi${gridId}`);
+    
+    if (totalProfit) totalProfit.textContent = formatNumber(performance.net_profit);
+    if (winRate) winRate.textContent = formatNumber(performance.win_rate) + '%';
+    if (totalTrades) totalTrades.textContent = performance.total_trades;
+    if (roi) roi.textContent = formatNumber(performance.roi) + '%';
+}
+
+// Fill a grid's recent trades table
+function renderTradeHistory(gridId, trades) {
+    const tableBody = document.querySelector(`#tradesTable${gridId} tbody`);
+    if (!tableBody) return;
+    
+    if (trades.length === 0) {
+        tableBody.innerHTML = '<tr><td colspan="6" class="text-center">No trades yet</td></tr>';
+        return;
+    }
+    
+    tableBody.innerHTML = '';
+    trades.forEach(trade => {
+        const row = document.createElement('tr');
+        
+        // Apply class based on profit/loss
+        if (trade.realized_profit) {
+            if (trade.realized_profit > 0) {
+                row.classList.add('table-success');
+            } else if (trade.realized_profit < 0) {
+                row.classList.add('table-danger');
+            }
+        }
+        
+        row.innerHTML = `
+            <td>${trade.executed_at}</td>
+            <td><span class="badge ${trade.side === 'BUY' ? 'bg-success' : 'bg-danger'}">${trade.side}</span></td>
+            <td>${trade.position_side}</td>
+            <td>${trade.price}</td>
+            <td>${trade.quantity}</td>
+            <td>${trade.realized_profit ? trade.realized_profit.toFixed(4) : '-'}</td>
+        `;
+        
+        tableBody.appendChild(row);
+    });
+}
+
 // Initialize the create grid form
 function initCreateGridForm() {
     // Form elements
@@ -293,18 +432,10 @@ function initDashboard() {
     // Initialize grid form
     initCreateGridForm();
     
-    // Initialize auto-updating for active grids
-    const activeGrids = document.querySelectorAll('.grid-card[data-active="true"]');
-    if (activeGrids.length > 0) {
-        // Update stats for active grids every 30 seconds
-        setInterval(() => {
-            activeGrids.forEach(grid => {
-                const gridId = grid.dataset.gridId;
-                updateGridStats(gridId);
-                // Also update grid visualization
-                updateGridChart(gridId);
-            });
-        }, 30000);
+    // Load every grid in one request, then poll for changes every 30 seconds
+    if (document.querySelector('canvas[id^="gridChart"]')) {
+        refreshDashboardState();
+        setInterval(refreshDashboardState, 30000);
     }
 }
 
@@ -5,6 +5,16 @@
 // Store chart instances
 const gridCharts = {};
 
+// Price window shown on the chart, in seconds
+const CHART_WINDOW = 86400;
+
+// Format an epoch-ms timestamp for the time axis
+function formatChartTime(ms) {
+    const date = new Date(ms);
+    return date.toLocaleDateString([], { month: 'short', day: 'numeric' }) + ' ' +
+        date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+}
+
 // Initialize a grid chart
 function initGridChart(gridId) {
     const ctx = document.getElementById(`gridChart${gridId}`);
@@ -14,17 +24,26 @@ function initGridChart(gridId) {
     const chart = new Chart(ctx, {
         type: 'line',
         data: {
-            labels: [], // Will be filled with price levels
             datasets: [
+                {
+                    label: 'Price',
+                    data: [], // Will be filled with candle closes or the downsampled line
+                    borderColor: 'rgba(52, 152, 219, 1)',
+                    borderWidth: 1.5,
+                    pointRadius: 0,
+                    fill: false,
+                    tension: 0
+                },
                 {
                     label: 'Grid Levels',
-                    data: [], // Will be filled with y-values for horizontal lines
+                    data: [], // Will be filled with one horizontal segment per level
                     borderColor: 'rgba(75, 192, 192, 0.5)',
                     backgroundColor: 'rgba(75, 192, 192, 0.1)',
                     borderWidth: 1,
                     pointRadius: 0,
                     fill: false,
-                    tension: 0
+                    tension: 0,
+                    spanGaps: false
                 },
                 {
                     label: 'Long Positions',
@@ -44,6 +63,15 @@ function initGridChart(gridId) {
                     pointHoverRadius: 7,
                     showLine: false
                 },
+                {
+                    label: 'Fills',
+                    data: [], // Will be filled with executed trades
+                    backgroundColor: [],
+                    pointStyle: 'triangle',
+                    pointRadius: 4,
+                    pointHoverRadius: 6,
+                    showLine: false
+                },
                 {
                     label: 'Current Price',
                     data: [], // Will be filled with current price data
@@ -58,10 +86,18 @@ function initGridChart(gridId) {
         options: {
             responsive: true,
             maintainAspectRatio: false,
+            animation: false,
+            parsing: false,
             scales: {
                 x: {
-                    display: false,
-                    beginAtZero: true
+                    type: 'linear',
+                    ticks: {
+                        maxTicksLimit: 6,
+                        callback: value => formatChartTime(value)
+                    },
+                    grid: {
+                        display: false
+                    }
                 },
                 y: {
                     grid: {
@@ -76,25 +112,37 @@ function initGridChart(gridId) {
                 },
                 tooltip: {
                     callbacks: {
+                        title: function(items) {
+                            return items.length ? formatChartTime(items[0].parsed.x) : '';
+                        },
                         label: function(context) {
                             let label = context.dataset.label || '';
                             if (label) {
                                 label += ': ';
                             }
                             
+                            const raw = context.raw;
                             if (context.datasetIndex === 0) {
-                                label += context.parsed.y;
+                                if (raw.o !== undefined) {
+                                    label += `O ${raw.o} H ${raw.h} L ${raw.l} C ${raw.y}`;
+                                } else {
+                                    label += context.parsed.y;
+                                }
                             } else if (context.datasetIndex === 1) {
+                                label += context.parsed.y;
+                            } else if (context.datasetIndex === 2) {
                                 label += `Price: ${context.parsed.y} (Long)`;
-                                if (context.raw.filled) {
+                                if (raw.filled) {
                                     label += ' - Filled';
                                 }
-                            } else if (context.datasetIndex === 2) {
+                            } else if (context.datasetIndex === 3) {
                                 label += `Price: ${context.parsed.y} (Short)`;
-                                if (context.raw.filled) {
+                                if (raw.filled) {
                                     label += ' - Filled';
                                 }
-                            } else if (context.datasetIndex === 3) {
+                            } else if (context.datasetIndex === 4) {
+                                label += `${raw.side} ${raw.positionSide || ''} @ ${context.parsed.y}`;
+                            } else if (context.datasetIndex === 5) {
                                 label += `Current: ${context.parsed.y}`;
                             }
                             
@@ -106,128 +154,111 @@ function initGridChart(gridId) {
         }
     });
     
-    // Store chart instance
+    // Store chart instance; data arrives with the dashboard state
     gridCharts[gridId] = chart;
-    
-    // Load initial data
-    updateGridChart(gridId);
 }
 
-// Update grid chart with current data
-function updateGridChart(gridId) {
-    if (!gridCharts[gridId]) return;
+// Draw a grid chart from chart data (price history, levels, positions and fills)
+function renderGridChart(gridId, data) {
+    const chart = gridCharts[gridId];
+    if (!chart) return;
     
-    fetch(`/api/grid/${gridId}/positions`)
-        .then(response => response.json())
-        .then(data => {
-            const chart = gridCharts[gridId];
-            
-            // Set grid levels
-            if (data.grid_levels && data.grid_levels.length > 0) {
-                const gridLevels = data.grid_levels;
-                
-                // Create labels for each grid level
-                const labels = Array(gridLevels.length).fill('').map((_, i) => i.toString());
-                
-                // Get bot type from data or default to 'both'
-                const botType = data.bot_type || 'both';
-                
-                // Update chart title based on bot type
-                const gridInfoElement = document.querySelector(`#gridInfo${gridId} .bot-type`);
-                if (gridInfoElement) {
-                    let botTypeText = '';
-                    let botTypeClass = '';
-                    
-                    switch(botType) {
-                        case 'long':
-                            botTypeText = 'Long Only';
-                            botTypeClass = 'text-success';
-                            break;
-                        case 'short':
-                            botTypeText = 'Short Only';
-                            botTypeClass = 'text-danger';
-                            break;
-                        default:
-                            botTypeText = 'Long & Short';
-                            botTypeClass = 'text-primary';
-                    }
-                    
-                    gridInfoElement.textContent = botTypeText;
-                    gridInfoElement.className = `bot-type ${botTypeClass}`;
-                }
-                
-                // Prepare grid level dataset
-                const gridDataset = {
-                    label: 'Grid Levels',
-                    data: gridLevels.map((level, i) => ({ x: i, y: level })),
-                    borderColor: 'rgba(75, 192, 192, 0.5)',
-                    backgroundColor: 'rgba(75, 192, 192, 0.1)',
-                    borderWidth: 1,
-                    pointRadius: 0,
-                    fill: false,
-                    tension: 0
-                };
-                
-                // Prepare long positions dataset
-                const longPositions = botType === 'short' ? [] : data.long_positions.map(pos => ({
-                    x: gridLevels.findIndex(level => Math.abs(level - pos.price_level) < 0.0001),
-                    y: pos.price_level,
-                    filled: pos.is_filled
-                }));
-                
-                // Prepare short positions dataset
-                const shortPositions = botType === 'long' ? [] : data.short_positions.map(pos => ({
-                    x: gridLevels.findIndex(level => Math.abs(level - pos.price_level) < 0.0001),
-                    y: pos.price_level,
-                    filled: pos.is_filled
-                }));
-                
-                // Prepare current price dataset
-                const currentPriceData = [];
-                if (data.current_price) {
-                    // Find closest index for display purposes
-                    const closestIndex = findClosestGridLevelIndex(gridLevels, data.current_price);
-                    currentPriceData.push({
-                        x: closestIndex,
-                        y: data.current_price
-                    });
-                    
-                    // Update current price display if element exists
-                    const currentPriceElement = document.querySelector(`#gridInfo${gridId} .current-price`);
-                    if (currentPriceElement) {
-                        currentPriceElement.textContent = formatNumber(data.current_price, 6);
-                    }
-                }
-                
-                // Update chart data
-                chart.data.labels = labels;
-                chart.data.datasets[0].data = gridDataset.data;
-                chart.data.datasets[1].data = longPositions;
-                chart.data.datasets[2].data = shortPositions;
-                chart.data.datasets[3].data = currentPriceData;
-                
-                // Show/hide datasets based on bot type
-                chart.data.datasets[1].hidden = botType === 'short';
-                chart.data.datasets[2].hidden = botType === 'long';
-                
-                // Update chart scales to properly display all data
-                const minPrice = Math.min(...gridLevels);
-                const maxPrice = Math.max(...gridLevels);
-                const padding = (maxPrice - minPrice) * 0.05; // 5% padding
-                
-                chart.options.scales.y.min = minPrice - padding;
-                chart.options.scales.y.max = maxPrice + padding;
-                
-                // Update chart
-                chart.update();
-                
-                // Update grid stats display
-                updateGridStatsDisplay(gridId, data);
-            }
-        })
-        .catch(error => {
-            console.error('Error updating grid chart:', error);
-        });
+    if (!data.grid_levels || data.grid_levels.length === 0) return;
+    
+    const gridLevels = data.grid_levels;
+    const start = data.start;
+    const end = data.end;
+    
+    // Get bot type from data or default to 'both'
+    const botType = data.bot_type || 'both';
+    
+    // Update chart title based on bot type
+    const gridInfoElement = document.querySelector(`#gridInfo${gridId} .bot-type`);
+    if (gridInfoElement) {
+        let botTypeText = '';
+        let botTypeClass = '';
+        
+        switch(botType) {
+            case 'long':
+                botTypeText = 'Long Only';
+                botTypeClass = 'text-success';
+                break;
+            case 'short':
+                botTypeText = 'Short Only';
+                botTypeClass = 'text-danger';
+                break;
+            default:
+                botTypeText = 'Long & Short';
+                botTypeClass = 'text-primary';
+        }
+        
+        gridInfoElement.textContent = botTypeText;
+        gridInfoElement.className = `bot-type ${botTypeClass}`;
+    }
+    
+    // Price history: candle closes (OHLC kept for the tooltip) or the downsampled line
+    const priceData = data.candles
+        ? data.candles.map(c => ({ x: c[0], y: c[4], o: c[1], h: c[2], l: c[3] }))
+        : (data.line || []).map(p => ({ x: p[0], y: p[1] }));
+    
+    // One horizontal segment per grid level, separated by gaps
+    const levelData = [];
+    gridLevels.forEach(level => {
+        levelData.push({ x: start, y: level }, { x: end, y: level }, { x: end, y: null });
+    });
+    
+    // Open orders sit on the right edge at their level
+    const positionPoints = type => botType === (type === 'long' ? 'short' : 'long') ? [] :
+        data.positions
+            .filter(pos => pos.position_type === type)
+            .map(pos => ({ x: end, y: pos.price_level, filled: pos.is_filled }));
+    
+    const fills = data.fills.map(fill => ({
+        x: fill.t, y: fill.price, side: fill.side, positionSide: fill.position_side
+    }));
+    
+    const currentPriceData = [];
+    if (data.current_price) {
+        currentPriceData.push({ x: priceData.length ? priceData[priceData.length - 1].x : end,
+                                y: data.current_price });
+        
+        // Update current price display if element exists
+        const currentPriceElement = document.querySelector(`#gridInfo${gridId} .current-price`);
+        if (currentPriceElement) {
+            currentPriceElement.textContent = formatNumber(data.current_price, 6);
+        }
+    }
+    
+    // Update chart data
+    chart.data.datasets[0].data = priceData;
+    chart.data.datasets[1].data = levelData;
+    chart.data.datasets[2].data = positionPoints('long');
+    chart.data.datasets[3].data = positionPoints('short');
+    chart.data.datasets[4].data = fills;
+    chart.data.datasets[4].backgroundColor = fills.map(fill =>
+        fill.side === 'BUY' ? 'rgba(46, 204, 113, 0.9)' : 'rgba(231, 76, 60, 0.9)');
+    chart.data.datasets[5].data = currentPriceData;
+    
+    // Show/hide datasets based on bot type
+    chart.data.datasets[2].hidden = botType === 'short';
+    chart.data.datasets[3].hidden = botType === 'long';
+    
+    // Update chart scales to properly display the grid and the price history
+    const prices = gridLevels.concat(priceData.map(p => p.y));
+    const minPrice = Math.min(...prices);
+    const maxPrice = Math.max(...prices);
+    const padding = (maxPrice - minPrice) * 0.05; // 5% padding
+    
+    chart.options.scales.x.min = start;
+    chart.options.scales.x.max = end;
+    chart.options.scales.y.min = minPrice - padding;
+    chart.options.scales.y.max = maxPrice + padding;
+    
+    // Update chart
+    chart.update();
+    
+    // Update grid stats display
+    updateGridStatsDisplay(gridId, data);
 }
 
 // Update grid statistics display
@@ -260,21 +291,3 @@ function updateGridStatsDisplay(gridId, data) {
         }
     }
 }
-
-// Helper function to find the closest grid level index for a price
-function findClosestGridLevelIndex(gridLevels, price) {
-    if (!gridLevels || gridLevels.length === 0) return 0;
-    
-    let closestIndex = 0;
-    let closestDiff = Math.abs(gridLevels[0] - price);
-    
-    for (let i = 1; i < gridLevels.length; i++) {
-        const diff = Math.abs(gridLevels[i] - price);
-        if (diff < closestDiff) {
-            closestDiff = diff;
-            closestIndex = i;
-        }
-    }
-    
-    return closestIndex;
-}
@@ -0,0 +1,16 @@
+import pytest
+from app import create_app, db
+from schema import upgrade_schema
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    """An app on a fresh SQLite database migrated to the latest schema, one per test module"""
+    path = tmp_path_factory.mktemp('schema') / 'test.db'
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{path}")
+        app = create_app()
+    with app.app_context():
+        upgrade_schema(app, db)
+        yield app
+        db.engine.dispose()
@@ -0,0 +1,101 @@
+"""build_state sends everything once, then only what changed since the token it handed out."""
+import base64
+import datetime
+import itertools
+import pytest
+from app import db
+from models import User, GridConfig, TradeHistory
+from dashboard_state import build_state, encode_token, decode_token
+
+_users = itertools.count()
+
+
+@pytest.fixture
+def user_id(app):
+    n = next(_users)
+    user = User(username=f'viewer{n}', email=f'viewer{n}@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def add_grid(user_id, symbol='BTCUSDT'):
+    grid = GridConfig(user_id=user_id, symbol=symbol, lower_bound=90000, upper_bound=110000, grid_size=5,
+                      quantity_per_grid=0.001, is_active=True)
+    db.session.add(grid)
+    db.session.commit()
+    return grid.id
+
+
+def add_trade(user_id, grid_id, profit=1.0):
+    trade = TradeHistory(user_id=user_id, grid_config_id=grid_id, symbol='BTCUSDT', order_id='1', side='SELL',
+                         position_side='LONG', price=100000.0, quantity=0.001, realized_profit=profit,
+                         commission=0.01, executed_at=datetime.datetime(2026, 10, 1, 12, 0))
+    db.session.add(trade)
+    db.session.commit()
+    return trade.id
+
+
+def test_token_round_trip():
+    assert decode_token(encode_token(42, {'7': 'abc'})) == (42, {7: 'abc'})
+
+
+@pytest.mark.parametrize('token', [
+    'not a token',
+    base64.urlsafe_b64encode(b'[1, 2]').decode(),
+    base64.urlsafe_b64encode(b'{"t": 1}').decode(),
+    base64.urlsafe_b64encode(b'{"t": "x", "g": {}}').decode(),
+])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_token(token)
+
+
+def test_delta_holds_only_new_trades_of_the_grids_that_traded(app, user_id):
+    traded, idle = add_grid(user_id), add_grid(user_id)
+    add_trade(user_id, traded)
+    full = build_state(db.session, user_id)
+    assert full['full'] and [g['id'] for g in full['grids']] == [traded, idle]
+
+    trade_id = add_trade(user_id, traded, profit=-0.5)
+    delta = build_state(db.session, user_id, since=full['since'])
+    assert not delta['full']
+    assert [g['id'] for g in delta['grids']] == [traded]
+    state = delta['grids'][0]
+    assert [t['id'] for t in state['trades']] == [trade_id]
+    assert state['performance']['total_trades'] == 2
+    # Trades alone do not resend the grid's configuration
+    assert 'grid_levels' not in state
+    assert decode_token(delta['since'])[0] == trade_id
+
+    assert build_state(db.session, user_id, since=delta['since'])['grids'] == []
+
+
+def test_delta_resends_edited_grids_and_lists_removed_ones(app, user_id):
+    edited, removed = add_grid(user_id), add_grid(user_id)
+    full = build_state(db.session, user_id)
+
+    grid = db.session.get(GridConfig, edited)
+    grid.upper_bound = 120000
+    db.session.delete(db.session.get(GridConfig, removed))
+    db.session.commit()
+
+    delta = build_state(db.session, user_id, since=full['since'])
+    assert [g['id'] for g in delta['grids']] == [edited]
+    assert delta['grids'][0]['upper_bound'] == 120000
+    assert delta['removed'] == [removed]
+
+
+def test_client_too_far_behind_gets_a_full_state(app, user_id, monkeypatch):
+    monkeypatch.setattr('dashboard_state.MAX_DELTA_TRADES', 2)
+    grid_id = add_grid(user_id)
+    since = build_state(db.session, user_id)['since']
+
+    trade_ids = [add_trade(user_id, grid_id) for _ in range(2)]
+    delta = build_state(db.session, user_id, since=since)
+    assert not delta['full'] and [t['id'] for t in delta['grids'][0]['trades']] == trade_ids[::-1]
+
+    trade_ids = [add_trade(user_id, grid_id) for _ in range(3)]
+    state = build_state(db.session, user_id, since=delta['since'])
+    assert state['full'] and 'grid_levels' in state['grids'][0]
+    assert decode_token(state['since'])[0] == trade_ids[-1]
@@ -0,0 +1,17 @@
+"""The hot queries are planned with the indexes added for them (migration 0003)."""
+import pytest
+from sqlalchemy import inspect
+from app import db
+from schema import hot_queries, explain
+
+
+def test_migrations_create_the_hot_query_indexes(app):
+    inspector = inspect(db.engine)
+    indexes = {index['name'] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+    assert {index for _, index, _ in hot_queries()} <= indexes
+
+
+@pytest.mark.parametrize('description, index, stmt', hot_queries(), ids=[q[0] for q in hot_queries()])
+def test_hot_query_uses_its_index(app, description, index, stmt):
+    plan = explain(db, stmt)
+    assert index in plan, f"{description} is not planned with {index}:\n{plan}"
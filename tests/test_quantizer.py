@@ -0,0 +1,69 @@
+"""SymbolQuantizer rounds prices to ticks and quantities to steps exactly, including at the filter edges."""
+import pytest
+from quantizer import SymbolQuantizer, symbol_quantizer
+
+
+def symbol_info(symbol, tick_size, step_size, min_qty='0.001', notional='5'):
+    return {'symbol': symbol, 'filters': [
+        {'filterType': 'PRICE_FILTER', 'tickSize': tick_size},
+        {'filterType': 'LOT_SIZE', 'stepSize': step_size, 'minQty': min_qty},
+        {'filterType': 'MIN_NOTIONAL', 'notional': notional},
+    ]}
+
+
+@pytest.mark.parametrize('tick_size, price, ticks, text', [
+    ('0.10', 0.3, 3, '0.3'),                   # 0.3 / 0.1 is 2.9999999999999996
+    ('0.10', 0.14999, 1, '0.1'),
+    ('0.10', 0.15001, 2, '0.2'),
+    ('0.5', 101.25, 202, '101'),
+    ('0.5', 101.26, 203, '101.5'),
+    ('10', 95004.9, 9500, '95000'),
+    ('10', 95005.1, 9501, '95010'),
+    ('0.0000001', 0.0000123, 123, '0.0000123'),
+])
+def test_price_rounds_to_the_nearest_tick(tick_size, price, ticks, text):
+    quantizer = SymbolQuantizer('TESTUSDT', tick_size, '1')
+    assert quantizer.ticks(price) == ticks
+    assert quantizer.ticks_array([price]).tolist() == [ticks]
+    assert quantizer.format_price(ticks) == text
+    assert quantizer.format_prices([ticks]) == [text]
+
+
+@pytest.mark.parametrize('step_size, quantity, steps, text', [
+    ('0.1', 0.3, 3, '0.3'),                    # exactly on a step despite float division noise
+    ('0.1', 0.29999, 2, '0.2'),                # just below a step is floored, never rounded up
+    ('0.001', 1.23456, 1234, '1.234'),
+    ('1', 7.999, 7, '7'),
+    ('1.000', 3.0, 3, '3'),
+])
+def test_quantity_floors_to_whole_steps(step_size, quantity, steps, text):
+    quantizer = SymbolQuantizer('TESTUSDT', '0.1', step_size)
+    assert quantizer.steps(quantity) == steps
+    assert quantizer.format_quantity(steps) == text
+    assert quantizer.round_quantity(quantity) == float(text)
+
+
+def test_ladder_keeps_neighbouring_levels_apart_on_low_priced_symbols():
+    quantizer = SymbolQuantizer('TESTUSDT', '0.0000001', '1')
+    ladder = quantizer.ladder(0.0000100, 0.0000110, 11)
+    assert ladder.tolist() == list(range(100, 111))
+    assert quantizer.format_prices(ladder)[-1] == '0.000011'
+
+
+def test_from_symbol_info_reads_the_filters():
+    quantizer = SymbolQuantizer.from_symbol_info(symbol_info('BTCUSDT', '0.10', '0.001', min_qty='0.002'))
+    assert (quantizer.tick, quantizer.step, quantizer.min_qty, quantizer.min_notional) == (0.1, 0.001, 0.002, 5.0)
+    assert (quantizer.price_decimals, quantizer.qty_decimals) == (1, 3)
+
+
+def test_symbol_quantizer_is_shared_while_the_filters_are_unchanged():
+    first = symbol_quantizer({'symbols': [symbol_info('ETHUSDT', '0.01', '0.001')]}, 'ETHUSDT')
+    same = symbol_quantizer({'symbols': [symbol_info('ETHUSDT', '0.01', '0.001')]}, 'ETHUSDT')
+    changed = symbol_quantizer({'symbols': [symbol_info('ETHUSDT', '0.05', '0.001')]}, 'ETHUSDT')
+    assert same is first
+    assert changed is not first and changed.tick == 0.05
+
+
+def test_symbol_quantizer_rejects_unknown_symbols():
+    with pytest.raises(ValueError):
+        symbol_quantizer({'symbols': [symbol_info('ETHUSDT', '0.01', '0.001')]}, 'XYZUSDT')
@@ -0,0 +1,29 @@
+"""RiskLedger holds margin only for what an order adds, including amends of orders it already counts."""
+from grid_book import StagedPosition
+from risk_ledger import RiskLedger
+
+
+def ledger_with_order(balance=1000.0, allocation=10, price=100.0, quantity=5.0):
+    # One open order of 500 margin on a grid allowed 100 of a 1000 wallet at 10x: 50 used, 50 left
+    ledger = RiskLedger()
+    ledger.load_grid(1, 1, allocation, 10, [StagedPosition(1, 'long', price, quantity, '1', False, None)])
+    ledger.users[1].balance = balance
+    return ledger
+
+
+def test_amend_needs_room_only_for_the_added_margin():
+    ledger = ledger_with_order()
+    assert ledger.headroom(1) == 50.0
+    # 100 -> 190 adds 45 margin, 100 -> 210 would add 55
+    assert ledger.reserve(1, 190.0, 5.0, replaces=(100.0, 5.0))
+    assert ledger.headroom(1) == 5.0
+    ledger.settle(1, 190.0, 5.0, replaces=(100.0, 5.0))
+    assert not ledger.reserve(1, 210.0, 5.0, replaces=(100.0, 5.0))
+    assert ledger.headroom(1) == 50.0
+
+
+def test_amend_to_a_lower_price_always_fits():
+    ledger = ledger_with_order(allocation=5)
+    assert ledger.headroom(1) == 0.0
+    assert ledger.reserve(1, 90.0, 5.0, replaces=(100.0, 5.0))
+    assert not ledger.reserve(1, 90.0, 5.0)
@@ -0,0 +1,51 @@
+"""TickSeries.range joins flushed and unflushed ticks and survives ring overflow."""
+import numpy as np
+import pytest
+from tick_store import TickSeries
+
+
+@pytest.fixture
+def series(tmp_path):
+    series = TickSeries(str(tmp_path / 'BTCUSDT'), ring_size=8)
+    yield series
+    series.close()
+
+
+def append(series, timestamps):
+    for ts in timestamps:
+        series.append(float(ts) * 10, ts)
+
+
+def test_range_within_the_ring(series):
+    append(series, range(100, 106))
+    ts, price = series.range(102, 105)
+    assert ts.tolist() == [102, 103, 104]
+    assert price.tolist() == [1020.0, 1030.0, 1040.0]
+
+
+def test_range_across_flushed_and_unflushed_ticks(series):
+    append(series, range(100, 106))
+    assert series.flush() == 6
+    append(series, range(106, 112))
+    # The ring now starts at 104, so an earlier start reads the files and joins the unflushed tail
+    ts, price = series.range(102, 110)
+    assert ts.tolist() == list(range(102, 110))
+    assert np.array_equal(price, ts * 10.0)
+    assert series.range()[0].tolist() == list(range(100, 112))
+
+
+def test_range_after_the_ring_overflowed(series):
+    append(series, range(100, 106))
+    series.flush()
+    # 12 ticks between flushes: only the latest 8 fit in the ring
+    append(series, range(106, 118))
+    assert series.flush() == 8
+    ts, _ = series.range()
+    assert ts.tolist() == list(range(100, 106)) + list(range(110, 118))
+    assert series.range(112, 115)[0].tolist() == [112, 113, 114]
+    assert series.latest() == (117, 1170.0)
+
+
+def test_timestamps_never_go_backwards(series):
+    append(series, [100, 105, 103])
+    assert series.range()[0].tolist() == [100, 105, 105]
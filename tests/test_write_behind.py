@@ -0,0 +1,177 @@
+"""WriteBehindStore coalesces staged writes and replays its journal after a crash exactly once."""
+import itertools
+import datetime
+import pytest
+from app import db
+from models import User, GridConfig, GridPosition, TradeHistory, WriteBehindCheckpoint
+from persistence import WriteBehindStore
+
+_users = itertools.count()
+
+
+@pytest.fixture
+def grid_id(app):
+    n = next(_users)
+    user = User(username=f'writer{n}', email=f'writer{n}@example.com')
+    db.session.add(user)
+    db.session.flush()
+    grid = GridConfig(user_id=user.id, symbol='BTCUSDT', lower_bound=90000, upper_bound=110000, grid_size=5,
+                      quantity_per_grid=0.001, is_active=True)
+    db.session.add(grid)
+    db.session.commit()
+    return grid.id
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / 'write_behind.journal')
+
+
+def position(grid_id, order_id, price=100000.0):
+    return dict(grid_config_id=grid_id, position_type='long', price_level=price, quantity=0.001,
+                order_id=order_id, is_filled=False, client_order_id=f'g{grid_id}-{order_id}')
+
+
+def trade(grid_id, order_id):
+    user_id = db.session.get(GridConfig, grid_id).user_id
+    return dict(user_id=user_id, grid_config_id=grid_id, symbol='BTCUSDT', order_id=order_id, side='BUY',
+                position_side='LONG', price=100000.0, quantity=0.001, realized_profit=0.0, commission=0.01,
+                executed_at=datetime.datetime(2026, 10, 1, 12, 0))
+
+
+def open_store(app, journal):
+    # As the engine starts: sequence numbers carry on from the database checkpoint
+    store = WriteBehindStore(app, journal)
+    store.recover()
+    return store
+
+
+def crash(store):
+    # Drop the store without flushing; only what sync() made durable is left in the journal
+    store.sync()
+    store._journal.close()
+
+
+def positions_in_db(grid_id):
+    db.session.expire_all()
+    return {row.order_id: row for row in GridPosition.query.filter_by(grid_config_id=grid_id)}
+
+
+def test_insert_then_update_coalesces_into_one_insert(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.update_position(grid_id, '1', is_filled=True, price_level=101000.0)
+    assert store.pending == 1
+    store.flush()
+    row = positions_in_db(grid_id)['1']
+    assert (row.is_filled, row.price_level) == (True, 101000.0)
+    store.close()
+
+
+def test_insert_then_delete_never_reaches_the_database(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.delete_position(grid_id, '1')
+    assert store.pending == 0
+    assert store.positions(grid_id, []) == []
+    store.close()
+
+
+def test_update_after_delete_is_ignored(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.flush()
+    store.delete_position(grid_id, '1')
+    store.update_position(grid_id, '1', is_filled=True)
+    store.flush()
+    assert positions_in_db(grid_id) == {}
+    store.close()
+
+
+def test_positions_merges_staged_writes_over_rows(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.insert_position(**position(grid_id, '2', price=105000.0))
+    store.flush()
+    store.update_position(grid_id, '1', is_filled=True)
+    store.delete_position(grid_id, '2')
+    store.insert_position(**position(grid_id, '3', price=95000.0))
+    merged = {p.order_id: p for p in store.positions(grid_id, positions_in_db(grid_id).values())}
+    assert sorted(merged) == ['1', '3']
+    assert merged['1'].is_filled
+    store.close()
+
+
+def test_recover_replays_the_journal_after_a_crash(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.update_position(grid_id, '1', is_filled=True)
+    store.insert_trade(**trade(grid_id, '1'))
+    last_seq = store.seq
+    crash(store)
+
+    store = open_store(app, journal)
+    assert store.pending == 0
+    assert positions_in_db(grid_id)['1'].is_filled
+    assert TradeHistory.query.filter_by(grid_config_id=grid_id).count() == 1
+    assert db.session.get(WriteBehindCheckpoint, store.name).last_seq == store.seq == last_seq
+    store.close()
+
+
+def test_recover_skips_entries_already_flushed(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_trade(**trade(grid_id, '1'))
+    store.sync()
+    with open(journal) as f:
+        flushed = f.read()
+    store.flush()
+    store.insert_trade(**trade(grid_id, '2'))
+    crash(store)
+    # A crash between the database commit and the journal truncation leaves flushed entries behind
+    with open(journal) as f:
+        unflushed = f.read()
+    with open(journal, 'w') as f:
+        f.write(flushed + unflushed)
+
+    store = open_store(app, journal)
+    order_ids = [t.order_id for t in TradeHistory.query.filter_by(grid_config_id=grid_id)]
+    assert sorted(order_ids) == ['1', '2']
+    store.close()
+
+
+def test_recover_skips_a_torn_final_line(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    crash(store)
+    with open(journal, 'a') as f:
+        f.write('{"seq": 2, "op": "insert_pos')
+
+    store = open_store(app, journal)
+    assert list(positions_in_db(grid_id)) == ['1']
+    store.close()
+
+
+def test_discard_drops_positions_but_keeps_trades(app, grid_id, journal):
+    store = open_store(app, journal)
+    store.insert_position(**position(grid_id, '1'))
+    store.insert_trade(**trade(grid_id, '1'))
+    store.discard(grid_id)
+    crash(store)
+
+    store = open_store(app, journal)
+    assert positions_in_db(grid_id) == {}
+    assert TradeHistory.query.filter_by(grid_config_id=grid_id).count() == 1
+    store.close()
+
+
+def test_generation_is_written_without_touching_updated_at(app, grid_id, journal):
+    updated_at = db.session.get(GridConfig, grid_id).updated_at
+    store = open_store(app, journal)
+    store.set_generation(grid_id, 7)
+    crash(store)
+
+    store = open_store(app, journal)
+    db.session.expire_all()
+    grid = db.session.get(GridConfig, grid_id)
+    assert (grid.order_generation, grid.updated_at) == (7, updated_at)
+    store.close()
@@ -0,0 +1,194 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# One append-only file per column; a row is one price tick
+COLUMNS = (('ts', np.dtype('<i8')), ('price', np.dtype('<f8')))
+RING_SIZE = int(os.environ.get("TICK_RING_SIZE", 4096))
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class TickSeries:
+    """Price ticks for one symbol: columnar files on disk plus a ring buffer of recent ticks.
+
+    Timestamps are epoch milliseconds and never go backwards, so both the files
+    and the ring are sorted and windows are found with searchsorted. Every tick
+    is written to the ring twice (at ``i`` and ``i + size``) so the latest
+    ``size`` ticks are always one contiguous slice and can be returned as a view.
+    """
+    def __init__(self, path, ring_size=RING_SIZE):
+        self.path = path
+        self.size = ring_size
+        self.ring_ts = np.zeros(2 * ring_size, dtype=COLUMNS[0][1])
+        self.ring_price = np.zeros(2 * ring_size, dtype=COLUMNS[1][1])
+        self.count = 0
+        self.flushed = 0
+        self.last_ts = None
+        self._fds = None
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _file(self, column):
+        return os.path.join(self.path, f"{column}.bin")
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        paths = [self._file(name) for name, _ in COLUMNS]
+        # A crash between column writes can leave one column a row ahead; cut back to whole rows
+        rows = min((os.path.getsize(p) if os.path.exists(p) else 0) // dtype.itemsize
+                   for p, (_, dtype) in zip(paths, COLUMNS))
+        self._fds = []
+        for p, (_, dtype) in zip(paths, COLUMNS):
+            fd = os.open(p, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            os.ftruncate(fd, rows * dtype.itemsize)
+            self._fds.append(fd)
+        if rows and self.last_ts is None:
+            self.last_ts = int(self._column('ts', rows)[-1])
+
+    def append(self, price, ts):
+        with self._lock:
+            if self._fds is None:
+                self._open()
+            if self.last_ts is not None and ts < self.last_ts:
+                ts = self.last_ts
+            self.last_ts = ts
+            i = self.count % self.size
+            self.ring_ts[i] = self.ring_ts[i + self.size] = ts
+            self.ring_price[i] = self.ring_price[i + self.size] = price
+            self.count += 1
+
+    def _ring(self, n):
+        # Views of the latest ``n`` ticks in the ring
+        end = (self.count - 1) % self.size + 1 + self.size
+        return self.ring_ts[end - n:end], self.ring_price[end - n:end]
+
+    def flush(self):
+        """Append ticks staged in the ring to the column files"""
+        with self._lock:
+            pending = self.count - self.flushed
+            if not pending:
+                return 0
+            if pending > self.size:
+                logger.warning(f"Tick ring overflowed for {os.path.basename(self.path)}, "
+                               f"dropped {pending - self.size} ticks")
+                pending = self.size
+            ts, price = self._ring(pending)
+            for fd, values in zip(self._fds, (ts, price)):
+                os.write(fd, values.tobytes())
+            self.flushed = self.count
+            return pending
+
+    def _column(self, name, rows):
+        cached = self._maps.get(name)
+        if cached is None or len(cached) != rows:
+            dtype = dict(COLUMNS)[name]
+            cached = np.memmap(self._file(name), dtype=dtype, mode='r', shape=(rows,)) if rows \
+                else np.empty(0, dtype=dtype)
+            self._maps[name] = cached
+        return cached
+
+    def stored(self):
+        """Read-only memory-mapped views of every tick on disk"""
+        rows = min((os.path.getsize(self._file(name)) if os.path.exists(self._file(name)) else 0)
+                   // dtype.itemsize for name, dtype in COLUMNS)
+        return self._column('ts', rows), self._column('price', rows)
+
+    def range(self, start=None, end=None):
+        """(timestamps, prices) for ticks with ``start <= ts < end``.
+
+        Served from the ring when it covers the window, otherwise from the
+        memory-mapped files plus any ticks not yet flushed. Results are views
+        unless unflushed ticks have to be joined on; ring views are reused as
+        new ticks arrive, so copy them to keep them.
+        """
+        with self._lock:
+            held = min(self.count, self.size)
+            unflushed = self.count - self.flushed
+            if held and start is not None and self._ring(held)[0][0] <= start:
+                ts, price = self._ring(held)
+                tail = None
+            else:
+                ts, price = self.stored()
+                tail = self._ring(min(unflushed, self.size)) if unflushed else None
+        i = np.searchsorted(ts, start, 'left') if start is not None else 0
+        j = np.searchsorted(ts, end, 'left') if end is not None else len(ts)
+        ts, price = ts[i:j], price[i:j]
+        if tail is not None:
+            k = np.searchsorted(tail[0], start, 'left') if start is not None else 0
+            m = np.searchsorted(tail[0], end, 'left') if end is not None else len(tail[0])
+            if m > k:
+                ts = np.concatenate([ts, tail[0][k:m]])
+                price = np.concatenate([price, tail[1][k:m]])
+        return ts, price
+
+    def latest(self):
+        """The most recent (ts, price), or None when nothing was recorded"""
+        with self._lock:
+            if self.count:
+                ts, price = self._ring(1)
+                return int(ts[0]), float(price[0])
+        ts, price = self.stored()
+        return (int(ts[-1]), float(price[-1])) if len(ts) else None
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for fd in self._fds or ():
+                os.close(fd)
+            self._fds = None
+            self._maps.clear()
+
+
+class TickStore:
+    """Per-symbol tick history under ``root``; written by the engine, read by the UI and tools"""
+    def __init__(self, root, ring_size=RING_SIZE):
+        self.root = root
+        self.ring_size = ring_size
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, symbol):
+        series = self._series.get(symbol)
+        if series is None:
+            if not symbol.isalnum():
+                raise ValueError(f"Invalid symbol: {symbol}")
+            with self._lock:
+                series = self._series.setdefault(
+                    symbol, TickSeries(os.path.join(self.root, symbol.upper()), self.ring_size))
+        return series
+
+    def append(self, symbol, price, ts=None):
+        self.series(symbol).append(price, now_ms() if ts is None else ts)
+
+    def flush(self):
+        """Write staged ticks for every symbol; returns the number of ticks written"""
+        return sum(series.flush() for series in list(self._series.values()))
+
+    def range(self, symbol, start=None, end=None):
+        """(timestamps, prices) NumPy arrays for ``symbol`` in epoch ms ``[start, end)``"""
+        return self.series(symbol).range(start, end)
+
+    def latest(self, symbol):
+        """The most recent (ts, price) for ``symbol``, or None"""
+        return self.series(symbol).latest()
+
+    def close(self):
+        for series in list(self._series.values()):
+            series.close()
+
+
+def get_tick_store(app):
+    """The app's TickStore, created on first use"""
+    store = app.extensions.get('tick_store')
+    if store is None:
+        store = app.extensions.setdefault('tick_store', TickStore(
+            os.environ.get("TICK_STORE_DIR", os.path.join(app.instance_path, "ticks"))))
+    return store
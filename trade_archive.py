@@ -0,0 +1,306 @@
+import os
+import glob
+import fcntl
+import logging
+import datetime
+from collections import namedtuple
+from sqlalchemy import select, delete, func, case, and_, text
+from app import db
+from models import TradeHistory, TradeRollup
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Months of trade history kept in the live table; older closed months are archived
+RETENTION_MONTHS = int(os.environ.get("TRADE_RETENTION_MONTHS", 3))
+PARTITIONS_AHEAD = 2
+# Small enough that a grid's export reads only the row groups holding its trades
+ARCHIVE_ROW_GROUP_SIZE = 65536
+
+ARCHIVE_COLUMNS = ['id', 'user_id', 'grid_config_id', 'symbol', 'order_id', 'side', 'position_side',
+                   'price', 'quantity', 'realized_profit', 'commission', 'executed_at']
+
+# Row shape returned for archived trades; attribute-compatible with TradeHistory
+ArchivedTrade = namedtuple('ArchivedTrade', ARCHIVE_COLUMNS)
+
+
+def archive_dir(app):
+    return os.environ.get("TRADE_ARCHIVE_DIR", os.path.join(app.instance_path, "archive", "trade_history"))
+
+
+def month_start(dt):
+    return datetime.datetime(dt.year, dt.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"trade_history_y{month:%Y}m{month:%m}"
+
+
+def ensure_partitions(now=None, months_ahead=PARTITIONS_AHEAD):
+    """Create monthly trade_history partitions up to ``months_ahead`` months out (PostgreSQL only)"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    month = month_start(now or datetime.datetime.utcnow())
+    with db.engine.begin() as conn:
+        for _ in range(months_ahead + 1):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF trade_history "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            ))
+            month = add_months(month, 1)
+
+
+def _archive_file(app, month):
+    return os.path.join(archive_dir(app), f"{month:%Y-%m}.parquet")
+
+
+def archived_months(app):
+    """Months that have an archive file, oldest first"""
+    months = []
+    for path in glob.glob(os.path.join(archive_dir(app), "*.parquet")):
+        try:
+            months.append(datetime.datetime.strptime(os.path.basename(path)[:7], "%Y-%m"))
+        except ValueError:
+            continue
+    return sorted(months)
+
+
+def _archive_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()), ('user_id', pa.int64()), ('grid_config_id', pa.int64()),
+        ('symbol', pa.string()), ('order_id', pa.string()), ('side', pa.string()),
+        ('position_side', pa.string()), ('price', pa.float64()), ('quantity', pa.float64()),
+        ('realized_profit', pa.float64()), ('commission', pa.float64()),
+        ('executed_at', pa.timestamp('us')),
+    ])
+
+
+def _write_archive(app, month, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = _archive_file(app, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pylist([dict(zip(ARCHIVE_COLUMNS, row)) for row in rows], schema=_archive_schema())
+    if os.path.exists(path):
+        # Late rows for an already archived month are merged, never overwrite history
+        existing = pq.read_table(path)
+        known = set(existing.column('id').to_pylist())
+        table = table.filter(pa.array([i not in known for i in table.column('id').to_pylist()], type=pa.bool_()))
+        table = pa.concat_tables([existing, table])
+    table = table.sort_by([('grid_config_id', 'ascending'), ('executed_at', 'ascending'), ('id', 'ascending')])
+    # Write-then-rename so a crash never leaves a truncated archive behind
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd', row_group_size=ARCHIVE_ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+
+def _rollup_rows(month, end):
+    # Daily per-grid summaries left behind in the database for archived months
+    day = func.date(TradeHistory.executed_at)
+    return (select(
+        TradeHistory.grid_config_id, TradeHistory.user_id, day,
+        func.count(TradeHistory.id),
+        func.sum(case((TradeHistory.realized_profit > 0, 1), else_=0)),
+        func.sum(case((TradeHistory.realized_profit < 0, 1), else_=0)),
+        func.coalesce(func.sum(TradeHistory.quantity), 0),
+        func.coalesce(func.sum(TradeHistory.quantity * TradeHistory.price), 0),
+        func.coalesce(func.sum(TradeHistory.realized_profit), 0),
+        func.coalesce(func.sum(TradeHistory.commission), 0),
+    ).where(TradeHistory.executed_at >= month, TradeHistory.executed_at < end)
+     .group_by(TradeHistory.grid_config_id, TradeHistory.user_id, day))
+
+
+def archive_month(app, month):
+    """Move one closed month of trades to its Parquet file and leave daily rollups behind"""
+    end = add_months(month, 1)
+    rows = db.session.execute(
+        select(*[getattr(TradeHistory, c) for c in ARCHIVE_COLUMNS])
+        .where(TradeHistory.executed_at >= month, TradeHistory.executed_at < end)
+        .order_by(TradeHistory.id)
+    ).all()
+    if not rows:
+        return 0
+
+    # The file is written first; the rows are only removed once it is safely on disk
+    _write_archive(app, month, rows)
+
+    try:
+        for grid_id, user_id, day, trades, wins, losses, quantity, notional, profit, commission in \
+                db.session.execute(_rollup_rows(month, end)).all():
+            if isinstance(day, str):
+                day = datetime.date.fromisoformat(day)
+            rollup = TradeRollup.query.filter_by(grid_config_id=grid_id, day=day).first()
+            if rollup is None:
+                rollup = TradeRollup(grid_config_id=grid_id, user_id=user_id, day=day,
+                                     trades=0, winning_trades=0, losing_trades=0, quantity=0,
+                                     notional=0, realized_profit=0, commission=0)
+                db.session.add(rollup)
+            rollup.trades += trades
+            rollup.winning_trades += wins
+            rollup.losing_trades += losses
+            rollup.quantity += quantity
+            rollup.notional += notional
+            rollup.realized_profit += profit
+            rollup.commission += commission
+
+        if db.engine.dialect.name == 'postgresql':
+            partition = partition_name(month)
+            if db.session.execute(text("SELECT to_regclass(:name)"), {'name': partition}).scalar():
+                db.session.execute(text(f"ALTER TABLE trade_history DETACH PARTITION {partition}"))
+                db.session.execute(text(f"DROP TABLE {partition}"))
+        # Removes the month from SQLite, and any stragglers in the PostgreSQL default partition
+        db.session.execute(delete(TradeHistory).where(TradeHistory.executed_at >= month, TradeHistory.executed_at < end))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Archived {len(rows)} trades for {month:%Y-%m}")
+    return len(rows)
+
+
+def archive_closed_months(app, now=None, retention_months=RETENTION_MONTHS):
+    """Archive every month that ended more than ``retention_months`` months ago"""
+    cutoff = add_months(month_start(now or datetime.datetime.utcnow()), -retention_months)
+    oldest = db.session.execute(select(func.min(TradeHistory.executed_at))).scalar()
+    archived = []
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        if archive_month(app, month):
+            archived.append(month)
+        month = add_months(month, 1)
+    return archived
+
+
+def run_archiver(app):
+    """Scheduled job: partition maintenance plus archival; one process per host at a time"""
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, '.archive.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        with app.app_context():
+            try:
+                ensure_partitions()
+                archive_closed_months(app)
+            except Exception as e:
+                logger.error(f"Error archiving trade history: {e}")
+            finally:
+                db.session.remove()
+
+
+def read_archived(app, grid_id, start=None, end=None, before=None, limit=None, descending=False):
+    """Read archived trades for a grid as ArchivedTrade rows, for pages of at most ``limit`` trades.
+
+    ``start``/``end`` bound executed_at (end exclusive); ``before`` is an
+    (executed_at, id) keyset position to read strictly older trades from.
+    Files are read newest-first when ``descending`` so ``limit`` can stop early.
+    Whole months are loaded; exports stream through iter_archived() instead.
+    """
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+
+    months = archived_months(app)
+    if descending:
+        months.reverse()
+
+    results = []
+    for month in months:
+        month_end = add_months(month, 1)
+        if (start and month_end <= start) or (end and month >= end) or (before and month > before[0]):
+            continue
+        table = pq.read_table(_archive_file(app, month), filters=[('grid_config_id', '=', grid_id)])
+        mask = None
+        for condition in (
+            start and pc.greater_equal(table['executed_at'], start),
+            end and pc.less(table['executed_at'], end),
+            before and pc.or_(pc.less(table['executed_at'], before[0]),
+                              pc.and_(pc.equal(table['executed_at'], before[0]), pc.less(table['id'], before[1]))),
+        ):
+            if condition is not None:
+                mask = condition if mask is None else pc.and_(mask, condition)
+        if mask is not None:
+            table = table.filter(mask)
+        order = 'descending' if descending else 'ascending'
+        table = table.sort_by([('executed_at', order), ('id', order)])
+        results.extend(ArchivedTrade(**row) for row in table.select(ARCHIVE_COLUMNS).to_pylist())
+        if limit and len(results) >= limit:
+            return results[:limit]
+    return results
+
+
+def _may_contain(row_group, column, grid_id):
+    # Row group statistics rule out most of a month's file for any one grid
+    stats = row_group.column(column).statistics
+    return stats is None or not stats.has_min_max or stats.min <= grid_id <= stats.max
+
+
+def iter_archived(app, grid_id, start=None, end=None, batch_size=1000):
+    """Yield a grid's archived trades oldest-first as lists of ArchivedTrade, one record batch at a time.
+
+    Archive files are sorted by grid, executed_at and id, so the batches
+    come out in order without loading or sorting a whole month; only row
+    groups whose statistics can hold the grid are read.
+    """
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+
+    column = ARCHIVE_COLUMNS.index('grid_config_id')
+    for month in archived_months(app):
+        if (start and add_months(month, 1) <= start) or (end and month >= end):
+            continue
+        parquet = pq.ParquetFile(_archive_file(app, month))
+        groups = [i for i in range(parquet.metadata.num_row_groups)
+                  if _may_contain(parquet.metadata.row_group(i), column, grid_id)]
+        if not groups:
+            continue
+        for batch in parquet.iter_batches(batch_size=batch_size, row_groups=groups, columns=ARCHIVE_COLUMNS):
+            mask = pc.equal(batch['grid_config_id'], grid_id)
+            if start:
+                mask = pc.and_(mask, pc.greater_equal(batch['executed_at'], start))
+            if end:
+                mask = pc.and_(mask, pc.less(batch['executed_at'], end))
+            batch = batch.filter(mask)
+            if batch.num_rows:
+                yield [ArchivedTrade(**row) for row in batch.to_pylist()]
+
+
+def iter_trades(app, session, grid_id, start=None, end=None, chunk_size=1000):
+    """Yield a grid's trades oldest-first in chunks, spanning the archive and the live table"""
+    yield from iter_archived(app, grid_id, start=start, end=end, batch_size=chunk_size)
+
+    conditions = [TradeHistory.grid_config_id == grid_id]
+    if start:
+        conditions.append(TradeHistory.executed_at >= start)
+    if end:
+        conditions.append(TradeHistory.executed_at < end)
+    # yield_per streams through a server-side cursor on PostgreSQL and fetchmany() elsewhere
+    stmt = (select(*[getattr(TradeHistory, c) for c in ARCHIVE_COLUMNS])
+            .where(and_(*conditions))
+            .order_by(TradeHistory.executed_at, TradeHistory.id)
+            .execution_options(yield_per=chunk_size))
+    for partition in session.execute(stmt).partitions():
+        yield [ArchivedTrade(*row) for row in partition]
+
+
+def rollup_totals(session, grid_ids):
+    """Aggregates for the archived part of each grid's history, keyed by grid id"""
+    rows = session.execute(select(
+        TradeRollup.grid_config_id,
+        func.sum(TradeRollup.trades),
+        func.sum(TradeRollup.winning_trades),
+        func.sum(TradeRollup.losing_trades),
+        func.sum(TradeRollup.realized_profit),
+        func.sum(TradeRollup.commission),
+    ).where(TradeRollup.grid_config_id.in_(grid_ids)).group_by(TradeRollup.grid_config_id)).all()
+    return {grid_id: {'trades': trades, 'winning_trades': wins, 'losing_trades': losses,
+                      'realized_profit': profit, 'commission': commission}
+            for grid_id, trades, wins, losses, profit, commission in rows}
@@ -0,0 +1,86 @@
+import io
+import csv
+import json
+import base64
+import datetime
+from flask import current_app
+from sqlalchemy import and_, or_
+from models import TradeHistory
+from trade_archive import read_archived, iter_trades
+
+EXPORT_COLUMNS = ['id', 'executed_at', 'symbol', 'order_id', 'side', 'position_side',
+                  'price', 'quantity', 'realized_profit', 'commission']
+EXPORT_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(trade):
+    """Opaque keyset cursor pointing just after ``trade`` (newest-first order)"""
+    raw = f"{trade.executed_at.isoformat()}|{trade.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        executed_at, trade_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(executed_at), int(trade_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def trades_page(session, grid_id, cursor=None, limit=50):
+    """Return one newest-first page of trades and the cursor for the next page.
+
+    Pages are keyed on (executed_at, id) rather than OFFSET, so each page is a
+    bounded range scan of ix_trade_history_grid_executed however deep it is.
+    Once the live table runs out the page continues into the Parquet archive.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    position = decode_cursor(cursor) if cursor else None
+    query = session.query(TradeHistory).filter(TradeHistory.grid_config_id == grid_id)
+    if position:
+        executed_at, trade_id = position
+        query = query.filter(or_(
+            TradeHistory.executed_at < executed_at,
+            and_(TradeHistory.executed_at == executed_at, TradeHistory.id < trade_id)
+        ))
+    # Fetch one extra row to know whether another page exists
+    trades = query.order_by(TradeHistory.executed_at.desc(), TradeHistory.id.desc()).limit(limit + 1).all()
+    if len(trades) <= limit:
+        if trades:
+            position = (trades[-1].executed_at, trades[-1].id)
+        trades += read_archived(current_app, grid_id, before=position, limit=limit + 1 - len(trades),
+                                descending=True)
+    next_cursor = encode_cursor(trades[limit - 1]) if len(trades) > limit else None
+    return trades[:limit], next_cursor
+
+
+def _export_rows(session, grid_id):
+    # Archived months first, then the live table, oldest first
+    for trades in iter_trades(current_app, session, grid_id, chunk_size=EXPORT_CHUNK_SIZE):
+        yield [[getattr(trade, c) for c in EXPORT_COLUMNS] for trade in trades]
+
+
+def export_csv(session, grid_id):
+    """Yield the grid's full trade history as CSV text, one chunk at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # Send the header straight away so the download starts before the first chunk is read
+    yield buffer.getvalue()
+    for rows in _export_rows(session, grid_id):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow([value.isoformat() if isinstance(value, datetime.datetime) else value
+                             for value in row])
+        yield buffer.getvalue()
+
+
+def export_ndjson(session, grid_id):
+    """Yield the grid's full trade history as newline-delimited JSON, one chunk at a time"""
+    for rows in _export_rows(session, grid_id):
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=datetime.datetime.isoformat) + '\n'
+                      for row in rows)
@@ -0,0 +1,58 @@
+import os
+import logging
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from models import User
+from binance_client import BinanceClient
+from shared_cache import LRUCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a cached user row is trusted; changes made by another process show up after at most this long
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+# Users (and clients) kept per process; the least recently used are dropped first
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+# Seconds a user's BinanceClient (and its connections) is kept after it was created
+CLIENT_TTL = float(os.environ.get("USER_CLIENT_TTL", 900))
+
+# user id -> column values
+_users = LRUCache(USER_CACHE_SIZE)
+# user id -> BinanceClient for the user's current keys
+_clients = LRUCache(USER_CACHE_SIZE)
+
+
+def load_user(user_id):
+    """The user for a request, from this process's cache while it is fresh and from the database otherwise.
+
+    A cached user is merged into the request's session without a SELECT,
+    so it behaves like a queried one: changes commit normally and
+    relationships still lazy-load.
+    """
+    entry = _users.get(user_id)
+    if entry is not None:
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        _users.set(user_id, {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs},
+                   USER_CACHE_TTL)
+    return user
+
+
+def invalidate_user(user_id):
+    """Forget a user's cached row and client; call after changing the user"""
+    _users.delete(user_id)
+    _clients.delete(user_id)
+
+
+def client_for(user):
+    """A BinanceClient for the user's keys, reused (with its connections) until the keys change or it expires"""
+    entry = _clients.get(user.id)
+    client = entry[1] if entry is not None else None
+    if client is None or (client.api_key, client.api_secret) != (user.api_key, user.api_secret):
+        client = BinanceClient(user.api_key, user.api_secret)
+        _clients.set(user.id, client, CLIENT_TTL)
+    return client